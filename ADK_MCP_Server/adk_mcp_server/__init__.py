@@ -4,7 +4,18 @@
 ADK MCP Server package.
 
 This package exposes the ADK-based MCP server that provides tools
-to any MCP-compatible client via stdio.
+to any MCP-compatible client via stdio or streamable HTTP.
 """
 
-from .adk_mcp_server import run_mcp_stdio_server
+from .adk_mcp_server import (
+    create_http_app,
+    executor,
+    registry,
+    result_cache,
+    run_mcp_http_server,
+    run_mcp_stdio_server,
+    session_state,
+)
+from .result_cache import NOT_CACHEABLE, CachePolicy, ResultCache
+from .tool_executor import ExecutionPolicy, ToolExecutor, ToolTimeoutError
+from .tool_registry import ToolRegistry
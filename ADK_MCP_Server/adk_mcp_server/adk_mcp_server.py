@@ -1,9 +1,16 @@
 # adk_mcp_server.py
 
 
+import argparse
 import asyncio
+import contextlib
 import json
+import logging
 import os
+import sys
+import threading
+import weakref
+from typing import Optional, Tuple
 from dotenv import load_dotenv
 
 
@@ -13,18 +20,31 @@ from mcp.server.lowlevel import Server, NotificationOptions
 from mcp.server.models import InitializationOptions
 import mcp.server.stdio # For running as a stdio server
 
+# ADK itself is not imported here: the tools (and ADK's tool stack) are
+# imported by the registry's loader on first use, so the MCP initialize
+# handshake completes without paying for them.
 
-# ADK Tool Imports
-from google.adk.tools.function_tool import FunctionTool
-from google.adk.tools.load_web_page import load_web_page # Example ADK tool
-# ADK <-> MCP Conversion Utility
-from google.adk.tools.mcp_tool.conversion_utils import adk_to_mcp_tool_type
+# Registry of exposed tools (works both as a package module and as a script)
+try:
+    from .result_cache import NOT_CACHEABLE, CachePolicy, ResultCache
+    from .tool_executor import ExecutionPolicy, ToolExecutor, ToolTimeoutError
+    from .tool_registry import ToolRegistry
+except ImportError:
+    from result_cache import NOT_CACHEABLE, CachePolicy, ResultCache
+    from tool_executor import ExecutionPolicy, ToolExecutor, ToolTimeoutError
+    from tool_registry import ToolRegistry
 
 
 # --- Load Environment Variables (If ADK tools need them, e.g., API keys) ---
 load_dotenv() # Create a .env file in the same directory if needed
 
+# stdout carries the MCP protocol over stdio: all logs go to stderr.
+logger = logging.getLogger("adk_mcp_server")
+
 
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name, "").strip()
+    return float(value) if value else None
 
 
 def create_file(filename: str) -> str:
@@ -46,107 +66,286 @@ def create_file(filename: str) -> str:
     except Exception as e:
         return f"Error creating file '{filename}': {e}"
 
-# --- Prepare the ADK Tool ---
-# Instantiate the ADK tool you want to expose.
-# This tool will be wrapped and called by the MCP server.
-print("Initializing ADK load_web_page tool...")
-adk_tool_to_expose = FunctionTool(create_file)
-print(f"ADK tool '{adk_tool_to_expose.name}' initialized and ready to be exposed via MCP.")
+
+# --- Prepare the ADK Tools ---
+# Every tool in the registry is exposed via MCP. Its MCP schema is computed
+# once, when it is registered, not on every list_tools request. Registration
+# happens in _register_tools, on the first tools/list or tools/call.
+# ADK_MCP_TOOL_MODULES adds all tools of the given comma-separated modules
+# (e.g. "my_tools,pkg.more_tools"). More tools can be registered at runtime
+# with registry.register(...); connected clients are told to re-list them.
+#
+# Calls run through the executor: sync tools in a bounded thread pool (so a
+# slow call does not stall other requests), with per-tool concurrency limits
+# and timeouts from each tool's ExecutionPolicy.
+executor = ToolExecutor(
+    thread_workers=int(os.getenv("ADK_MCP_TOOL_WORKERS", "16")),
+    process_workers=int(os.getenv("ADK_MCP_PROCESS_WORKERS", "0")),  # >0 enables mode="process" policies
+    default_timeout=_env_float("ADK_MCP_TOOL_TIMEOUT"),  # seconds; unset: no timeout
+)
+#
+# Results of read-only tools are reused for the TTL of their CachePolicy;
+# tools with side effects are registered as NOT_CACHEABLE.
+result_cache = ResultCache(
+    max_entries=int(os.getenv("ADK_MCP_RESULT_CACHE_SIZE", "1024")),  # 0 disables the cache
+    max_bytes=int(float(os.getenv("ADK_MCP_RESULT_CACHE_MB", "64")) * 1024 * 1024),
+)
+
+
+def _web_page_loaded(result) -> bool:
+    # load_web_page returns "Failed to fetch url: <url>" when the request fails.
+    return not (isinstance(result, str) and result.startswith("Failed to fetch url"))
+
+
+def _register_tools(registry: ToolRegistry) -> None:
+    """Register (and import) the exposed tools; the registry runs this on first use."""
+    from google.adk.tools.load_web_page import load_web_page # Example ADK tool
+
+    # One at a time: the exists-then-create check must not race another call for the same name.
+    # Never cached: every call must reach the filesystem.
+    registry.register(create_file, policy=ExecutionPolicy(max_concurrency=1), cache=NOT_CACHEABLE)
+    # Network-bound: many in parallel, but do not let a hung site hold a worker forever.
+    # A page fetched in the last few minutes is served again without refetching it;
+    # a failed fetch (reported as a string, not as {"error": ...}) is retried.
+    registry.register(
+        load_web_page,
+        policy=ExecutionPolicy(max_concurrency=8, timeout=30.0),
+        cache=CachePolicy(
+            ttl=float(os.getenv("ADK_MCP_WEB_PAGE_TTL", "300")),
+            key_args=["url"],
+            is_cacheable=_web_page_loaded,
+        ),
+    )
+    for module_name in filter(None, (m.strip() for m in os.getenv("ADK_MCP_TOOL_MODULES", "").split(","))):
+        registry.register_module(module_name)
+    logger.info("ADK tools ready to be exposed via MCP: %s", ", ".join(registry.names()))
+
+
+# A replaced or removed tool's cached results are dropped with it.
+registry = ToolRegistry(loader=_register_tools, on_remove=result_cache.invalidate)
+
+
+async def _ensure_tools_loaded() -> None:
+    """First use: import and register the tools on a worker thread, keeping the event loop free."""
+    if not registry.loaded:
+        await asyncio.to_thread(registry.load)
 # --- End ADK Tool Prep ---
 
 
 # --- MCP Server Setup ---
-# print("Creating MCP Server instance...")
-import sys
-print("Creating MCP Server instance...", file=sys.stderr)
+logger.info("Creating MCP Server instance...")
 
 # Create a named MCP Server instance using the mcp.server library
 app = Server("adk_mcp_server")
 
+# Per-client state: one dict per MCP session (a stdio client, or one
+# Mcp-Session-Id over HTTP), dropped with the session.
+_session_states: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_session_states_lock = threading.Lock()
+
+
+def session_state() -> dict:
+    """
+    State private to the MCP client whose request is being handled.
+
+    Call it from a tool to keep data between that client's calls; other clients
+    sharing the server (HTTP mode) have their own. Raises LookupError outside
+    a request.
+    """
+    session = app.request_context.session
+    with _session_states_lock:
+        return _session_states.setdefault(session, {})
+
 
 # Implement the MCP server's handler to list available tools
 @app.list_tools()
-async def list_mcp_tools() -> list[mcp_types.Tool]:
-   """MCP handler to list tools this server exposes."""
-   print("MCP Server: Received list_tools request.")
-   # Convert the ADK tool's definition to the MCP Tool schema format
-   mcp_tool_schema = adk_to_mcp_tool_type(adk_tool_to_expose)
-   print(f"MCP Server: Advertising tool: {mcp_tool_schema.name}")
-   return [mcp_tool_schema]
+async def list_mcp_tools(request: mcp_types.ListToolsRequest) -> mcp_types.ListToolsResult:
+    """MCP handler to list tools this server exposes (precomputed by the registry)."""
+    await _ensure_tools_loaded()
+    # A client that has seen the list is told when it changes.
+    registry.attach(app.request_context.session)
+    logger.debug("Received list_tools request; advertising %d tools.", len(registry))
+    return registry.list_result()
 
 
-# Implement the MCP server's handler to execute a tool call
-@app.call_tool()
+# Implement the MCP server's handler to execute a tool call.
+# validate_input=False: the library would re-check the tool's schema itself on
+# every call; the registry validates with a validator compiled once instead.
+@app.call_tool(validate_input=False)
 async def call_mcp_tool(
-   name: str, arguments: dict
-) -> list[mcp_types.Content]: # MCP uses mcp_types.Content
-   """MCP handler to execute a tool call requested by an MCP client."""
-   print(f"MCP Server: Received call_tool request for '{name}' with args: {arguments}")
-
-
-   # Check if the requested tool name matches our wrapped ADK tool
-   if name == adk_tool_to_expose.name:
-       try:
-           # Execute the ADK tool's run_async method.
-           # Note: tool_context is None here because this MCP server is
-           # running the ADK tool outside of a full ADK Runner invocation.
-           # If the ADK tool requires ToolContext features (like state or auth),
-           # this direct invocation might need more sophisticated handling.
-           adk_tool_response = await adk_tool_to_expose.run_async(
-               args=arguments,
-               tool_context=None,
-           )
-           print(f"MCP Server: ADK tool '{name}' executed. Response: {adk_tool_response}")
-
-
-           # Format the ADK tool's response (often a dict) into an MCP-compliant format.
-           # Here, we serialize the response dictionary as a JSON string within TextContent.
-           # Adjust formatting based on the ADK tool's output and client needs.
-           response_text = json.dumps(adk_tool_response, indent=2)
-           # MCP expects a list of mcp_types.Content parts
-           return [mcp_types.TextContent(type="text", text=response_text)]
-
-
-       except Exception as e:
-           print(f"MCP Server: Error executing ADK tool '{name}': {e}")
-           # Return an error message in MCP format
-           error_text = json.dumps({"error": f"Failed to execute tool '{name}': {str(e)}"})
-           return [mcp_types.TextContent(type="text", text=error_text)]
-   else:
-       # Handle calls to unknown tools
-       print(f"MCP Server: Tool '{name}' not found/exposed by this server.")
-       error_text = json.dumps({"error": f"Tool '{name}' not implemented by this server."})
-       return [mcp_types.TextContent(type="text", text=error_text)]
-
-
-# --- MCP Server Runner ---
+    name: str, arguments: dict
+) -> list[mcp_types.Content] | mcp_types.CallToolResult: # MCP uses mcp_types.Content
+    """MCP handler to execute a tool call requested by an MCP client."""
+    logger.debug("Received call_tool request for '%s' with args: %s", name, arguments)
+
+    await _ensure_tools_loaded()
+    tool = registry.get(name)
+    if tool is None:
+        # Handle calls to unknown tools
+        logger.warning("Tool '%s' not found/exposed by this server.", name)
+        error_text = json.dumps({"error": f"Tool '{name}' not implemented by this server."})
+        return [mcp_types.TextContent(type="text", text=error_text)]
+
+    invalid = registry.validation_error(name, arguments)
+    if invalid is not None:
+        # Same error result the library's own input validation returns.
+        return mcp_types.CallToolResult(
+            content=[mcp_types.TextContent(type="text", text=f"Input validation error: {invalid}")],
+            isError=True,
+        )
+
+    try:
+        # Execute the ADK tool's run_async method through the executor
+        # (off the event loop for sync tools, within the tool's limits).
+        # Note: tool_context is None here because this MCP server is
+        # running the ADK tool outside of a full ADK Runner invocation.
+        # If the ADK tool requires ToolContext features (like state or auth),
+        # this direct invocation might need more sophisticated handling.
+        # A client's notifications/cancelled cancels this await.
+        cache_policy = registry.cache_policy(name)
+        if cache_policy is not None and result_cache.max_entries > 0:
+            # Read-only tool: reuse a fresh result, or share an identical call in flight.
+            response_text = await result_cache.get_or_run(
+                name, arguments, cache_policy, lambda: _execute(tool, name, arguments, cache_policy)
+            )
+        else:
+            response_text, _ = await _execute(tool, name, arguments)
+        # MCP expects a list of mcp_types.Content parts
+        return [mcp_types.TextContent(type="text", text=response_text)]
+
+    except ToolTimeoutError as e:
+        error_text = json.dumps({"error": str(e)})
+        return [mcp_types.TextContent(type="text", text=error_text)]
+
+    except Exception as e:
+        logger.error("Error executing ADK tool '%s': %s", name, e)
+        # Return an error message in MCP format
+        error_text = json.dumps({"error": f"Failed to execute tool '{name}': {str(e)}"})
+        return [mcp_types.TextContent(type="text", text=error_text)]
+
+
+async def _execute(tool, name: str, arguments: dict, cache_policy: Optional[CachePolicy] = None) -> Tuple[str, bool]:
+    """Run the tool; returns its serialized response and whether it may be cached (per cache_policy)."""
+    adk_tool_response = await executor.run(tool, arguments, registry.policy(name))
+    logger.debug("ADK tool '%s' executed. Response: %s", name, adk_tool_response)
+
+    # Format the ADK tool's response (often a dict) into an MCP-compliant format.
+    # Here, we serialize the response dictionary as a JSON string within TextContent.
+    # Adjust formatting based on the ADK tool's output and client needs.
+    response_text = json.dumps(adk_tool_response, indent=2)
+    # ADK tools report failures as {"error": ...}: worth retrying, not caching.
+    failed = isinstance(adk_tool_response, dict) and "error" in adk_tool_response
+    return response_text, not failed and (cache_policy is None or cache_policy.accepts(adk_tool_response))
+
+
+def initialization_options() -> InitializationOptions:
+    return InitializationOptions(
+        server_name=app.name, # Use the server name defined above
+        server_version="0.1.0",
+        capabilities=app.get_capabilities(
+            # tools_changed: the tool list can change at runtime (hot registration)
+            notification_options=NotificationOptions(tools_changed=True),
+            experimental_capabilities={},
+        ),
+    )
+
+
+# --- MCP Server Runners ---
 async def run_mcp_stdio_server():
-   """Runs the MCP server, listening for connections over standard input/output."""
-   # Use the stdio_server context manager from the mcp.server.stdio library
-   async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-       print("MCP Stdio Server: Starting handshake with client...")
-       await app.run(
-           read_stream,
-           write_stream,
-           InitializationOptions(
-               server_name=app.name, # Use the server name defined above
-               server_version="0.1.0",
-               capabilities=app.get_capabilities(
-                   # Define server capabilities - consult MCP docs for options
-                   notification_options=NotificationOptions(),
-                   experimental_capabilities={},
-               ),
-           ),
-       )
-       print("MCP Stdio Server: Run loop finished or client disconnected.")
+    """Runs the MCP server, listening for connections over standard input/output."""
+    # Use the stdio_server context manager from the mcp.server.stdio library
+    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+        logger.info("MCP Stdio Server: Starting handshake with client...")
+        await app.run(read_stream, write_stream, initialization_options())
+        logger.info("MCP Stdio Server: Run loop finished or client disconnected.")
+    # Calls still running in the pools are abandoned with the client.
+    executor.shutdown(wait=False)
+    logger.info("Result cache: %s", result_cache.stats())
+
+
+class _StreamableHTTPEndpoint:
+    """ASGI endpoint for /mcp (a class, so Starlette passes it the raw ASGI call)."""
+
+    def __init__(self, session_manager):
+        self.session_manager = session_manager
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.session_manager.handle_request(scope, receive, send)
+
+
+def create_http_app(json_response: bool = True):
+    """
+    ASGI app serving this MCP server over streamable HTTP at /mcp.
+
+    One process serves many clients. Each client gets its own session
+    (Mcp-Session-Id), with its own session_state() and list_changed
+    notifications, while sharing the warm imports, the tool registry and the
+    executor pools. Sessions idle for ADK_MCP_SESSION_IDLE_TIMEOUT seconds are
+    closed.
+
+    json_response answers each call with a plain JSON body rather than an SSE
+    stream, which is cheaper per call. The tools here do not stream progress,
+    and notifications still go over the session's GET stream.
+    """
+    # Imported here: stdio mode does not need the HTTP stack.
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+
+    session_manager = StreamableHTTPSessionManager(
+        app=app,
+        json_response=json_response,
+        session_idle_timeout=_env_float("ADK_MCP_SESSION_IDLE_TIMEOUT") or 1800.0,
+    )
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_):
+        # A long-lived server loads its tools before the first client arrives.
+        await _ensure_tools_loaded()
+        async with session_manager.run():
+            logger.info("MCP HTTP Server: accepting sessions at /mcp.")
+            yield
+        executor.shutdown(wait=False)
+        logger.info("Result cache: %s", result_cache.stats())
+
+    return Starlette(routes=[Route("/mcp", endpoint=_StreamableHTTPEndpoint(session_manager))], lifespan=lifespan)
+
+
+def run_mcp_http_server(host: str = "127.0.0.1", port: int = 8000, json_response: bool = True) -> None:
+    """Runs the MCP server over streamable HTTP (SSE or JSON responses), for many clients at once."""
+    import uvicorn
+
+    uvicorn.run(
+        create_http_app(json_response),
+        host=host,
+        port=port,
+        # Agents call tools in bursts: keep their connections open between turns.
+        timeout_keep_alive=int(os.getenv("ADK_MCP_KEEP_ALIVE", "75")),
+        log_level=logging.getLevelName(logging.getLogger().level).lower(),
+    )
 
 
 if __name__ == "__main__":
-   print("Launching MCP Server to expose ADK tools via stdio...")
-   try:
-       asyncio.run(run_mcp_stdio_server())
-   except KeyboardInterrupt:
-       print("\nMCP Server (stdio) stopped by user.")
-   except Exception as e:
-       print(f"MCP Server (stdio) encountered an error: {e}")
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=os.getenv("ADK_MCP_LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Expose ADK tools over MCP.")
+    parser.add_argument("--transport", choices=("stdio", "http"), default=os.getenv("ADK_MCP_TRANSPORT", "stdio"))
+    parser.add_argument("--host", default=os.getenv("ADK_MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ADK_MCP_PORT", "8000")))
+    parser.add_argument("--sse-responses", action="store_true", help="Answer calls with SSE streams instead of JSON bodies.")
+    args = parser.parse_args()
+
+    logger.info("Launching MCP Server to expose ADK tools via %s...", args.transport)
+    try:
+        if args.transport == "http":
+            run_mcp_http_server(args.host, args.port, json_response=not args.sse_responses)
+        else:
+            asyncio.run(run_mcp_stdio_server())
+    except KeyboardInterrupt:
+        logger.info("MCP Server (%s) stopped by user.", args.transport)
+    except Exception as e:
+        logger.error("MCP Server (%s) encountered an error: %s", args.transport, e)
 # --- End MCP Server ---
@@ -0,0 +1,206 @@
+# result_cache.py
+
+"""
+Result cache for read-only MCP tool calls.
+
+Lookups, listings and page loads return the same thing for a while, yet every
+tools/call would run and serialize them again. A tool registered with a
+CachePolicy has its serialized results kept in an LRU cache:
+
+- the key is the tool name plus its arguments in canonical JSON (sorted keys),
+  restricted to the policy's key_args when given, so arguments that do not
+  change the result (a "reason" string, say) do not split the cache,
+- entries expire after the policy's ttl, and the cache is bounded both in
+  entries and in bytes of result text,
+- identical calls that arrive while one is running wait for that call instead
+  of running the tool again (single-flight),
+- per-tool hit, miss and coalesced counts are kept for stats().
+
+Only tools whose policy says read_only are cached, and only results the
+server and the policy's is_cacheable predicate accept: a tool that reports a
+failure in its own way (a "Failed to fetch" string, say) must not have that
+failure served again for a whole TTL. invalidate(name) drops a tool's entries
+when the tool is replaced or removed; calls of the old tool still running then
+are not stored. Tools with side effects
+(create_file) must never be: registering them with NOT_CACHEABLE makes that
+explicit.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CachePolicy:
+    """Whether and how results of one tool are cached."""
+
+    __slots__ = ("read_only", "ttl", "key_args", "is_cacheable")
+
+    def __init__(
+        self,
+        read_only: bool = True,
+        ttl: float = 60.0,
+        key_args: Optional[Sequence[str]] = None,
+        is_cacheable: Optional[Callable[[Any], bool]] = None,
+    ):
+        if ttl <= 0:
+            raise ValueError("ttl must be positive.")
+        self.read_only = read_only  # False: the tool has side effects, never cache it
+        self.ttl = ttl  # seconds
+        self.key_args = tuple(key_args) if key_args is not None else None  # None: all arguments
+        self.is_cacheable = is_cacheable  # tool result -> False for a failure; None: any result
+
+    def accepts(self, result: Any) -> bool:
+        """Whether this tool result may be cached (is_cacheable says it is not a failure)."""
+        return self.is_cacheable is None or bool(self.is_cacheable(result))
+
+    def __repr__(self) -> str:
+        return (
+            f"CachePolicy(read_only={self.read_only}, ttl={self.ttl}, key_args={self.key_args}, "
+            f"is_cacheable={self.is_cacheable!r})"
+        )
+
+
+# For tools with side effects: documents that they are deliberately not cached.
+NOT_CACHEABLE = CachePolicy(read_only=False)
+
+_COUNTERS = ("hits", "misses", "coalesced", "expired", "evicted", "uncacheable")
+
+
+class ResultCache:
+    """LRU of serialized tool results with TTLs, single-flight and hit counters."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # (tool name, canonical arguments) -> (expires at (monotonic), result text).
+        # Sizes are counted in characters of text, close to bytes for JSON.
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        # Calls running now, by key: [shared task, number of callers waiting on it].
+        self._in_flight: Dict[Tuple[str, str], list] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        # Bumped by invalidate(name): a call started before it does not store its result.
+        self._generations: Dict[str, int] = {}
+
+    @staticmethod
+    def key(name: str, arguments: Dict[str, Any], policy: CachePolicy) -> Tuple[str, str]:
+        if policy.key_args is not None:
+            arguments = {k: arguments[k] for k in policy.key_args if k in arguments}
+        return name, json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+
+    async def get_or_run(
+        self,
+        name: str,
+        arguments: Dict[str, Any],
+        policy: CachePolicy,
+        run: Callable[[], Awaitable[Tuple[str, bool]]],
+    ) -> str:
+        """
+        The cached result text of name(arguments), or run() to produce it.
+
+        run returns (text, cacheable); a result marked not cacheable (an error)
+        is returned to every caller waiting for it but not stored. Exceptions
+        are never cached.
+        """
+        key = self.key(name, arguments, policy)
+        counters = self._counters(name)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, text = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                counters["hits"] += 1
+                return text
+            self._remove(key)
+            counters["expired"] += 1
+
+        flight = self._in_flight.get(key)
+        if flight is not None:
+            counters["coalesced"] += 1
+        else:
+            counters["misses"] += 1
+            task = asyncio.ensure_future(self._fill(key, policy, run, counters, self._generations.get(name, 0)))
+            flight = self._in_flight[key] = [task, 0]
+            task.add_done_callback(lambda _, flight=flight: self._end_flight(key, flight))
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            # shield: one caller being cancelled must not cancel the others' call.
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if flight[1] == 1 and not task.done():
+                task.cancel()  # nobody else is waiting for it
+            raise
+        finally:
+            flight[1] -= 1
+
+    def _end_flight(self, key, flight: list) -> None:
+        # invalidate() may have replaced it with a call of the new tool meanwhile.
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+
+    async def _fill(self, key, policy: CachePolicy, run, counters: Dict[str, int], generation: int) -> str:
+        text, cacheable = await run()
+        if not cacheable:
+            counters["uncacheable"] += 1
+            return text
+        if self._generations.get(key[0], 0) != generation:
+            return text  # the tool was replaced while this call ran
+        size = len(text)
+        if size > self.max_bytes:
+            return text
+        self._entries[key] = (time.monotonic() + policy.ttl, text)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            old_key, _ = next(iter(self._entries.items()))
+            self._remove(old_key)
+            self._counters(old_key[0])["evicted"] += 1
+        return text
+
+    def _remove(self, key) -> None:
+        _, text = self._entries.pop(key)
+        self._bytes -= len(text)
+
+    def _counters(self, name: str) -> Dict[str, int]:
+        counters = self._stats.get(name)
+        if counters is None:
+            counters = self._stats[name] = dict.fromkeys(_COUNTERS, 0)
+        return counters
+
+    def invalidate(self, name: Optional[str] = None) -> int:
+        """
+        Drop the cached results of one tool (or all); returns how many. Calls
+        running now still answer their callers, but later calls do not join
+        them and their results are not stored. Call it on the event loop.
+        """
+        keys = [k for k in self._entries if name is None or k[0] == name]
+        for key in keys:
+            self._remove(key)
+        for key in [k for k in self._in_flight if name is None or k[0] == name]:
+            del self._in_flight[key]
+        for tool in ({name} if name is not None else set(self._stats) | set(self._generations)):
+            self._generations[tool] = self._generations.get(tool, 0) + 1
+        return len(keys)
+
+    def stats(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Counters and hit rate (hits + coalesced over lookups), for one tool or all."""
+        if name is not None:
+            counters = dict(self._stats.get(name) or dict.fromkeys(_COUNTERS, 0))
+        else:
+            counters = dict.fromkeys(_COUNTERS, 0)
+            for per_tool in self._stats.values():
+                for counter, value in per_tool.items():
+                    counters[counter] += value
+        lookups = counters["hits"] + counters["coalesced"] + counters["misses"]  # an expired entry is then a miss
+        counters["hit_rate"] = (counters["hits"] + counters["coalesced"]) / lookups if lookups else 0.0
+        counters["entries"] = len(self._entries) if name is None else sum(1 for k in self._entries if k[0] == name)
+        counters["bytes"] = self._bytes if name is None else sum(len(v[1]) for k, v in self._entries.items() if k[0] == name)
+        return counters
@@ -0,0 +1,219 @@
+# tool_executor.py
+
+"""
+Bounded, cancellable execution of ADK tools for the MCP server.
+
+The MCP server handles every request in its own task, but a synchronous tool
+(create_file, load_web_page, most FunctionTools) would still run on the event
+loop and stall every other in-flight request until it returns. ToolExecutor
+runs each call according to the tool's ExecutionPolicy:
+
+- "inline": awaited on the event loop (for native async tools),
+- "thread": run in a bounded thread pool (blocking I/O),
+- "process": run in a process pool (CPU-bound plain functions),
+- "auto" (default): "thread" for FunctionTools wrapping a sync function,
+  "inline" otherwise.
+
+Each tool can cap its concurrent calls and set a timeout. When a call is
+cancelled (the client sent notifications/cancelled) or times out, a call still
+waiting for a slot or a worker is dropped. A call that already started in a
+thread or process cannot be interrupted: it runs to completion in the
+background and keeps its concurrency slot until then, so the limits stay true.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    # ADK is imported on first use, not at server start (see ToolRegistry's loader).
+    from google.adk.tools.base_tool import BaseTool
+    from google.adk.tools.function_tool import FunctionTool
+
+logger = logging.getLogger(__name__)
+
+MODES = ("auto", "inline", "thread", "process")
+
+
+class ExecutionPolicy:
+    """How calls to one tool are run: where, how many at once, and for how long."""
+
+    __slots__ = ("mode", "max_concurrency", "timeout")
+
+    def __init__(self, mode: str = "auto", max_concurrency: Optional[int] = None, timeout: Optional[float] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown execution mode {mode!r}; expected one of {', '.join(MODES)}.")
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.mode = mode
+        self.max_concurrency = max_concurrency  # None: only bounded by the pool
+        self.timeout = timeout  # seconds; None: the executor's default
+
+    def __repr__(self) -> str:
+        return f"ExecutionPolicy(mode={self.mode!r}, max_concurrency={self.max_concurrency}, timeout={self.timeout})"
+
+
+DEFAULT_POLICY = ExecutionPolicy()
+
+
+class ToolTimeoutError(TimeoutError):
+    pass
+
+
+# --- Worker-side helpers ---
+
+class _WorkerLoop:
+    """An event loop owned by one worker thread (reused across its calls), closed when the thread exits."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+
+    def __del__(self):
+        self.loop.close()
+
+
+_thread_state = threading.local()
+
+
+def _run_tool_in_thread(tool: "BaseTool", args: Dict[str, Any]) -> Any:
+    """Run a tool's run_async to completion on this worker thread's own event loop."""
+    worker = getattr(_thread_state, "worker", None)
+    if worker is None:
+        worker = _thread_state.worker = _WorkerLoop()
+    return worker.loop.run_until_complete(tool.run_async(args=args, tool_context=None))
+
+
+_process_tools: Dict[Callable, "FunctionTool"] = {}
+
+
+def _run_function_in_process(func: Callable, args: Dict[str, Any]) -> Any:
+    """Run a plain function as a FunctionTool (same argument validation) in a worker process."""
+    from google.adk.tools.function_tool import FunctionTool
+
+    tool = _process_tools.get(func)
+    if tool is None:
+        tool = _process_tools[func] = FunctionTool(func)
+    return _run_tool_in_thread(tool, args)
+
+
+def _is_sync_function_tool(tool: "BaseTool") -> bool:
+    from google.adk.tools.function_tool import FunctionTool
+
+    if not isinstance(tool, FunctionTool):
+        return False
+    func = tool.func
+    return not (inspect.iscoroutinefunction(func) or inspect.iscoroutinefunction(getattr(func, "__call__", None)))
+
+
+class ToolExecutor:
+    """Runs tool calls off the event loop with per-tool limits and timeouts."""
+
+    def __init__(
+        self,
+        thread_workers: int = 16,
+        process_workers: int = 0,
+        default_timeout: Optional[float] = None,
+    ):
+        self._threads = concurrent.futures.ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="mcp-tool")
+        self._process_workers = process_workers
+        self._processes: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.default_timeout = default_timeout
+        # Per-tool concurrency slots and calls currently running, touched on the event loop only.
+        self._slots: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    def mode_for(self, tool: "BaseTool", policy: ExecutionPolicy) -> str:
+        if policy.mode != "auto":
+            return policy.mode
+        return "thread" if _is_sync_function_tool(tool) else "inline"
+
+    def in_flight(self, name: Optional[str] = None) -> int:
+        """Calls holding a slot (running, or started and abandoned), for one tool or all."""
+        if name is not None:
+            return self._in_flight.get(name, 0)
+        return sum(self._in_flight.values())
+
+    async def run(self, tool: "BaseTool", args: Dict[str, Any], policy: Optional[ExecutionPolicy] = None) -> Any:
+        """
+        Run one call of tool with args. Raises ToolTimeoutError when the call
+        exceeds its timeout; cancelling the awaiting task cancels the call.
+        """
+        policy = policy or DEFAULT_POLICY
+        timeout = policy.timeout if policy.timeout is not None else self.default_timeout
+        try:
+            return await asyncio.wait_for(self._run(tool, args, policy), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Tool '%s' timed out after %ss.", tool.name, timeout)
+            raise ToolTimeoutError(f"Tool '{tool.name}' timed out after {timeout}s.") from None
+
+    async def _run(self, tool: "BaseTool", args: Dict[str, Any], policy: ExecutionPolicy) -> Any:
+        mode = self.mode_for(tool, policy)
+        slots = None
+        if policy.max_concurrency is not None:
+            # Keyed by limit too: re-registering a tool with a new limit takes effect.
+            key = (tool.name, policy.max_concurrency)
+            slots = self._slots.get(key)
+            if slots is None:
+                slots = self._slots[key] = asyncio.Semaphore(policy.max_concurrency)
+            await slots.acquire()
+        self._in_flight[tool.name] = self._in_flight.get(tool.name, 0) + 1
+        release = functools.partial(self._release, tool.name, slots)
+
+        if mode == "inline":
+            try:
+                return await tool.run_async(args=args, tool_context=None)
+            finally:
+                release()
+
+        loop = asyncio.get_running_loop()
+        try:
+            if mode == "process":
+                from google.adk.tools.function_tool import FunctionTool
+
+                if not isinstance(tool, FunctionTool):
+                    raise ValueError(f"Tool '{tool.name}': only FunctionTools can run in a process pool.")
+                future = self._process_pool().submit(_run_function_in_process, tool.func, args)
+            else:
+                # In the caller's context, so the tool still sees the MCP request
+                # (and its session) like an inline tool would.
+                future = self._threads.submit(contextvars.copy_context().run, _run_tool_in_thread, tool, args)
+        except BaseException:
+            release()
+            raise
+        # The slot is freed when the call really ends, even if nobody waits for
+        # the result any more (cancelled or timed out while running).
+        future.add_done_callback(lambda _: _call_soon(loop, release))
+        # Cancelling the awaiting task cancels the future if it has not started yet.
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _release(self, name: str, slots: Optional[asyncio.Semaphore]) -> None:
+        self._in_flight[name] -= 1
+        if slots is not None:
+            slots.release()
+
+    def _process_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._process_workers < 1:
+            raise ValueError("No process pool configured (process_workers=0).")
+        with self._lock:
+            if self._processes is None:
+                self._processes = concurrent.futures.ProcessPoolExecutor(max_workers=self._process_workers)
+            return self._processes
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop the pools; queued calls are cancelled."""
+        self._threads.shutdown(wait=wait, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait, cancel_futures=True)
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable[[], None]) -> None:
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        pass  # the loop is closed: the server is shutting down
@@ -0,0 +1,309 @@
+# tool_registry.py
+
+"""
+Registry of the ADK tools an MCP server exposes.
+
+Each tool's MCP schema is converted once, when the tool is registered, and
+the tools/list result is built once per change of the tool set, so listing
+costs nothing per request however many tools are exposed. Calls are
+dispatched with a dict lookup by name, and their arguments are checked by a
+JSON Schema validator compiled at registration.
+
+Tools can be registered (or removed) while clients are connected: every
+session that has listed the tools gets a notifications/tools/list_changed
+and re-lists them. Each tool is registered with the ExecutionPolicy the
+server's ToolExecutor runs it under and, if its results may be reused, the
+CachePolicy of the server's ResultCache. When a tool is replaced or removed,
+the on_remove hook (the server passes ResultCache.invalidate) is called with
+its name, so results of the old code are not served any more.
+
+Importing ADK's tool stack takes a good part of a second, so a registry can
+be given a loader that registers the tools on first use (the first
+tools/list or tools/call) rather than at import: the server answers the MCP
+initialize handshake without importing ADK at all.
+"""
+
+import asyncio
+import importlib
+import inspect
+import logging
+import threading
+import weakref
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Union
+
+from mcp import types as mcp_types
+
+try:
+    from .result_cache import CachePolicy
+    from .tool_executor import DEFAULT_POLICY, ExecutionPolicy
+except ImportError:
+    from result_cache import CachePolicy
+    from tool_executor import DEFAULT_POLICY, ExecutionPolicy
+
+if TYPE_CHECKING:
+    from google.adk.tools.base_tool import BaseTool
+
+logger = logging.getLogger(__name__)
+
+ToolLike = Union["BaseTool", Callable]
+
+
+class ToolRegistry:
+    """Name -> ADK tool, with the MCP schemas and tools/list result precomputed."""
+
+    def __init__(
+        self,
+        tools: Iterable[ToolLike] = (),
+        loader: Optional[Callable[["ToolRegistry"], None]] = None,
+        on_remove: Optional[Callable[[str], Any]] = None,
+    ):
+        self._tools: Dict[str, "BaseTool"] = {}
+        self._schemas: Dict[str, mcp_types.Tool] = {}
+        self._policies: Dict[str, ExecutionPolicy] = {}
+        self._cache_policies: Dict[str, CachePolicy] = {}
+        self._validators: Dict[str, Any] = {}
+        self._listing: Optional[mcp_types.ListToolsResult] = None
+        self._lock = threading.Lock()
+        # Sessions to notify when the tool set changes, and the loop they run on.
+        self._sessions: "weakref.WeakSet" = weakref.WeakSet()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending_notifications: set = set()
+        # Registers the tools (and imports them) on first use; see load().
+        self._loader = loader
+        self._loaded = loader is None
+        self._loading = False
+        self._load_lock = threading.RLock()
+        # Called with the name of a replaced or unregistered tool, on the sessions' loop if there is one.
+        self._on_remove = on_remove
+        for tool in tools:
+            self.register(tool)
+
+    # --- Deferred loading ---
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self) -> None:
+        """
+        Run the loader once. Called by every lookup and registration, so tools
+        are imported when first needed; other threads wait for it to finish.
+        If the loader fails, the next lookup tries again.
+        """
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded or self._loading:
+                return  # done meanwhile, or the loader itself is registering tools
+            self._loading = True
+            try:
+                self._loader(self)
+                self._loaded = True
+                logger.info("Loaded %d tools.", len(self._tools))
+            finally:
+                self._loading = False
+
+    # --- Registration ---
+
+    def register(
+        self,
+        tool: ToolLike,
+        replace: bool = False,
+        policy: Optional[ExecutionPolicy] = None,
+        cache: Optional[CachePolicy] = None,
+    ) -> "BaseTool":
+        """
+        Expose an ADK tool (a plain function is wrapped in a FunctionTool),
+        run under policy (default: auto mode, no limit, the server's timeout).
+        Its results are cached only if cache is a read-only CachePolicy.
+
+        Raises ValueError if a tool with the same name exists, unless replace.
+        """
+        self.load()
+        tool = self._add(tool, replace, policy, cache)
+        self._changed()
+        return tool
+
+    def register_module(
+        self,
+        module: Union[ModuleType, str],
+        replace: bool = False,
+        policy: Optional[ExecutionPolicy] = None,
+        cache: Optional[CachePolicy] = None,
+    ) -> List["BaseTool"]:
+        """
+        Expose every tool a module defines: its BaseTool instances and its
+        public functions (names not starting with "_", defined in the module
+        itself rather than imported into it), all under policy and cache
+        (only pass a cache policy for a module of read-only tools). Clients
+        are notified once.
+        """
+        from google.adk.tools.base_tool import BaseTool
+
+        self.load()
+        if isinstance(module, str):
+            module = importlib.import_module(module)
+        tools: List[ToolLike] = []
+        for name, value in vars(module).items():
+            if name.startswith("_"):
+                continue
+            if isinstance(value, BaseTool):
+                tools.append(value)
+            elif inspect.isfunction(value) and value.__module__ == module.__name__:
+                tools.append(value)
+        added = [self._add(tool, replace, policy, cache) for tool in tools]
+        logger.info("Registered %d tools from %s.", len(added), module.__name__)
+        self._changed()
+        return added
+
+    def _add(
+        self, tool: ToolLike, replace: bool, policy: Optional[ExecutionPolicy], cache: Optional[CachePolicy]
+    ) -> "BaseTool":
+        import jsonschema
+        from google.adk.tools.base_tool import BaseTool
+        from google.adk.tools.function_tool import FunctionTool
+        from google.adk.tools.mcp_tool.conversion_utils import adk_to_mcp_tool_type
+
+        if not isinstance(tool, BaseTool):
+            tool = FunctionTool(tool)
+        schema = adk_to_mcp_tool_type(tool)
+        # Checked against its metaschema once, here, instead of on every call.
+        validator_class = jsonschema.validators.validator_for(schema.inputSchema)
+        validator_class.check_schema(schema.inputSchema)
+        validator = validator_class(schema.inputSchema)
+        with self._lock:
+            replaced = tool.name in self._tools
+            if replaced and not replace:
+                raise ValueError(f"Tool '{tool.name}' is already registered.")
+            self._tools[tool.name] = tool
+            self._schemas[tool.name] = schema
+            self._policies[tool.name] = policy or DEFAULT_POLICY
+            self._validators[tool.name] = validator
+            if cache is not None and cache.read_only:
+                self._cache_policies[tool.name] = cache
+            else:
+                self._cache_policies.pop(tool.name, None)
+            self._listing = None
+        if replaced:
+            self._removed(tool.name)
+        logger.debug("Registered tool '%s'.", tool.name)
+        return tool
+
+    def unregister(self, name: str) -> bool:
+        """Stop exposing a tool; returns False if there was none by that name."""
+        self.load()
+        with self._lock:
+            if self._tools.pop(name, None) is None:
+                return False
+            del self._schemas[name]
+            del self._policies[name]
+            del self._validators[name]
+            self._cache_policies.pop(name, None)
+            self._listing = None
+        self._removed(name)
+        logger.debug("Unregistered tool '%s'.", name)
+        self._changed()
+        return True
+
+    # --- Lookup ---
+
+    def get(self, name: str) -> Optional["BaseTool"]:
+        if not self._loaded:
+            self.load()
+        return self._tools.get(name)
+
+    def schema(self, name: str) -> Optional[mcp_types.Tool]:
+        self.load()
+        return self._schemas.get(name)
+
+    def policy(self, name: str) -> ExecutionPolicy:
+        self.load()
+        return self._policies.get(name, DEFAULT_POLICY)
+
+    def cache_policy(self, name: str) -> Optional[CachePolicy]:
+        """The tool's cache policy, or None if its results must not be reused."""
+        self.load()
+        return self._cache_policies.get(name)
+
+    def validation_error(self, name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        """Why arguments do not match the tool's input schema, or None if they do."""
+        self.load()
+        validator = self._validators.get(name)
+        if validator is None:
+            return None
+        import jsonschema  # loaded with the tools
+
+        error = jsonschema.exceptions.best_match(validator.iter_errors(arguments))
+        return None if error is None else error.message
+
+    def __contains__(self, name: str) -> bool:
+        self.load()
+        return name in self._tools
+
+    def __len__(self) -> int:
+        self.load()
+        return len(self._tools)
+
+    def names(self) -> List[str]:
+        self.load()
+        return list(self._tools)
+
+    def list_result(self) -> mcp_types.ListToolsResult:
+        """The tools/list result, rebuilt only after the tool set changed."""
+        self.load()
+        listing = self._listing
+        if listing is None:
+            with self._lock:
+                listing = self._listing = mcp_types.ListToolsResult(tools=list(self._schemas.values()))
+        return listing
+
+    # --- list_changed notifications ---
+
+    def attach(self, session) -> None:
+        """Notify this session (an mcp ServerSession) of later changes to the tool set."""
+        self._sessions.add(session)
+        self._loop = asyncio.get_running_loop()
+
+    async def notify_list_changed(self) -> None:
+        """Send notifications/tools/list_changed to every attached session."""
+        for session in list(self._sessions):
+            try:
+                await session.send_tool_list_changed()
+            except Exception as e:
+                # The client went away; it will list the tools again if it reconnects.
+                logger.debug("Dropping session after failed list_changed notification: %s", e)
+                self._sessions.discard(session)
+
+    def _removed(self, name: str) -> None:
+        hook = self._on_remove
+        if hook is None:
+            return
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not loop:
+                # Replaced from another thread: the hook's state belongs to the server's loop.
+                loop.call_soon_threadsafe(hook, name)
+                return
+        hook(name)
+
+    def _changed(self) -> None:
+        loop = self._loop
+        if self._loading or loop is None or not self._sessions or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            task = loop.create_task(self.notify_list_changed())
+            # Keep a reference until it finishes, or the task may be garbage collected.
+            self._pending_notifications.add(task)
+            task.add_done_callback(self._pending_notifications.discard)
+        else:
+            # Registered from another thread (e.g. a plugin loader): hand over to the server's loop.
+            asyncio.run_coroutine_threadsafe(self.notify_list_changed(), loop)
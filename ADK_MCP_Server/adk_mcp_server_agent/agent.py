@@ -4,24 +4,32 @@ import os
 from google.adk.agents import LlmAgent
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.tools.mcp_tool import McpToolset
-from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
+from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams, StreamableHTTPConnectionParams
 from mcp import StdioServerParameters
 
 # Absolute path to your ADK MCP Server script
 PATH_TO_YOUR_MCP_SERVER_SCRIPT = r"C:\Users\sures\OneDrive\Personal Folders\AI Learning\Google ADK\GoogleADK\ADK_MCP_Server\adk_mcp_server\adk_mcp_server.py"
 
+# URL of a shared server started with `adk_mcp_server.py --transport http`
+# (e.g. http://127.0.0.1:8000/mcp). Unset: spawn a private server over stdio.
+ADK_MCP_SERVER_URL = os.getenv("ADK_MCP_SERVER_URL")
+
+if ADK_MCP_SERVER_URL:
+    # Connect to the warm server: no per-agent process start or ADK import.
+    connection_params = StreamableHTTPConnectionParams(url=ADK_MCP_SERVER_URL)
+else:
+    connection_params = StdioConnectionParams(
+        server_params=StdioServerParameters(
+            command='python',  # Runs your MCP server
+            args=[PATH_TO_YOUR_MCP_SERVER_SCRIPT],
+        )
+    )
+
 root_agent = LlmAgent(
     model=LiteLlm(model="openai/gpt-4o"),
     name='adk_mcp_server_agent',
     instruction="Use the tools exposed by the ADK MCP Server to help the user.",
     tools=[
-        McpToolset(
-            connection_params=StdioConnectionParams(
-                server_params=StdioServerParameters(
-                    command='python',  # Runs your MCP server
-                    args=[PATH_TO_YOUR_MCP_SERVER_SCRIPT],
-                )
-            )
-        )
+        McpToolset(connection_params=connection_params)
     ],
 )
@@ -0,0 +1,153 @@
+"""
+Result cache latency and correctness gates, over an in-memory MCP session.
+
+Runs the server's own call_tool handler (validation, executor, cache) against
+a client connected in memory, so no process or network is involved. A
+read-only "lookup" tool that sleeps --lookup-ms is registered next to the
+server's tools, and the script reports per call:
+
+- miss: the first call for an argument (runs the tool),
+- hit: the same call again,
+- coalesced: --concurrency identical calls at once (the tool runs once).
+
+It then checks what must never be cached, and exits with status 1 if any
+check fails:
+
+- a failed load_web_page call (a "Failed to fetch url" string, on an
+  unreachable local port) is fetched again, not served from the cache,
+- a tool replaced with registry.register(..., replace=True), or
+  unregistered, no longer has its old results served.
+
+    python benchmarks/bench_result_cache.py
+    python benchmarks/bench_result_cache.py --calls 200 --json cache.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+from mcp.shared.memory import create_connected_server_and_client_session
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.environ.setdefault("ADK_MCP_LOG_LEVEL", "WARNING")
+
+from adk_mcp_server import CachePolicy, adk_mcp_server as server  # noqa: E402
+
+UNREACHABLE_URL = "http://127.0.0.1:1/"
+
+
+def latency_summary(samples_s):
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95))}
+
+
+def make_lookup(delay_s: float, version: str):
+    runs = []
+
+    def lookup(key: str) -> dict:
+        """Slow read-only lookup."""
+        runs.append(key)
+        time.sleep(delay_s)
+        return {"key": key, "version": version}
+
+    return lookup, runs
+
+
+async def call(session, name: str, arguments: dict) -> str:
+    result = await session.call_tool(name, arguments)
+    if result.isError:
+        raise RuntimeError(f"{name} failed: {result.content}")
+    return result.content[0].text
+
+
+async def run(args) -> dict:
+    lookup, runs = make_lookup(args.lookup_ms / 1000.0, "v1")
+    server.registry.register(lookup, cache=CachePolicy(ttl=600))
+    checks = {}
+    async with create_connected_server_and_client_session(server.app) as session:
+        await session.list_tools()
+
+        miss, hit = [], []
+        for i in range(args.calls):
+            t = time.perf_counter()
+            await call(session, "lookup", {"key": f"k{i}"})
+            miss.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            await call(session, "lookup", {"key": f"k{i}"})
+            hit.append(time.perf_counter() - t)
+
+        runs.clear()
+        t = time.perf_counter()
+        await asyncio.gather(*(call(session, "lookup", {"key": "shared"}) for _ in range(args.concurrency)))
+        coalesced_s = time.perf_counter() - t
+        checks["coalesced calls run the tool once"] = len(runs) == 1
+
+        before = server.result_cache.stats("load_web_page")
+        failures = [await call(session, "load_web_page", {"url": UNREACHABLE_URL}) for _ in range(2)]
+        after = server.result_cache.stats("load_web_page")
+        checks["failed fetch is a failure string"] = all("Failed to fetch url" in text for text in failures)
+        checks["failed fetch is not cached"] = (
+            after["hits"] == before["hits"] and after["uncacheable"] - before["uncacheable"] == 2
+        )
+
+        replacement, _ = make_lookup(0.0, "v2")
+        server.registry.register(replacement, replace=True, cache=CachePolicy(ttl=600))
+        text = await call(session, "lookup", {"key": "k0"})
+        checks["replaced tool's results are dropped"] = json.loads(text)["version"] == "v2"
+        server.registry.unregister("lookup")
+        checks["unregistered tool's results are dropped"] = server.result_cache.stats("lookup")["entries"] == 0
+
+    return {
+        "miss": latency_summary(miss),
+        "hit": latency_summary(hit),
+        "coalesced": {"calls": args.concurrency, "total_ms": coalesced_s * 1000.0},
+        "checks": checks,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50, help="Distinct lookups (each called twice).")
+    parser.add_argument("--lookup-ms", type=float, default=20.0, help="Duration of one lookup.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Identical calls issued at once.")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        server.executor.shutdown()
+
+    print(f"{'call':<12}{'p50 ms':>9}{'p95 ms':>9}")
+    for kind in ("miss", "hit"):
+        print(f"{kind:<12}{result[kind]['p50_ms']:>9.2f}{result[kind]['p95_ms']:>9.2f}")
+    print(f"{args.concurrency} identical concurrent calls: {result['coalesced']['total_ms']:.1f} ms in total")
+    print()
+    for check, ok in result["checks"].items():
+        print(f"{'ok  ' if ok else 'FAIL'}  {check}")
+
+    if args.json_path:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "lookup_ms": args.lookup_ms,
+            },
+            **result,
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+    if not all(result["checks"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Cold-start profile of the stdio MCP server: time to handshake and import cost.
+
+Starts `python -X importtime adk_mcp_server/adk_mcp_server.py` --runs times
+and speaks raw JSON-RPC to it over stdio (no client library, so this script's
+own imports do not matter). For each run it records, from process spawn:
+
+- handshake: the initialize response (what StdioConnectionParams' timeout
+  covers when an agent connects),
+- first list: the tools/list response that follows (the tools are imported
+  and registered on this first use),
+- first call: one create_file call in a temporary directory.
+
+-X importtime lines are timestamped as they arrive on stderr, so the import
+report shows what was imported before the handshake completed: modules,
+summed self time, the heaviest top-level packages, and whether ADK was among
+them. As a floor, the time for the same interpreter to import only what the
+lowlevel MCP server needs (and say so on stdout) is measured too.
+
+Use --max-handshake-ms as a regression gate: the script exits with status 1
+when the median handshake is slower.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --max-handshake-ms 1500 --json startup.json
+    python benchmarks/bench_startup.py --server /path/to/other/checkout/adk_mcp_server/adk_mcp_server.py
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(PROJECT_DIR, "adk_mcp_server", "adk_mcp_server.py")
+FLOOR_SCRIPT = "import mcp.server.lowlevel, mcp.server.models, mcp.server.stdio; print('ready', flush=True)"
+PROTOCOL_VERSION = "2025-06-18"
+
+
+def request(msg_id: int, method: str, params: dict) -> bytes:
+    return (json.dumps({"jsonrpc": "2.0", "id": msg_id, "method": method, "params": params}) + "\n").encode()
+
+
+def notification(method: str) -> bytes:
+    return (json.dumps({"jsonrpc": "2.0", "method": method}) + "\n").encode()
+
+
+def read_response(stdout, msg_id: int) -> dict:
+    """The response to msg_id, skipping notifications and log messages."""
+    while True:
+        line = stdout.readline()
+        if not line:
+            raise RuntimeError("MCP server exited before answering.")
+        message = json.loads(line)
+        if message.get("id") == msg_id:
+            if "error" in message:
+                raise RuntimeError(f"MCP error: {message['error']}")
+            return message["result"]
+
+
+def parse_importtime(lines):
+    """[(module, self_us)] from -X importtime stderr lines."""
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        imports.append((name.strip(), int(self_us)))
+    return imports
+
+
+def start_run(server: str, workdir: str):
+    env = dict(os.environ, ADK_MCP_LOG_LEVEL="WARNING", PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-X", "importtime", server],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=workdir, env=env,
+    )
+    stderr_lines = []  # (seconds since spawn, line)
+
+    def drain():
+        for raw in proc.stderr:
+            stderr_lines.append((time.perf_counter() - start, raw.decode(errors="replace").rstrip("\n")))
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    return proc, start, stderr_lines, reader
+
+
+def one_run(server: str, workdir: str, run: int) -> dict:
+    proc, start, stderr_lines, reader = start_run(server, workdir)
+    try:
+        proc.stdin.write(request(1, "initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "bench_startup", "version": "0"},
+        }))
+        proc.stdin.flush()
+        read_response(proc.stdout, 1)
+        handshake = time.perf_counter() - start
+
+        proc.stdin.write(notification("notifications/initialized") + request(2, "tools/list", {}))
+        proc.stdin.flush()
+        tools = read_response(proc.stdout, 2)["tools"]
+        first_list = time.perf_counter() - start
+
+        proc.stdin.write(request(3, "tools/call", {"name": "create_file", "arguments": {"filename": f"startup-{run}.txt"}}))
+        proc.stdin.flush()
+        read_response(proc.stdout, 3)
+        first_call = time.perf_counter() - start
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=30)
+        reader.join(timeout=5)
+
+    before = [line for t, line in stderr_lines if t <= handshake]
+    return {
+        "handshake_s": handshake,
+        "first_list_s": first_list,
+        "first_call_s": first_call,
+        "tools": len(tools),
+        "imports_before_handshake": parse_importtime(before),
+        "imports_total": parse_importtime(line for _, line in stderr_lines),
+    }
+
+
+def floor_run() -> float:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-X", "importtime", "-c", FLOOR_SCRIPT], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    proc.stdout.readline()
+    elapsed = time.perf_counter() - start
+    proc.wait()
+    return elapsed
+
+
+def import_report(imports, top: int):
+    by_package = defaultdict(int)
+    for name, self_us in imports:
+        by_package[name.split(".")[0] if not name.startswith("google.") else ".".join(name.split(".")[:2])] += self_us
+    return {
+        "modules": len(imports),
+        "self_ms": sum(i[1] for i in imports) / 1000.0,
+        "adk_imported": any(name == "google.adk" or name.startswith("google.adk.") for name, _ in imports),
+        "top_packages_ms": {k: v / 1000.0 for k, v in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--server", default=SERVER_SCRIPT, help="Server script to start (e.g. another checkout's).")
+    parser.add_argument("--top", type=int, default=8, help="Packages listed in the import report.")
+    parser.add_argument("--max-handshake-ms", type=float, help="Fail (exit 1) if the median handshake is slower.")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        one_run(args.server, workdir, -1)  # warm the OS file cache and .pyc files
+        runs = [one_run(args.server, workdir, i) for i in range(args.runs)]
+    floors = [floor_run() for _ in range(args.runs)]
+
+    median = lambda key: float(np.median([r[key] for r in runs])) * 1000.0  # noqa: E731
+    summary = {
+        "handshake_ms": median("handshake_s"),
+        "first_list_ms": median("first_list_s"),
+        "first_call_ms": median("first_call_s"),
+        "floor_ms": float(np.median(floors)) * 1000.0,
+    }
+    before = import_report(runs[-1]["imports_before_handshake"], args.top)
+    total = import_report(runs[-1]["imports_total"], args.top)
+
+    print(f"{'median over ' + str(args.runs) + ' runs':<28}{'ms':>9}")
+    print(f"{'handshake (initialize)':<28}{summary['handshake_ms']:>9.0f}")
+    print(f"{'first tools/list':<28}{summary['first_list_ms']:>9.0f}")
+    print(f"{'first tools/call':<28}{summary['first_call_ms']:>9.0f}")
+    print(f"{'floor: python + mcp server':<28}{summary['floor_ms']:>9.0f}")
+    print(f"\nBefore handshake: {before['modules']} modules, {before['self_ms']:.0f} ms import self time, "
+          f"ADK imported: {'yes' if before['adk_imported'] else 'no'}")
+    for package, ms in before["top_packages_ms"].items():
+        print(f"  {package:<26}{ms:>8.0f} ms")
+    print(f"Whole run: {total['modules']} modules, {total['self_ms']:.0f} ms import self time")
+
+    if args.json_path:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "runs": args.runs,
+                "server": args.server,
+            },
+            "summary": summary,
+            "imports_before_handshake": before,
+            "imports_total": total,
+            "runs": [{k: v for k, v in r.items() if not k.startswith("imports")} for r in runs],
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+    if args.max_handshake_ms is not None and summary["handshake_ms"] > args.max_handshake_ms:
+        print(f"\nFAIL: median handshake {summary['handshake_ms']:.0f} ms > {args.max_handshake_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Per-session startup over stdio versus a shared, warm streamable HTTP server.
+
+Over stdio every agent process spawns its own server: a new Python
+interpreter imports ADK and mcp before the initialize handshake can complete.
+Over HTTP one server process stays up and every agent opens a session on it.
+For each transport this script opens --sessions sessions one after another
+and times, per session:
+
+- handshake: connect (or spawn) + initialize,
+- first result: handshake + tools/list + one tools/call, i.e. what a fresh
+  agent waits for before its first tool result,
+- call: tools/call latency on the open session (--calls calls).
+
+It then opens --clients sessions on the HTTP server at once, each issuing
+--calls calls, to show how one warm process serves concurrent agents.
+The tool called is create_file, in a temporary working directory.
+
+    python benchmarks/bench_transport.py
+    python benchmarks/bench_transport.py --sessions 10 --clients 1 8 32 --json transport.json
+    python benchmarks/bench_transport.py --sse-responses
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamable_http_client
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(PROJECT_DIR, "adk_mcp_server", "adk_mcp_server.py")
+SERVER_ENV = dict(os.environ, ADK_MCP_LOG_LEVEL="WARNING")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout_s: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return
+        time.sleep(0.05)
+    raise RuntimeError(f"MCP HTTP server did not start on port {port}.")
+
+
+def latency_summary(samples_s):
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    if ms.size == 0:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "max_ms": float(ms.max()),
+    }
+
+
+@contextlib.asynccontextmanager
+async def open_session(transport: str, workdir: str, url: str):
+    if transport == "stdio":
+        params = StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT], cwd=workdir, env=SERVER_ENV)
+        with open(os.devnull, "w") as errlog:
+            async with stdio_client(params, errlog=errlog) as (read, write):
+                async with ClientSession(read, write) as session:
+                    yield session
+    else:
+        async with streamable_http_client(url) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                yield session
+
+
+async def call(session: ClientSession) -> None:
+    result = await session.call_tool("create_file", {"filename": f"bench-{uuid.uuid4().hex}.txt"})
+    if result.isError or "Successfully" not in result.content[0].text:
+        raise RuntimeError(f"Tool call failed: {result.content}")
+
+
+async def sequential_sessions(transport: str, sessions: int, calls: int, workdir: str, url: str):
+    handshake, first_result, call_latency = [], [], []
+    for _ in range(sessions):
+        start = time.perf_counter()
+        async with open_session(transport, workdir, url) as session:
+            await session.initialize()
+            handshake.append(time.perf_counter() - start)
+            await session.list_tools()
+            await call(session)
+            first_result.append(time.perf_counter() - start)
+            for _ in range(calls):
+                t = time.perf_counter()
+                await call(session)
+                call_latency.append(time.perf_counter() - t)
+    return {
+        "transport": transport,
+        "sessions": sessions,
+        "handshake": latency_summary(handshake),
+        "first_result": latency_summary(first_result),
+        "call": latency_summary(call_latency),
+    }
+
+
+async def concurrent_clients(clients: int, calls: int, workdir: str, url: str):
+    latencies = []
+
+    async def client():
+        async with open_session("http", workdir, url) as session:
+            await session.initialize()
+            for _ in range(calls):
+                t = time.perf_counter()
+                await call(session)
+                latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {"clients": clients, "calls": len(latencies), "qps": len(latencies) / elapsed, "call": latency_summary(latencies)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=5, help="Sessions opened one after another per transport.")
+    parser.add_argument("--calls", type=int, default=20, help="Tool calls per session.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32], help="Concurrent HTTP clients.")
+    parser.add_argument("--sse-responses", action="store_true", help="Run the HTTP server with SSE instead of JSON responses.")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/mcp"
+    with tempfile.TemporaryDirectory() as workdir:
+        command = [sys.executable, SERVER_SCRIPT, "--transport", "http", "--port", str(port)]
+        if args.sse_responses:
+            command.append("--sse-responses")
+        server = subprocess.Popen(
+            command,
+            cwd=workdir, env=SERVER_ENV, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(port)
+            # One throwaway session, so the HTTP numbers are for a warm server.
+            asyncio.run(sequential_sessions("http", 1, 1, workdir, url))
+
+            print(f"{'transport':<10}{'sessions':>9}{'handshake p50':>15}{'first result p50':>18}"
+                  f"{'call p50':>10}{'call p95':>10}")
+            sequential = []
+            for transport in ("stdio", "http"):
+                r = asyncio.run(sequential_sessions(transport, args.sessions, args.calls, workdir, url))
+                sequential.append(r)
+                print(f"{transport:<10}{args.sessions:>9}{r['handshake']['p50_ms']:>13.1f}ms"
+                      f"{r['first_result']['p50_ms']:>16.1f}ms{r['call']['p50_ms']:>8.2f}ms{r['call']['p95_ms']:>8.2f}ms")
+
+            print(f"\n{'HTTP clients':<14}{'calls':>7}{'qps':>9}{'p50 ms':>9}{'p95 ms':>9}")
+            concurrent = []
+            for clients in args.clients:
+                r = asyncio.run(concurrent_clients(clients, args.calls, workdir, url))
+                concurrent.append(r)
+                print(f"{clients:<14}{r['calls']:>7}{r['qps']:>9.0f}{r['call']['p50_ms']:>9.2f}{r['call']['p95_ms']:>9.2f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json_path:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "calls_per_session": args.calls,
+                "sse_responses": args.sse_responses,
+            },
+            "sequential": sequential,
+            "concurrent": concurrent,
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,221 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
 import os
-from typing import List, Tuple
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
 
+import httpx
 import numpy as np
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
 
 from google.adk.agents.llm_agent import Agent
 from google.adk.tools import FunctionTool
 
+from . import telemetry
+from .batching import AsyncMicroBatcher
+from .chunking import chunk_size_stats, chunk_with_offsets, get_token_counter, truncate_to_tokens
+from .embedding_pipeline import AsyncFakeEmbeddingClient, FakeEmbeddingClient, embed_corpus, embed_texts_async
+from .index_store import (
+    build_lock,
+    chunk_id,
+    content_hash,
+    index_directory,
+    load_index,
+    read_generation,
+    refresh_index,
+    save_index,
+)
+from .ingestion import extract_paragraphs, fetch_document, iter_corpus, make_session
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .metadata import ChunkColumns
+from .packing import minhash_signatures, pack_context
+from .query_cache import QueryEmbeddingCache, normalize_query, split_cached
+from .single_flight import SingleFlight
+from .vector_index import (
+    VECTOR_INDEX_BACKENDS,
+    QuantizedIndex,
+    ShardedIndex,
+    VectorIndex,
+    build_vector_index,
+    normalize_rows,
+    shard_bounds,
+)
+
 # ---------------------------------------------------------
 # Environment & clients
 # ---------------------------------------------------------
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 WIKI_URL = "https://en.wikipedia.org/wiki/Artificial_intelligence"
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise RuntimeError("OPENAI_API_KEY is not set in the environment or .env file.")
+# Sources to index: comma-separated URLs, file:// URIs, local files or directories
+# of .html/.md/.txt files. Defaults to the single AI Wikipedia page.
+RAG_SOURCES = [s.strip() for s in os.getenv("RAG_SOURCES", WIKI_URL).split(",") if s.strip()]
+CORPUS_ID = "\n".join(sorted(RAG_SOURCES))
+RAG_FETCH_WORKERS = int(os.getenv("RAG_FETCH_WORKERS", "8"))
+
+# During a cold build, chunks are embedded in batches of this size while
+# later documents are still being fetched.
+RAG_EMBED_STREAM_BATCH = int(os.getenv("RAG_EMBED_STREAM_BATCH", "512"))
+
+# "openai" (default) or "fake": deterministic offline embeddings for local runs and
+# benchmarks; RAG_FAKE_EMBEDDING_LATENCY_MS simulates the API's per-request time.
+# RAG_EMBEDDING_BASE_URL points the openai backend at another OpenAI-compatible
+# endpoint (a proxy, a local model server or benchmarks/bench_async_load.py).
+RAG_EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "openai")
+RAG_EMBEDDING_BASE_URL = os.getenv("RAG_EMBEDDING_BASE_URL") or None
+
+if RAG_EMBEDDING_BACKEND == "fake":
+    embedding_client = FakeEmbeddingClient(
+        dim=int(os.getenv("RAG_FAKE_EMBEDDING_DIM", "256")),
+        latency_s=float(os.getenv("RAG_FAKE_EMBEDDING_LATENCY_MS", "0")) / 1000.0,
+    )
+    # Distinct model name so fake vectors never share a persisted index with real ones.
+    EMBEDDING_MODEL = f"fake-embedding-{embedding_client.dim}"
+else:
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY is not set in the environment or .env file.")
+
+    openai_client = OpenAI(api_key=OPENAI_API_KEY, base_url=RAG_EMBEDDING_BASE_URL)
+    # Loading the CA bundle takes tens of milliseconds; do it once here rather
+    # than on the event loop each time an async client is created.
+    _EMBEDDING_SSL_CONTEXT = httpx.create_ssl_context()
+    embedding_client = openai_client
+
+    EMBEDDING_MODEL = "text-embedding-3-small"  # cheap and good
+
+# Concurrent embeddings requests when indexing (batches are token-bounded).
+RAG_EMBED_WORKERS = int(os.getenv("RAG_EMBED_WORKERS", "4"))
+
+# Token-budgeted chunks (see chunking.py); 200 tokens is roughly the old
+# 800-character chunk. Set RAG_CHUNK_OVERLAP_TOKENS to repeat the last
+# sentences of each chunk at the start of the next, and RAG_CHUNK_TOKENIZER
+# to a tiktoken encoding (e.g. cl100k_base) for exact counts. Part of the
+# persisted index key: changing these invalidates the on-disk index.
+CHUNKER_PARAMS = {
+    "max_tokens": int(os.getenv("RAG_CHUNK_TOKENS", "200")),
+    "overlap_tokens": int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "0")),
+    "tokenizer": os.getenv("RAG_CHUNK_TOKENIZER", "estimate"),
+}
+
+# Vector index backend used by embedding_rag_search ("exact", "ivf", "int8" or "pq").
+RAG_INDEX_BACKEND = os.getenv("RAG_INDEX_BACKEND", "exact")
+RAG_INDEX_PARAMS = {}
+if RAG_INDEX_BACKEND == "ivf":
+    RAG_INDEX_PARAMS["n_probe"] = int(os.getenv("RAG_IVF_N_PROBE", "8"))
+    if os.getenv("RAG_IVF_N_LISTS"):
+        RAG_INDEX_PARAMS["n_lists"] = int(os.getenv("RAG_IVF_N_LISTS"))
+elif RAG_INDEX_BACKEND in ("int8", "pq"):
+    # Candidates rescored exactly per result (top_k * factor); 0 disables rescoring.
+    RAG_INDEX_PARAMS["rescore_factor"] = int(os.getenv("RAG_QUANT_RESCORE", "10"))
+    if RAG_INDEX_BACKEND == "pq" and os.getenv("RAG_PQ_M"):
+        RAG_INDEX_PARAMS["m"] = int(os.getenv("RAG_PQ_M"))
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# Split the vector index into RAG_INDEX_SHARDS contiguous shards, built and
+# searched in parallel on RAG_SHARD_WORKERS threads; per-shard results are
+# merged by score. 1 (default) keeps a single index.
+RAG_INDEX_SHARDS = max(1, int(os.getenv("RAG_INDEX_SHARDS", "1")))
+RAG_SHARD_WORKERS = int(os.getenv("RAG_SHARD_WORKERS", str(RAG_INDEX_SHARDS)))
 
-EMBEDDING_MODEL = "text-embedding-3-small"  # cheap and good
+# Ranking: "hybrid" (BM25 + vectors fused with reciprocal-rank fusion),
+# "vector" or "lexical". In hybrid mode, a query whose BM25 result is
+# unambiguous (all terms in the best chunk, which outscores the runner-up by
+# RAG_LEXICAL_FASTPATH_RATIO) is answered without an embedding call; 0
+# disables that fast path.
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid")
+RAG_HYBRID_DEPTH = int(os.getenv("RAG_HYBRID_DEPTH", "50"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+RAG_LEXICAL_FASTPATH_RATIO = float(os.getenv("RAG_LEXICAL_FASTPATH_RATIO", "2.0"))
+
+# Context packing: instead of joining a fixed top_k, the best of
+# RAG_PACK_CANDIDATES ranked chunks are packed into RAG_CONTEXT_TOKENS tokens,
+# skipping near-duplicates (MinHash Jaccard >= RAG_DEDUP_JACCARD) and
+# trading relevance against redundancy with MMR (RAG_MMR_LAMBDA = 1 means
+# relevance only). RAG_CONTEXT_TOKENS=0 restores the fixed top_k.
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "600"))
+if 0 < RAG_CONTEXT_TOKENS < CHUNKER_PARAMS["max_tokens"]:
+    logger.warning(
+        "RAG_CONTEXT_TOKENS=%d is below RAG_CHUNK_TOKENS=%d, so most chunks would not fit; using %d.",
+        RAG_CONTEXT_TOKENS, CHUNKER_PARAMS["max_tokens"], CHUNKER_PARAMS["max_tokens"],
+    )
+    RAG_CONTEXT_TOKENS = CHUNKER_PARAMS["max_tokens"]
+RAG_PACK_CANDIDATES = int(os.getenv("RAG_PACK_CANDIDATES", "12"))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+RAG_DEDUP_JACCARD = float(os.getenv("RAG_DEDUP_JACCARD", "0.6"))
+
+# Multi-worker mode: attach read-only to the index published by
+# publish_index() (python -m adk_rag_wiki_assistant_agent.build_index) instead
+# of building one per process. The matrix is memory-mapped, so every worker
+# shares the same page-cache copy. Workers poll the manifest's generation
+# every RAG_SHARED_INDEX_POLL_S seconds and switch to new versions.
+RAG_SHARED_INDEX = os.getenv("RAG_SHARED_INDEX", "0").lower() in ("1", "true", "yes")
+RAG_SHARED_INDEX_POLL_S = float(os.getenv("RAG_SHARED_INDEX_POLL_S", "5"))
+
+# Index builds run under a cross-process lock on RAG_INDEX_DIR and write a new
+# matrix file instead of patching the one other workers may have mapped.
+# RAG_INDEX_SINGLE_PROCESS=1 declares this process the only user of
+# RAG_INDEX_DIR, so a cold start may patch the persisted matrix in place
+# (no second copy of it on disk while refreshing).
+RAG_INDEX_SINGLE_PROCESS = os.getenv("RAG_INDEX_SINGLE_PROCESS", "0").lower() in ("1", "true", "yes")
+
+# Build the index before the first request: "off" (default, built on first
+# use), "background" (a thread started at import; early requests join it) or
+# "blocking" (import waits for it). Servers can also await warm_up_async().
+RAG_WARMUP = os.getenv("RAG_WARMUP", "off").lower()
+
+# Stale-while-revalidate: every RAG_REFRESH_INTERVAL_S seconds (0 = never) a
+# background thread re-fetches the sources with conditional requests, embeds
+# only changed chunks and swaps the new version in; queries keep using the
+# current version until then.
+RAG_REFRESH_INTERVAL_S = float(os.getenv("RAG_REFRESH_INTERVAL_S", "0"))
+
+# Instrumentation (see telemetry.py). Stage timings and counters are
+# aggregated in memory at negligible cost (RAG_TELEMETRY=off disables them);
+# a RAG_TRACE_SAMPLE fraction of searches is also logged as a structured
+# trace. RAG_METRICS_PORT serves them in Prometheus text format at /metrics,
+# on RAG_METRICS_HOST (loopback by default; set e.g. 0.0.0.0 for a scraper on
+# another host). RAG_TELEMETRY_EXPORTER=otel also reports through OpenTelemetry.
+telemetry.configure(
+    enabled=os.getenv("RAG_TELEMETRY", "on").lower() not in ("0", "off", "false", "no"),
+    sample_rate=float(os.getenv("RAG_TRACE_SAMPLE", "0")),
+    exporter=os.getenv("RAG_TELEMETRY_EXPORTER") or None,
+)
+if os.getenv("RAG_METRICS_PORT"):
+    telemetry.serve_metrics(int(os.getenv("RAG_METRICS_PORT")), os.getenv("RAG_METRICS_HOST", "127.0.0.1"))
+
+# Micro-batching of concurrent retrieve_ai_context calls.
+RAG_BATCH_WINDOW_MS = float(os.getenv("RAG_BATCH_WINDOW_MS", "5"))
+RAG_BATCH_MAX_SIZE = int(os.getenv("RAG_BATCH_MAX_SIZE", "32"))
+
+# The tool runs on the ADK Runner's event loop: query embeddings are awaited
+# through an async client whose HTTP pool keeps up to RAG_EMBED_HTTP_CONNECTIONS
+# connections open, and BM25/vector scoring and packing run on a pool of
+# RAG_SCORING_WORKERS threads (NumPy releases the GIL in the heavy parts).
+RAG_EMBED_HTTP_CONNECTIONS = int(os.getenv("RAG_EMBED_HTTP_CONNECTIONS", "20"))
+RAG_SCORING_WORKERS = int(os.getenv("RAG_SCORING_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Query-embedding cache: size 0 disables the in-memory tier; set
+# RAG_QUERY_CACHE_DB to a file path to add a persistent SQLite tier.
+_QUERY_CACHE = QueryEmbeddingCache(
+    EMBEDDING_MODEL,
+    max_entries=int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("RAG_QUERY_CACHE_TTL", "3600")),
+    sqlite_path=os.getenv("RAG_QUERY_CACHE_DB") or None,
+)
 
 
 # ---------------------------------------------------------
@@ -35,39 +225,22 @@ EMBEDDING_MODEL = "text-embedding-3-small"  # cheap and good
 def fetch_wiki_content() -> str:
     """Fetch and clean the main content of the Artificial Intelligence Wikipedia page."""
     try:
-        print(f"Fetching content from: {WIKI_URL}")
-
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/120.0.0.0 Safari/537.36"
-            )
-        }
-
-        response = requests.get(WIKI_URL, headers=headers, timeout=15)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, "html.parser")
+        logger.info("Fetching content from: %s", WIKI_URL)
 
-        content_div = soup.find("div", {"id": "mw-content-text"})
-        if not content_div:
-            print("Could not find main content div on the page.")
-            return ""
-
-        paragraphs = content_div.find_all("p")
-        text_chunks = []
-        for p in paragraphs:
-            text = p.get_text(strip=True)
-            if text:
-                text_chunks.append(text)
+        # Paragraphs are extracted while the page streams in; no parse tree is built.
+        with make_session(pool_size=1) as session:
+            document = fetch_document(WIKI_URL, session)
+            try:
+                text_chunks = list(extract_paragraphs(document))
+            finally:
+                document.close()
 
         full_text = "\n".join(text_chunks)
-        print(f"Fetched {len(text_chunks)} paragraphs from Wikipedia.")
+        logger.info("Fetched %d paragraphs from Wikipedia.", len(text_chunks))
         return full_text
 
     except Exception as e:
-        print(f"Error fetching Wikipedia content: {e}")
+        logger.error("Error fetching Wikipedia content: %s", e)
         return ""
 
 
@@ -77,25 +250,7 @@ def fetch_wiki_content() -> str:
 
 def chunk_text(text: str, max_chars: int = 800) -> List[str]:
     """Split long text into chunks of at most max_chars, respecting paragraph boundaries."""
-    paragraphs = text.split("\n")
-    chunks: List[str] = []
-    current = ""
-
-    for para in paragraphs:
-        if not para.strip():
-            continue
-
-        if len(current) + len(para) + 1 <= max_chars:
-            current += (" " if current else "") + para
-        else:
-            if current:
-                chunks.append(current)
-            current = para
-
-    if current:
-        chunks.append(current)
-
-    return chunks
+    return [chunk for _, chunk in chunk_with_offsets(text, max_chars=max_chars)]
 
 
 # ---------------------------------------------------------
@@ -103,27 +258,78 @@ def chunk_text(text: str, max_chars: int = 800) -> List[str]:
 # ---------------------------------------------------------
 
 def embed_texts(texts: List[str]) -> np.ndarray:
-    """Get OpenAI embeddings for a list of texts. Returns an array of shape (n, d)."""
+    """Get embeddings for a list of texts. Returns an array of shape (n, d).
+
+    Large inputs are split into token-bounded batches and embedded on a bounded
+    thread pool with retry/backoff (see embedding_pipeline.embed_corpus).
+    """
     if not texts:
         return np.zeros((0, 1), dtype=np.float32)
 
-    print(f"[embed_texts] Embedding {len(texts)} texts with {EMBEDDING_MODEL}...")
+    logger.debug("[embed_texts] Embedding %d texts with %s...", len(texts), EMBEDDING_MODEL)
+    with telemetry.span("embed", texts=len(texts)):
+        return embed_corpus(texts, embedding_client, EMBEDDING_MODEL, max_workers=RAG_EMBED_WORKERS)
 
-    response = openai_client.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=texts,
-    )
 
-    vectors = [np.array(item.embedding, dtype=np.float32) for item in response.data]
+def embed_queries(queries: List[str]) -> np.ndarray:
+    """Embed user queries, serving repeats from the query-embedding cache."""
+    vectors, missing = split_cached(_QUERY_CACHE, queries)
+    return _merge_query_embeddings(queries, vectors, missing, embed_texts(missing) if missing else None)
+
+
+def _merge_query_embeddings(
+    queries: List[str], vectors: List[Optional[np.ndarray]], missing: List[str], embedded: Optional[np.ndarray]
+) -> np.ndarray:
+    """Cache the freshly embedded queries and stack all query vectors in input order."""
+    cached = sum(vector is not None for vector in vectors)
+    if missing:
+        fresh = {}
+        for query, vector in zip(missing, embedded):
+            _QUERY_CACHE.put(query, vector)
+            fresh[normalize_query(query)] = vector
+        vectors = [
+            vector if vector is not None else fresh[normalize_query(query)]
+            for query, vector in zip(queries, vectors)
+        ]
+
+    telemetry.count("rag_query_cache_hits_total", cached)
+    telemetry.count("rag_query_cache_misses_total", len(missing))
+    if logger.isEnabledFor(logging.DEBUG):
+        stats = _QUERY_CACHE.stats()
+        logger.debug(
+            "[embed_queries] %d/%d from cache, %d embedded (hit rate %.0f%%, size %d).",
+            cached, len(queries), len(missing), 100 * stats["hit_rate"], stats["size"],
+        )
     return np.vstack(vectors)
 
 
-def cosine_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
-    """Compute cosine similarity between each row of a and a single vector b."""
-    # a: (n, d), b: (d,)
-    a_norm = a / (np.linalg.norm(a, axis=1, keepdims=True) + 1e-10)
-    b_norm = b / (np.linalg.norm(b) + 1e-10)
-    return np.dot(a_norm, b_norm)
+_ASYNC_EMBEDDING_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+
+
+def _async_embedding_client():
+    """
+    The async embeddings client of the running event loop.
+
+    One per loop (pooled connections cannot cross loops), reused by every
+    request on it, so queries do not pay a TCP/TLS handshake each.
+    """
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_EMBEDDING_CLIENTS.get(loop)
+    if client is None:
+        if RAG_EMBEDDING_BACKEND == "fake":
+            client = AsyncFakeEmbeddingClient(embedding_client)
+        else:
+            limits = httpx.Limits(
+                max_connections=RAG_EMBED_HTTP_CONNECTIONS,
+                max_keepalive_connections=RAG_EMBED_HTTP_CONNECTIONS,
+            )
+            client = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=RAG_EMBEDDING_BASE_URL,
+                http_client=DefaultAsyncHttpxClient(limits=limits, verify=_EMBEDDING_SSL_CONTEXT),
+            )
+        _ASYNC_EMBEDDING_CLIENTS[loop] = client
+    return client
 
 
 # ---------------------------------------------------------
@@ -132,79 +338,833 @@ def cosine_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
 
 _EMBEDDING_CACHE = {
     "chunks": None,       # type: List[str] | None
-    "embeddings": None,   # type: np.ndarray | None
+    "chunk_meta": None,   # type: List[dict] | None  (CHUNK_META_FIELDS per chunk)
+    "embeddings": None,   # type: np.ndarray | None  (unit-normalized float32 rows)
+    "index": None,        # type: VectorIndex | None
+    "lexical": None,      # type: BM25Index | None
+    "columns": None,      # type: ChunkColumns | None  (chunk_meta as arrays, for filters)
+    "stored": None,       # type: StoredIndex | None  (persisted version backing the above)
+    "generation": None,   # type: int | None  (manifest generation of "stored")
 }
 
+_SHARED_INDEX = {"checked_at": 0.0}
+
+# Provenance recorded per chunk; the filterable ones are columns in metadata.py.
+# Indexes persisted with a different set are re-ingested once to fill them in.
+CHUNK_META_FIELDS = ["source", "offset", "section", "modified"]
+
+# Concurrent callers that find the index missing share one build.
+_INDEX_BUILDS: SingleFlight = SingleFlight()
+
+
+def _corpus_hash(documents: List[Dict]) -> str:
+    """Order-independent hash of the corpus, from each document's content hash."""
+    lines = sorted(f"{doc['source']}\t{doc['content_hash']}" for doc in documents)
+    return content_hash("\n".join(lines))
+
+
+def _document_validators(stored) -> Dict[str, Dict[str, Optional[str]]]:
+    """HTTP validators (ETag / Last-Modified) recorded in a persisted index, per source."""
+    return {
+        doc["source"]: {"etag": doc.get("etag"), "last_modified": doc.get("last_modified")}
+        for doc in stored.manifest.get("documents", [])
+        if doc.get("etag") or doc.get("last_modified")
+    }
+
+
+def _ingest_corpus(embed_while_fetching: bool, validators: Optional[Dict[str, Dict[str, Optional[str]]]] = None):
+    """
+    Fetch, parse and chunk every source in RAG_SOURCES.
+
+    Duplicate chunks (same normalized text) are kept once. With
+    embed_while_fetching, chunks are embedded in RAG_EMBED_STREAM_BATCH batches
+    as documents arrive instead of after the whole corpus is downloaded.
+    Sources whose validators show them unchanged are not downloaded.
+
+    Returns (chunks, chunk_meta, documents, embeddings or None, failed sources, unchanged sources).
+    """
+    chunks: List[str] = []
+    chunk_meta: List[Dict] = []
+    documents: List[Dict] = []
+    failed: List[str] = []
+    unchanged: List[str] = []
+    seen = set()
+    blocks: List[np.ndarray] = []
+    embedded = 0
+
+    corpus = iter_corpus(
+        RAG_SOURCES, CHUNKER_PARAMS, max_workers=RAG_FETCH_WORKERS,
+        failed=failed, validators=validators, unchanged=unchanged,
+    )
+    for document in corpus:
+        documents.append(document.describe())
+        modified = document.modified_at
+        for (offset, text), section in zip(document.chunks, document.sections):
+            cid = chunk_id(text)
+            if cid in seen:
+                continue
+            seen.add(cid)
+            chunks.append(text)
+            chunk_meta.append({"source": document.source, "offset": offset, "section": section, "modified": modified})
+
+        while embed_while_fetching and len(chunks) - embedded >= RAG_EMBED_STREAM_BATCH:
+            blocks.append(embed_texts(chunks[embedded:embedded + RAG_EMBED_STREAM_BATCH]))
+            embedded += RAG_EMBED_STREAM_BATCH
+
+    if embed_while_fetching and embedded < len(chunks):
+        blocks.append(embed_texts(chunks[embedded:]))
+
+    embeddings = normalize_rows(np.vstack(blocks)) if blocks else None
+    return chunks, chunk_meta, documents, embeddings, failed, unchanged
+
+
+def _build_from_sources(in_place: bool = False):
+    """
+    Ingest the corpus and bring the persisted index up to date with it.
+
+    in_place=False never rewrites a matrix file other processes may have mapped;
+    in_place=True is only safe when no other process maps it. Callers hold
+    build_lock (see _build_locked). Returns (chunks, chunk_meta, embeddings,
+    StoredIndex or None).
+    """
+    previous = load_index(CORPUS_ID, EMBEDDING_MODEL, CHUNKER_PARAMS)
+    # An index from before a chunk_meta field existed: fetch everything once
+    # and rewrite its provenance (its vectors are all reused).
+    upgrade = previous is not None and previous.manifest.get("chunk_meta_fields") != CHUNK_META_FIELDS
+    chunks, chunk_meta, documents, embeddings, failed, unchanged = _ingest_corpus(
+        embed_while_fetching=previous is None,
+        validators=_document_validators(previous) if previous is not None and not upgrade else None,
+    )
+    if unchanged:
+        logger.info("[build_or_get_embedding_index] %d sources not modified since the last fetch.", len(unchanged))
+
+    if previous is not None and (failed or unchanged):
+        # Keep the last indexed version of sources that were not modified or could not be fetched this time.
+        kept_sources = set(failed) | set(unchanged)
+        seen = {chunk_id(text) for text in chunks}
+        for text, meta in zip(previous.chunks, previous.chunk_meta):
+            if meta.get("source") in kept_sources and chunk_id(text) not in seen:
+                chunks.append(text)
+                chunk_meta.append(meta)
+        documents += [doc for doc in previous.manifest.get("documents", []) if doc["source"] in kept_sources]
+
+    stored = None
+    if not chunks:
+        if previous is None:
+            return [], [], np.zeros((0, 1), dtype=np.float32), None
+        logger.warning("[build_or_get_embedding_index] Sources unavailable, serving last persisted index.")
+        stored = previous
+    else:
+        digest = _corpus_hash(documents)
+        extra = {
+            "documents": documents,
+            "chunk_stats": chunk_size_stats(chunks, CHUNKER_PARAMS["tokenizer"]),
+            "chunk_meta_fields": CHUNK_META_FIELDS,
+        }
+        if previous is not None and previous.content_hash == digest and not upgrade:
+            logger.info("[build_or_get_embedding_index] Loaded persisted index from %s.", previous.directory)
+            stored = previous
+        elif previous is not None:
+            # Corpus changed: embed only chunks whose content hash is new.
+            try:
+                stored, stats = refresh_index(
+                    previous, digest, chunks, embed_texts,
+                    chunk_meta=chunk_meta, manifest_extra=extra, in_place=in_place,
+                )
+                logger.info(
+                    "[build_or_get_embedding_index] Refreshed index incrementally: %d added, %d removed, %d reused.",
+                    stats["added"], stats["removed"], stats["reused"],
+                )
+            except OSError as e:
+                logger.warning("[build_or_get_embedding_index] Could not refresh persisted index: %s", e)
+
+        if stored is None:
+            if embeddings is None:
+                logger.info("[build_or_get_embedding_index] Building embeddings from scratch...")
+                embeddings = normalize_rows(embed_texts(chunks))
+            try:
+                stored = save_index(
+                    CORPUS_ID, EMBEDDING_MODEL, CHUNKER_PARAMS, digest, chunks, embeddings,
+                    chunk_meta=chunk_meta, manifest_extra=extra,
+                )
+                logger.info("[build_or_get_embedding_index] Persisted index to %s.", stored.directory)
+            except OSError as e:
+                logger.warning("[build_or_get_embedding_index] Could not persist index: %s", e)
+
+    if stored is not None:
+        chunks, chunk_meta, embeddings = stored.chunks, stored.chunk_meta, stored.embeddings
+    return chunks, chunk_meta, embeddings, stored
+
+
+def _install_index(
+    chunks: List[str], chunk_meta: List[Dict], embeddings: np.ndarray, stored, index: Optional[VectorIndex] = None
+) -> None:
+    """Swap a new index version (and its vector index, if already built) into _EMBEDDING_CACHE in one step."""
+    # The inverted index is rebuilt with every (re)load of the chunks; it is cheap next to embedding.
+    with telemetry.span("build_lexical_index", chunks=len(chunks)):
+        lexical = BM25Index(chunks)
+    logger.info(
+        "[build_or_get_embedding_index] Inverted index: %d terms, %d postings (%.1f MB).",
+        len(lexical.vocabulary), len(lexical.doc_ids), lexical.nbytes / 1e6,
+    )
+
+    columns = ChunkColumns(chunk_meta)
+    telemetry.set_gauge("rag_index_bytes", columns.nbytes, kind="metadata")
+
+    sizes = stored.manifest.get("chunk_stats") if stored is not None else None
+    if sizes is None:
+        sizes = chunk_size_stats(chunks, CHUNKER_PARAMS["tokenizer"])
+    logger.info("[build_or_get_embedding_index] Built %d chunks. Chunk tokens: %s", len(chunks), sizes)
+    telemetry.set_gauge("rag_index_chunks", len(chunks))
+    telemetry.set_gauge("rag_index_bytes", lexical.nbytes, kind="lexical")
+    if stored is not None:
+        telemetry.set_gauge("rag_index_generation", stored.manifest.get("generation", 0))
+
+    _EMBEDDING_CACHE.update({
+        "chunks": chunks,
+        "chunk_meta": chunk_meta,
+        "embeddings": embeddings,
+        "index": index,
+        "lexical": lexical,
+        "columns": columns,
+        "stored": stored,
+        "generation": stored.manifest.get("generation") if stored is not None else None,
+    })
+
+
+def _shared_index_fresh(now: float) -> bool:
+    return _EMBEDDING_CACHE["chunks"] is not None and now - _SHARED_INDEX["checked_at"] < RAG_SHARED_INDEX_POLL_S
+
+
+def _attach_shared_index() -> Tuple[List[str], np.ndarray]:
+    """
+    RAG_SHARED_INDEX mode: map the index another process published.
+
+    Only when no index exists yet does this process build it, under a
+    cross-process lock so that concurrent workers wait for one builder instead
+    of all embedding the corpus. The manifest's generation is re-checked every
+    RAG_SHARED_INDEX_POLL_S seconds; when it changes, the new version is mapped
+    and swapped in.
+    """
+    now = time.monotonic()
+    if _shared_index_fresh(now):
+        return _EMBEDDING_CACHE["chunks"], _EMBEDDING_CACHE["embeddings"]
+    _SHARED_INDEX["checked_at"] = now
+
+    directory = index_directory(CORPUS_ID, EMBEDDING_MODEL, CHUNKER_PARAMS)
+    generation = read_generation(directory)
+    if _EMBEDDING_CACHE["chunks"] is not None and (generation is None or generation == _EMBEDDING_CACHE["generation"]):
+        return _EMBEDDING_CACHE["chunks"], _EMBEDDING_CACHE["embeddings"]
+
+    stored = load_index(CORPUS_ID, EMBEDDING_MODEL, CHUNKER_PARAMS)
+    if stored is None:
+        with build_lock(directory):
+            # Another worker may have published it while we waited for the lock.
+            stored = load_index(CORPUS_ID, EMBEDDING_MODEL, CHUNKER_PARAMS)
+            if stored is None:
+                logger.info("[build_or_get_embedding_index] No shared index yet; building it.")
+                chunks, chunk_meta, embeddings, stored = _build_from_sources(in_place=False)
+                if stored is None:
+                    _install_index(chunks, chunk_meta, embeddings, None)
+                    return chunks, embeddings
+
+    logger.info(
+        "[build_or_get_embedding_index] Attached shared index generation %s from %s.",
+        stored.manifest.get("generation"), stored.directory,
+    )
+    _install_index(stored.chunks, stored.chunk_meta, stored.embeddings, stored)
+    return _EMBEDDING_CACHE["chunks"], _EMBEDDING_CACHE["embeddings"]
+
 
 def build_or_get_embedding_index() -> Tuple[List[str], np.ndarray]:
-    """Fetch content, chunk it, and build (or reuse) an embedding index."""
+    """Fetch the corpus, chunk it, and build (or reuse) an embedding index.
+
+    Indexes are persisted under RAG_INDEX_DIR, keyed by the corpus sources,
+    content hash, chunker parameters and EMBEDDING_MODEL, so a restarted worker
+    only re-embeds when one of those changes, and then only the changed chunks.
+    With RAG_SHARED_INDEX=1, workers instead attach to the index published by
+    publish_index() (see _attach_shared_index).
+    """
+    if RAG_SHARED_INDEX:
+        if _shared_index_fresh(time.monotonic()):
+            return _EMBEDDING_CACHE["chunks"], _EMBEDDING_CACHE["embeddings"]
+        return _INDEX_BUILDS.do("corpus", _attach_shared_index)
+
     if _EMBEDDING_CACHE["chunks"] is not None and _EMBEDDING_CACHE["embeddings"] is not None:
-        print("[build_or_get_embedding_index] Using cached embeddings.")
         return _EMBEDDING_CACHE["chunks"], _EMBEDDING_CACHE["embeddings"]
 
-    print("[build_or_get_embedding_index] Building embeddings from scratch...")
-    content = fetch_wiki_content()
-    if not content:
-        return [], np.zeros((0, 1), dtype=np.float32)
+    # Single flight: concurrent cold callers wait for one fetch + embed.
+    return _INDEX_BUILDS.do("corpus", _build_and_install)
 
-    chunks = chunk_text(content, max_chars=800)
-    embeddings = embed_texts(chunks)
 
-    _EMBEDDING_CACHE["chunks"] = chunks
-    _EMBEDDING_CACHE["embeddings"] = embeddings
-
-    print(f"[build_or_get_embedding_index] Built {len(chunks)} chunks.")
+def _build_and_install() -> Tuple[List[str], np.ndarray]:
+    # Re-check: a build may have finished between the caller's check and joining the flight.
+    if _EMBEDDING_CACHE["chunks"] is not None and _EMBEDDING_CACHE["embeddings"] is not None:
+        return _EMBEDDING_CACHE["chunks"], _EMBEDDING_CACHE["embeddings"]
+    chunks, chunk_meta, embeddings, stored = _build_locked(in_place=RAG_INDEX_SINGLE_PROCESS)
+    _install_index(chunks, chunk_meta, embeddings, stored)
     return chunks, embeddings
 
 
+def _build_locked(in_place: bool = False):
+    """_build_from_sources() under the cross-process build lock, so workers sharing RAG_INDEX_DIR take turns."""
+    with build_lock(index_directory(CORPUS_ID, EMBEDDING_MODEL, CHUNKER_PARAMS)):
+        return _build_from_sources(in_place=in_place)
+
+
+def publish_index():
+    """
+    Build or refresh the persisted index for all workers and bump its generation.
+
+    Runs under the cross-process build lock and never patches the live matrix
+    in place, so attached workers keep serving the old version until they see
+    the new generation. Returns the StoredIndex (None if it could not be saved).
+    """
+    directory = index_directory(CORPUS_ID, EMBEDDING_MODEL, CHUNKER_PARAMS)
+    with build_lock(directory):
+        _, _, _, stored = _build_from_sources(in_place=False)
+    if stored is not None:
+        logger.info("[publish_index] Generation %s at %s.", stored.manifest.get("generation"), stored.directory)
+    return stored
+
+
+_SHARD_POOL = (
+    ThreadPoolExecutor(max_workers=max(1, RAG_SHARD_WORKERS), thread_name_prefix="rag-shard")
+    if RAG_INDEX_SHARDS > 1 else None
+)
+
+
+def _build_vector_index(embeddings: np.ndarray, stored) -> VectorIndex:
+    """Build the RAG_INDEX_BACKEND index, split into RAG_INDEX_SHARDS shards built in parallel."""
+    bounds = shard_bounds(embeddings.shape[0], RAG_INDEX_SHARDS)
+    if len(bounds) == 1:
+        return _build_shard(embeddings, stored)
+    shards = _SHARD_POOL.map(lambda bound: _build_shard(embeddings[bound[0]:bound[1]], stored, bound), bounds)
+    return ShardedIndex(list(shards), executor=_SHARD_POOL)
+
+
+def _build_shard(embeddings: np.ndarray, stored, bound: Optional[Tuple[int, int]] = None) -> VectorIndex:
+    """One index over embeddings; quantized codes are cached next to the persisted index."""
+    index_cls = VECTOR_INDEX_BACKENDS.get(RAG_INDEX_BACKEND)
+    path = None
+    if stored is not None and index_cls is not None and issubclass(index_cls, QuantizedIndex):
+        params = {k: v for k, v in RAG_INDEX_PARAMS.items() if k != "rescore_factor"}
+        if bound is not None:
+            params["rows"] = list(bound)
+        path = stored.artifact_path(RAG_INDEX_BACKEND, params)
+        if os.path.exists(path + ".npz"):
+            try:
+                index = index_cls.load(path, embeddings, RAG_INDEX_PARAMS.get("rescore_factor", 10))
+                logger.info("[get_vector_index] Loaded quantized codes from %s.", path)
+                return index
+            except (OSError, ValueError) as e:
+                logger.warning("[get_vector_index] Ignoring unreadable %s: %s", path, e)
+
+    index = build_vector_index(embeddings, RAG_INDEX_BACKEND, normalized=True, **RAG_INDEX_PARAMS)
+    if path is not None:
+        try:
+            index.save(path)
+        except OSError as e:
+            logger.warning("[get_vector_index] Could not persist quantized codes: %s", e)
+    return index
+
+
+def _index_snapshot() -> Dict:
+    """
+    A consistent view of the current index version, building the vector index on first use.
+
+    New versions are swapped into _EMBEDDING_CACHE with a single update, so a
+    copy of the dict never mixes chunks of one version with vectors of another.
+    """
+    build_or_get_embedding_index()
+    state = dict(_EMBEDDING_CACHE)
+    if state["index"] is None:
+        # One build per index version, however many callers arrive at once.
+        state["index"] = _INDEX_BUILDS.do(("vectors", id(state["embeddings"])), lambda: _get_or_build_vector_index(state))
+    return state
+
+
+def _index_ready(now: float) -> bool:
+    if _EMBEDDING_CACHE["index"] is None or _EMBEDDING_CACHE["chunks"] is None:
+        return False
+    return _shared_index_fresh(now) if RAG_SHARED_INDEX else True
+
+
+async def _index_snapshot_async() -> Dict:
+    """_index_snapshot() for the event loop: builds, reloads and shared-index polls run on a worker thread."""
+    if _index_ready(time.monotonic()):
+        return dict(_EMBEDDING_CACHE)
+    return await _INDEX_BUILDS.do_async("snapshot", _index_snapshot)
+
+
+def _get_or_build_vector_index(state: Dict) -> VectorIndex:
+    if _EMBEDDING_CACHE["embeddings"] is state["embeddings"] and _EMBEDDING_CACHE["index"] is not None:
+        return _EMBEDDING_CACHE["index"]
+    index = _new_vector_index(state["embeddings"], state["stored"])
+    if _EMBEDDING_CACHE["embeddings"] is state["embeddings"]:
+        _EMBEDDING_CACHE["index"] = index
+    return index
+
+
+def _new_vector_index(embeddings: np.ndarray, stored) -> VectorIndex:
+    with telemetry.span("build_vector_index", backend=RAG_INDEX_BACKEND):
+        index = _build_vector_index(embeddings, stored)
+    per_chunk = index.nbytes / max(len(index), 1)
+    logger.info(
+        "[get_vector_index] Built '%s' index over %d chunks (%.0f bytes/chunk in memory).",
+        index.name, len(index), per_chunk,
+    )
+    telemetry.set_gauge("rag_index_bytes", index.nbytes, kind="vector")
+    return index
+
+
+def get_vector_index() -> Tuple[List[str], List[Dict], VectorIndex]:
+    """Return the chunks, their provenance and a vector index over them, building the index on first use."""
+    state = _index_snapshot()
+    return state["chunks"], state["chunk_meta"], state["index"]
+
+
+def warm_up() -> None:
+    """Build the index now (fetch, embed, vector index) so that the first query does not pay for it."""
+    start = time.perf_counter()
+    try:
+        chunks, _, index = get_vector_index()
+    except Exception as e:
+        logger.error("[warm_up] Index build failed; it will be retried on first use: %s", e)
+        return
+    logger.info(
+        "[warm_up] Index ready: %d chunks, '%s' backend, %.1fs.", len(chunks), index.name, time.perf_counter() - start
+    )
+
+
+async def warm_up_async() -> None:
+    """warm_up() for server startup hooks: runs off the event loop and joins a build already in flight."""
+    await _INDEX_BUILDS.do_async("warm_up", warm_up)
+
+
 # ---------------------------------------------------------
-# RAG search using embeddings
+# Background refresh (stale-while-revalidate)
 # ---------------------------------------------------------
 
-def embedding_rag_search(query: str, top_k: int = 3) -> str:
+_REFRESH_STOP = threading.Event()
+
+
+def refresh_index_now() -> bool:
     """
-    RAG-style retrieval over the AI Wikipedia page using OpenAI embeddings.
+    Re-ingest RAG_SOURCES and swap in a new index version if the corpus changed.
+
+    Unchanged sources are skipped with conditional requests and only new
+    chunks are embedded. The new version, vector index included, is built on
+    the calling thread and installed in one step; queries keep being answered
+    from the current version until then. Concurrent calls share one refresh.
+    Returns True if a new version was installed.
     """
-    print("====================================================")
-    print(f"[embedding_rag_search] Query: {query}")
-    print("====================================================")
+    return _INDEX_BUILDS.do("refresh", _refresh_index)
+
+
+def _refresh_index() -> bool:
+    current = _EMBEDDING_CACHE["stored"]
+    if _EMBEDDING_CACHE["chunks"] is None:
+        get_vector_index()  # nothing served yet: this is the first build
+        return True
+
+    with telemetry.span("refresh") as refresh_span:
+        if RAG_SHARED_INDEX:
+            # Publish for every worker, then attach here right away instead of at the next poll.
+            publish_index()
+            _SHARED_INDEX["checked_at"] = 0.0
+            _INDEX_BUILDS.do("corpus", _attach_shared_index)
+            updated = _EMBEDDING_CACHE["stored"] is not current
+            if updated:
+                _index_snapshot()
+        else:
+            # Never patch the matrix in place: the current version is still being searched.
+            chunks, chunk_meta, embeddings, stored = _build_locked(in_place=False)
+            updated = stored is None or current is None or stored.content_hash != current.content_hash
+            if updated:
+                _install_index(chunks, chunk_meta, embeddings, stored, index=_new_vector_index(embeddings, stored))
+        refresh_span.set(updated=updated)
+
+    telemetry.count("rag_index_refreshes_total", result="updated" if updated else "unchanged")
+    if updated:
+        logger.info("[refresh_index] Swapped in a new index version (%d chunks).", len(_EMBEDDING_CACHE["chunks"]))
+    return updated
 
-    chunks, embeddings = build_or_get_embedding_index()
-    if len(chunks) == 0:
-        return "I couldn't retrieve or index the reference content right now. Please try again later."
 
-    # Embed query
-    query_embedding = embed_texts([query])[0]  # shape: (d,)
+def _refresh_loop(interval_s: float) -> None:
+    # Jitter keeps workers started together from refreshing in lockstep.
+    while not _REFRESH_STOP.wait(interval_s * random.uniform(0.9, 1.1)):
+        try:
+            refresh_index_now()
+        except Exception as e:
+            telemetry.count("rag_index_refreshes_total", result="failed")
+            logger.warning("[refresh_index] Refresh failed; still serving the current index: %s", e)
 
-    # Compute cosine similarity
-    sims = cosine_similarity(embeddings, query_embedding)  # shape: (n,)
-    ranked_indices = np.argsort(-sims)  # descending
 
-    top_indices = ranked_indices[:top_k]
-    print(f"[embedding_rag_search] Top {len(top_indices)} chunks selected.")
+def start_background_refresh(interval_s: float) -> threading.Thread:
+    """Refresh the index every interval_s seconds on a daemon thread until stop_background_refresh()."""
+    _REFRESH_STOP.clear()
+    thread = threading.Thread(target=_refresh_loop, args=(interval_s,), name="rag-refresh", daemon=True)
+    thread.start()
+    return thread
 
-    context_pieces = []
-    for idx in top_indices:
-        score = float(sims[idx])
-        chunk = chunks[idx]
-        print(f"  - Chunk {idx} | score={score:.4f}")
-        context_pieces.append(chunk)
 
-    context = "\n\n".join(context_pieces)
-    preview = context[:400].replace("\n", " ")
-    print("----------------------------------------------------")
-    print(f"[embedding_rag_search] Context preview: {preview}...")
-    print("----------------------------------------------------")
+def stop_background_refresh() -> None:
+    _REFRESH_STOP.set()
+
+
+# ---------------------------------------------------------
+# RAG search using embeddings
+# ---------------------------------------------------------
+
+NO_CONTEXT_MESSAGE = "I couldn't retrieve or index the reference content right now. Please try again later."
+NO_MATCH_MESSAGE = "No indexed content matches the requested source, section or date filters."
+
+
+def _context_piece(chunks: List[str], chunk_meta: List[Dict], idx: int) -> str:
+    meta = chunk_meta[idx]
+    section = f", section {meta['section']!r}" if meta.get("section") else ""
+    return f"[Source: {meta.get('source')}{section}, offset {meta.get('offset')}]\n{chunks[idx]}"
+
+
+def _pack_candidates(
+    state: Dict, ids: np.ndarray, scores: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, Optional[int]]:
+    """
+    Reduce ranked candidates to those packed into RAG_CONTEXT_TOKENS (see packing.py).
+
+    Returns (ids, scores, max_tokens): max_tokens is set when the context must
+    be cut to the budget (no candidate fitted whole), None otherwise.
+    """
+    if RAG_CONTEXT_TOKENS <= 0 or len(ids) == 0:
+        return ids, scores, None
+    chunks, chunk_meta = state["chunks"], state["chunk_meta"]
+    count_tokens = get_token_counter(CHUNKER_PARAMS["tokenizer"])
+    # Cost of each piece as it appears in the context, "\n\n" separator included.
+    costs = [count_tokens(_context_piece(chunks, chunk_meta, int(i))) + 1 for i in ids]
+    vectors = np.asarray(state["embeddings"][ids], dtype=np.float32)
+    selected, stats = pack_context(
+        scores,
+        costs,
+        RAG_CONTEXT_TOKENS,
+        similarity=vectors @ vectors.T,
+        signatures=minhash_signatures([chunks[int(i)] for i in ids]),
+        mmr_lambda=RAG_MMR_LAMBDA,
+        dedup_threshold=RAG_DEDUP_JACCARD,
+    )
+    telemetry.count("rag_near_duplicates_dropped_total", stats["duplicates"])
+    telemetry.count("rag_context_tokens_total", stats["tokens"])
+    if stats["truncated"]:
+        telemetry.count("rag_context_truncated_total")
+    logger.debug(
+        "[embedding_rag_search] Packed %d/%d candidates into %d/%d tokens (%d near-duplicates dropped, %d truncated).",
+        stats["selected"], stats["candidates"], stats["tokens"], RAG_CONTEXT_TOKENS, stats["duplicates"],
+        stats["truncated"],
+    )
+    return ids[selected], scores[selected], RAG_CONTEXT_TOKENS if stats["truncated"] else None
+
+
+def _format_context(
+    chunks: List[str],
+    chunk_meta: List[Dict],
+    top_indices: np.ndarray,
+    top_scores: np.ndarray,
+    max_tokens: Optional[int] = None,
+) -> str:
+    """
+    Join the selected chunks, each tagged with its source and offset, into the
+    tool's context string, cut to max_tokens if given.
+    """
+    context = "\n\n".join(_context_piece(chunks, chunk_meta, idx) for idx in top_indices)
+    if max_tokens is not None:
+        context = truncate_to_tokens(context, max_tokens, CHUNKER_PARAMS["tokenizer"])
+
+    # Per-chunk detail is for debugging only; skip building it otherwise.
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[embedding_rag_search] Top %d chunks selected.", len(top_indices))
+        for idx, score in zip(top_indices, top_scores):
+            meta = chunk_meta[idx]
+            logger.debug("  - Chunk %d | score=%.4f | %s@%s", idx, float(score), meta.get("source"), meta.get("offset"))
+        logger.debug("[embedding_rag_search] Context preview: %s...", context[:400].replace("\n", " "))
 
     return context
 
 
-def retrieve_ai_context(query: str) -> str:
+def embedding_rag_search(query: str, top_k: int = 3, filters: Optional[Dict] = None) -> str:
+    """
+    RAG-style retrieval over the indexed corpus (by default the AI Wikipedia page)
+    using BM25 and OpenAI embeddings (see RAG_RETRIEVAL_MODE).
+
+    filters restricts retrieval to matching chunks, e.g. {"source": "*wiki*",
+    "section": "History", "modified": (start_ts, None)}; see ChunkColumns.mask.
+    """
+    return embedding_rag_search_batch([query], top_k=top_k, filters=[filters])[0]
+
+
+def _rank_lexical(state: Dict, unique_queries: List[str], keep: int, mask: Optional[np.ndarray] = None):
+    """
+    BM25 candidates per query; no network involved.
+
+    Returns (ranked, lexical): ranked holds the queries already answered
+    (lexical mode or the hybrid fast path), lexical the BM25 lists for fusion.
+    """
+    ranked: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    lexical: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    if RAG_RETRIEVAL_MODE == "vector":
+        return ranked, lexical
+
+    bm25 = state["lexical"]
+    depth = max(keep, RAG_HYBRID_DEPTH, 2)
+    with telemetry.span("score_lexical", queries=len(unique_queries)):
+        for query in unique_queries:
+            lexical[query] = bm25.search(query, depth, mask)
+            ids, scores = lexical[query]
+            if RAG_RETRIEVAL_MODE == "lexical" or bm25.is_confident(query, ids, scores, RAG_LEXICAL_FASTPATH_RATIO):
+                ranked[query] = (ids[:keep], scores[:keep])
+    if RAG_RETRIEVAL_MODE == "hybrid" and ranked:
+        telemetry.count("rag_lexical_fastpath_total", len(ranked))
+        logger.debug("[embedding_rag_search] Lexical fast path for %d/%d queries.", len(ranked), len(unique_queries))
+    return ranked, lexical
+
+
+def _rank_vector(
+    state: Dict,
+    to_embed: List[str],
+    query_embeddings: np.ndarray,
+    lexical: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    ranked: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    keep: int,
+    mask: Optional[np.ndarray] = None,
+) -> None:
+    """Score the embedded queries against the vector index (fusing with BM25 in hybrid mode) into ranked."""
+    index = state["index"]
+    depth = max(keep, RAG_HYBRID_DEPTH) if RAG_RETRIEVAL_MODE == "hybrid" else keep
+
+    # Nearest chunks by cosine similarity (exact or approximate, per RAG_INDEX_BACKEND)
+    with telemetry.span("score_vector", queries=len(to_embed), backend=index.name, filtered=mask is not None):
+        results = index.search_batch(query_embeddings, depth, mask)
+    for query, (ids, scores) in zip(to_embed, results):
+        if RAG_RETRIEVAL_MODE == "hybrid":
+            ranked[query] = reciprocal_rank_fusion([lexical[query][0], ids], keep, k=RAG_RRF_K)
+        else:
+            ranked[query] = (ids[:keep], scores[:keep])
+
+
+def _pack_ranked(state: Dict, ranked: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]]) -> Dict[Tuple[str, str], str]:
+    with telemetry.span("pack", queries=len(ranked)):
+        return {
+            key: _format_context(state["chunks"], state["chunk_meta"], *_pack_candidates(state, *ids_scores))
+            for key, ids_scores in ranked.items()
+        }
+
+
+def _candidate_depth(top_k: int) -> int:
+    # Candidates kept per query: the packing stage picks from a deeper list.
+    return max(top_k, RAG_PACK_CANDIDATES) if RAG_CONTEXT_TOKENS > 0 else top_k
+
+
+def _filter_key(filters: Optional[Dict]) -> str:
+    return json.dumps(filters, sort_keys=True, default=str) if filters else ""
+
+
+def _group_queries(queries: List[str], filters: Optional[List[Optional[Dict]]]):
+    """
+    Distinct queries grouped by filter, so each filter's mask is applied once per batch.
+
+    Returns ({filter key: (filters, distinct queries)}, filter key per query).
+    """
+    if filters is None:
+        filters = [None] * len(queries)
+    if len(filters) != len(queries):
+        raise ValueError(f"Got {len(filters)} filters for {len(queries)} queries.")
+    keys = [_filter_key(f) for f in filters]
+    groups: Dict[str, Tuple[Optional[Dict], Dict[str, None]]] = {}
+    for query, key, query_filters in zip(queries, keys, filters):
+        groups.setdefault(key, (query_filters or None, {}))[1][query] = None
+    return {key: (query_filters, list(group)) for key, (query_filters, group) in groups.items()}, keys
+
+
+def _lexical_stage(state: Dict, groups: Dict, keep: int):
+    """
+    Filter masks and BM25 ranking for every filter group; no network involved.
+
+    Returns (plans, to_embed, vectors, missing): a (key, mask, ranked, lexical,
+    queries needing vectors) plan per group that matches any chunk, the
+    distinct queries that need vectors across all groups (embedded once, in
+    one request) and their query-cache lookup.
+    """
+    plans = []
+    to_embed: Dict[str, None] = {}
+    for key, (filters, group_queries) in groups.items():
+        mask = state["columns"].mask(filters)
+        if mask is not None and not mask.any():
+            continue
+        ranked, lexical = _rank_lexical(state, group_queries, keep, mask)
+        pending = [query for query in group_queries if query not in ranked]
+        to_embed.update(dict.fromkeys(pending))
+        plans.append((key, mask, ranked, lexical, pending))
+    to_embed = list(to_embed)
+    # The cache lookup may read its SQLite tier, so in the async path it runs on the pool.
+    vectors, missing = split_cached(_QUERY_CACHE, to_embed) if to_embed else ([], [])
+    return plans, to_embed, vectors, missing
+
+
+def _vector_stage(state: Dict, plans, to_embed, vectors, missing, embedded, keep: int) -> Dict[Tuple[str, str], str]:
+    """Vector ranking for every plan, then packing; returns {(filter key, query): context}."""
+    return _pack_ranked(state, _rank_stage(state, plans, to_embed, vectors, missing, embedded, keep))
+
+
+def _rank_stage(
+    state: Dict, plans, to_embed, vectors, missing, embedded, keep: int
+) -> Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]]:
+    """
+    Vector ranking (fused with BM25 in hybrid mode) for every plan of _lexical_stage().
+
+    embedded holds the vectors of the missing queries. Returns {(filter key,
+    query): (chunk indexes, scores)} with at most keep results each, best first.
+    """
+    rows: Dict[str, int] = {}
+    if to_embed:
+        query_embeddings = _merge_query_embeddings(to_embed, vectors, missing, embedded)
+        rows = {query: i for i, query in enumerate(to_embed)}
+    ranked_all: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+    for key, mask, ranked, lexical, pending in plans:
+        if pending:
+            _rank_vector(state, pending, query_embeddings[[rows[q] for q in pending]], lexical, ranked, keep, mask)
+        ranked_all.update(((key, query), ids_scores) for query, ids_scores in ranked.items())
+    return ranked_all
+
+
+def _count_filtered(keys: List[str]) -> None:
+    filtered = sum(1 for key in keys if key)
+    if filtered:
+        telemetry.count("rag_filtered_queries_total", filtered)
+
+
+def embedding_rag_search_batch(
+    queries: List[str], top_k: int = 3, filters: Optional[List[Optional[Dict]]] = None
+) -> List[str]:
+    """
+    Retrieve context for several queries at once.
+
+    Queries are ranked together: one embeddings request for all of them, one
+    scoring pass per distinct filter (filters[i] applies to queries[i]; see
+    embedding_rag_search). With RAG_CONTEXT_TOKENS set, top_k is only the
+    minimum number of candidates; the context is packed to the token budget.
+    Returns one context string per query, in input order.
+    """
+    with telemetry.span("search", queries=len(queries)) as search_span:
+        for query in queries:
+            logger.debug("[embedding_rag_search] Query: %s", query)
+        telemetry.count("rag_searches_total")
+        telemetry.count("rag_queries_total", len(queries))
+
+        groups, keys = _group_queries(queries, filters)
+        _count_filtered(keys)
+        state = _index_snapshot()
+        if len(state["chunks"]) == 0:
+            search_span.set(empty_index=True)
+            return [NO_CONTEXT_MESSAGE for _ in queries]
+
+        keep = _candidate_depth(top_k)
+        plans, to_embed, vectors, missing = _lexical_stage(state, groups, keep)
+        embedded = embed_texts(missing) if missing else None
+        contexts = _vector_stage(state, plans, to_embed, vectors, missing, embedded, keep)
+        return [contexts.get((key, query), NO_MATCH_MESSAGE) for key, query in zip(keys, queries)]
+
+
+_SCORING_POOL = ThreadPoolExecutor(max_workers=max(1, RAG_SCORING_WORKERS), thread_name_prefix="rag-scoring")
+
+
+async def _in_scoring_pool(fn, *args):
+    # Copy the context so spans opened in the pool nest under the caller's trace.
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_SCORING_POOL, functools.partial(context.run, fn, *args))
+
+
+async def embedding_rag_search_batch_async(
+    queries: List[str], top_k: int = 3, filters: Optional[List[Optional[Dict]]] = None
+) -> List[str]:
+    """
+    embedding_rag_search_batch() that never blocks the event loop.
+
+    Query embeddings are awaited through the loop's pooled async client; BM25
+    and vector scoring, packing and query-cache I/O run on the scoring thread
+    pool; a cold index is built on a worker thread that concurrent callers
+    share. Other sessions on the loop keep running throughout.
+    """
+    with telemetry.span("search", queries=len(queries)) as search_span:
+        for query in queries:
+            logger.debug("[embedding_rag_search] Query: %s", query)
+        telemetry.count("rag_searches_total")
+        telemetry.count("rag_queries_total", len(queries))
+
+        groups, keys = _group_queries(queries, filters)
+        _count_filtered(keys)
+        state = await _index_snapshot_async()
+        if len(state["chunks"]) == 0:
+            search_span.set(empty_index=True)
+            return [NO_CONTEXT_MESSAGE for _ in queries]
+
+        keep = _candidate_depth(top_k)
+        plans, to_embed, vectors, missing = await _in_scoring_pool(_lexical_stage, state, groups, keep)
+        embedded = None
+        if missing:
+            logger.debug("[embed_texts] Embedding %d texts with %s...", len(missing), EMBEDDING_MODEL)
+            with telemetry.span("embed", texts=len(missing)):
+                embedded = await embed_texts_async(
+                    missing, _async_embedding_client(), EMBEDDING_MODEL, max_concurrency=RAG_EMBED_WORKERS
+                )
+        contexts = await _in_scoring_pool(_vector_stage, state, plans, to_embed, vectors, missing, embedded, keep)
+        return [contexts.get((key, query), NO_MATCH_MESSAGE) for key, query in zip(keys, queries)]
+
+
+# Groups concurrent tool calls arriving within RAG_BATCH_WINDOW_MS into one batch.
+_RETRIEVAL_BATCHER = AsyncMicroBatcher(
+    lambda items: embedding_rag_search_batch_async(
+        [query for query, _ in items], filters=[filters for _, filters in items]
+    ),
+    max_batch_size=RAG_BATCH_MAX_SIZE,
+    max_wait_ms=RAG_BATCH_WINDOW_MS,
+)
+
+
+def _parse_date(value: str) -> float:
+    """ISO 8601 date or date-time (UTC unless it has an offset) as a POSIX timestamp."""
+    parsed = datetime.fromisoformat(value.strip())
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def tool_filters(source: str = "", section: str = "", modified_after: str = "") -> Optional[Dict]:
+    """Metadata filters from retrieve_ai_context's optional arguments (None when all are empty)."""
+    filters: Dict = {}
+    if source.strip():
+        filters["source"] = source.strip()
+    if section.strip():
+        filters["section"] = section.strip()
+    if modified_after.strip():
+        filters["modified"] = (_parse_date(modified_after), None)
+    return filters or None
+
+
+async def retrieve_ai_context(query: str, source: str = "", section: str = "", modified_after: str = "") -> str:
     """
     Tool exposed to the agent: retrieve relevant AI context from Wikipedia
-    using embedding-based similarity search.
+    using hybrid keyword (BM25) and embedding-based similarity search.
+
+    Args:
+        query: The user's question or search terms.
+        source: Optional. Only search this source URL or path; * and ? are wildcards.
+        section: Optional. Only search this section title (e.g. "History"); * and ? are wildcards.
+        modified_after: Optional. Only search documents modified on or after this ISO date (YYYY-MM-DD).
     """
-    return embedding_rag_search(query)
+    try:
+        filters = tool_filters(source, section, modified_after)
+    except ValueError:
+        return f"Invalid modified_after date {modified_after!r}; use YYYY-MM-DD."
+    return await _RETRIEVAL_BATCHER.submit((query, filters))
 
 
 # ---------------------------------------------------------
@@ -232,5 +1192,15 @@ root_agent = Agent(
     tools=[rag_tool],
 )
 
+if RAG_WARMUP == "blocking":
+    warm_up()
+elif RAG_WARMUP == "background":
+    # Daemon thread: never holds up interpreter exit. Requests arriving
+    # before it finishes wait for the same build instead of starting another.
+    threading.Thread(target=warm_up, name="rag-warm-up", daemon=True).start()
+
+if RAG_REFRESH_INTERVAL_S > 0:
+    start_background_refresh(RAG_REFRESH_INTERVAL_S)
+
 # IMPORTANT: Do NOT call adk.agent(...) or adk.run(...)
 # ADK in your setup auto-discovers `root_agent` from this module.
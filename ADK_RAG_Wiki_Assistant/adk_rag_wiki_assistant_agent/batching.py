@@ -0,0 +1,102 @@
+"""
+Async micro-batching for the RAG tool.
+
+Concurrent tool calls that arrive within a short window are grouped and
+handed to a single batch function, so N simultaneous questions cost one
+embeddings request and one matrix-matrix scoring pass instead of N.
+"""
+
+import asyncio
+import weakref
+from typing import Awaitable, Callable, Generic, List, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class _LoopState:
+    """Pending items for one event loop."""
+
+    def __init__(self):
+        self.pending: List[Tuple[object, asyncio.Future]] = []
+        self.timer: "asyncio.TimerHandle | None" = None
+
+
+class AsyncMicroBatcher(Generic[T, R]):
+    """
+    Coalesce concurrent submit() calls into batches.
+
+    A batch is flushed when it reaches max_batch_size items or when max_wait_ms
+    has passed since its first item, whichever comes first. batch_fn receives
+    the items in submission order and must return one result per item.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[T]], Awaitable[List[R]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        # State is per event loop: futures cannot cross loops.
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # The event loop only keeps weak references to tasks: hold running batches here.
+        self._tasks: "Set[asyncio.Task]" = set()
+
+    async def submit(self, item: T) -> R:
+        """Queue one item and wait for its result from the next batch."""
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = _LoopState()
+            self._states[loop] = state
+
+        future = loop.create_future()
+        state.pending.append((item, future))
+
+        if len(state.pending) >= self.max_batch_size:
+            self._flush(loop, state)
+        elif state.timer is None:
+            state.timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush, loop, state)
+
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop, state: _LoopState) -> None:
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        batch = [(item, fut) for item, fut in state.pending if not fut.cancelled()]
+        state.pending = []
+        if batch:
+            task = loop.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            results = await self.batch_fn(items)
+            if len(results) != len(items):
+                raise ValueError(
+                    f"Batch function returned {len(results)} results for {len(items)} items."
+                )
+        except asyncio.CancelledError:
+            # E.g. loop shutdown: the callers must not wait forever.
+            for _, fut in batch:
+                fut.cancel()
+            raise
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
@@ -0,0 +1,23 @@
+"""
+Build or refresh the persisted RAG index for a fleet of workers.
+
+Run it once before starting workers with RAG_SHARED_INDEX=1, and again (from
+a deploy hook or cron) whenever the sources should be re-checked:
+
+    python -m adk_rag_wiki_assistant_agent.build_index
+
+Each run that changes the index publishes a new generation; attached workers
+pick it up within RAG_SHARED_INDEX_POLL_S seconds.
+"""
+
+import sys
+
+from .agent import publish_index
+
+
+def main() -> int:
+    return 0 if publish_index() is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Chunking of paragraph streams.
+
+Chunk size drives both embedding cost and retrieval quality, and the
+embeddings API bills and limits by tokens, so chunks are budgeted in tokens:
+
+- iter_token_chunks() packs whole lines (paragraphs) into chunks of at most
+  max_tokens. A paragraph that alone exceeds the budget is split into
+  sentences (and, failing that, into word windows) instead of becoming one
+  oversize chunk. With overlap_tokens > 0, each chunk starts with the last
+  sentences of the previous one.
+- iter_char_chunks() is the original character-budgeted chunker, kept for
+  chunk_text() and for indexes persisted with {"max_chars": ...}.
+
+Both are generators over an iterable of paragraphs, so they can consume the
+streaming HTML extractor directly, and collect pieces in a list that is
+joined once per chunk. Offsets refer to "\\n".join(paragraphs).
+"""
+
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from .embedding_pipeline import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # optional: exact token counts for OpenAI models
+    tiktoken = None
+
+# A piece of text to pack: (offset, text, tokens).
+_Unit = Tuple[int, str, int]
+
+
+# ---------------------------------------------------------
+# Token counting
+# ---------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def get_token_counter(tokenizer: str = "estimate") -> Callable[[str], int]:
+    """
+    Token-count function: "estimate" (~4 chars per token) or a tiktoken
+    encoding name such as "cl100k_base" (the text-embedding-3 tokenizer).
+    """
+    if tokenizer == "estimate":
+        return estimate_tokens
+    if tiktoken is None:
+        raise RuntimeError(f"Tokenizer {tokenizer!r} requires the tiktoken package (pip install tiktoken).")
+    encoding = tiktoken.get_encoding(tokenizer)
+    return lambda text: len(encoding.encode_ordinary(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, tokenizer: str = "estimate") -> str:
+    """Longest prefix of text, cut at a word boundary, that counts at most max_tokens."""
+    count_tokens = get_token_counter(tokenizer)
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Binary search over word ends: token counts only grow with the prefix.
+    ends = [m.start() for m in re.finditer(r"\s+", text)]
+    low, high = 0, len(ends)  # ends[:low] fit, ends[high:] do not
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:ends[middle - 1]]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:ends[low - 1]] if low else ""
+
+
+# ---------------------------------------------------------
+# Sentence splitting
+# ---------------------------------------------------------
+
+# Sentence end: terminal punctuation, optional closing quotes/brackets (and
+# citation markers like "[12]"), then whitespace or the start of a new sentence.
+_SENTENCE_END = re.compile(r"[.!?]+[\"'”’)\]]*(?:\[\d+\])*(?:\s+|(?=[A-Z]))")
+_ABBREVIATIONS = {"e.g.", "i.e.", "etc.", "vs.", "mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "no.", "fig."}
+_WORD = re.compile(r"\S+")
+
+
+def _is_abbreviation(text: str, end: int) -> bool:
+    word = text[:end].rstrip().rsplit(None, 1)[-1].lower()
+    return word in _ABBREVIATIONS or (len(word) == 2 and word[0].isalpha())
+
+
+def iter_sentences(text: str) -> Iterator[Tuple[int, str]]:
+    """Yield (offset, sentence) pairs; sentences are stripped, offsets point into text."""
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+        if end >= len(text) or _is_abbreviation(text, match.start() + 1):
+            continue
+        yield from _stripped(text, start, end)
+        start = end
+    yield from _stripped(text, start, len(text))
+
+
+def _stripped(text: str, start: int, end: int) -> Iterator[Tuple[int, str]]:
+    piece = text[start:end]
+    sentence = piece.strip()
+    if sentence:
+        yield start + len(piece) - len(piece.lstrip()), sentence
+
+
+def _split_words(offset: int, text: str, max_tokens: int, count_tokens) -> Iterator[_Unit]:
+    """Word windows of at most max_tokens; a single word over budget is cut by characters."""
+    window: List[Tuple[int, str, int]] = []
+    window_tokens = 0
+
+    def flush():
+        start = window[0][0]
+        end = window[-1][0] + len(window[-1][1])
+        piece = text[start:end]
+        return offset + start, piece, count_tokens(piece)
+
+    for match in _WORD.finditer(text):
+        word = match.group()
+        tokens = count_tokens(word)
+        if tokens > max_tokens:
+            if window:
+                yield flush()
+                window, window_tokens = [], 0
+            step = max(1, len(word) * max_tokens // tokens)
+            for i in range(0, len(word), step):
+                piece = word[i:i + step]
+                yield offset + match.start() + i, piece, count_tokens(piece)
+            continue
+        if window and window_tokens + tokens > max_tokens:
+            yield flush()
+            window, window_tokens = [], 0
+        window.append((match.start(), word, tokens))
+        window_tokens += tokens
+    if window:
+        yield flush()
+
+
+def _split_line(offset: int, line: str, max_tokens: int, count_tokens) -> Iterator[_Unit]:
+    for sentence_offset, sentence in iter_sentences(line):
+        tokens = count_tokens(sentence)
+        if tokens <= max_tokens:
+            yield offset + sentence_offset, sentence, tokens
+        else:
+            yield from _split_words(offset + sentence_offset, sentence, max_tokens, count_tokens)
+
+
+# ---------------------------------------------------------
+# Chunkers
+# ---------------------------------------------------------
+
+def _iter_lines(paragraphs: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """Non-blank lines of "\\n".join(paragraphs) with their offsets, without building the joined text."""
+    offset = 0
+    for paragraph in paragraphs:
+        for line in paragraph.split("\n"):
+            line_offset = offset
+            offset += len(line) + 1
+            if line.strip():
+                yield line_offset, line
+
+
+def iter_token_chunks(
+    paragraphs: Iterable[str],
+    max_tokens: int = 200,
+    overlap_tokens: int = 0,
+    tokenizer: str = "estimate",
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (offset, chunk) pairs of at most ~max_tokens tokens.
+
+    Lines are kept whole when they fit. Oversize lines are split into
+    sentences; with overlap_tokens > 0 every line is, so the overlap carried
+    into the next chunk is made of whole sentences.
+    """
+    if max_tokens <= 0 or not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("Need max_tokens > 0 and 0 <= overlap_tokens < max_tokens.")
+    count_tokens = get_token_counter(tokenizer)
+
+    buffer: List[_Unit] = []
+    buffered = 0
+    fresh = 0  # units added since the last chunk (the rest is overlap)
+
+    for offset, line in _iter_lines(paragraphs):
+        tokens = count_tokens(line)
+        if tokens <= max_tokens and not overlap_tokens:
+            units: Iterable[_Unit] = ((offset, line, tokens),)
+        else:
+            units = _split_line(offset, line, max_tokens, count_tokens)
+
+        for unit in units:
+            if buffer and buffered + unit[2] > max_tokens:
+                if fresh:
+                    yield buffer[0][0], " ".join(text for _, text, _ in buffer)
+                # Carry the trailing units that fit in overlap_tokens, if the new unit still fits.
+                keep = 0
+                kept_tokens = 0
+                while (
+                    keep < len(buffer) - 1
+                    and kept_tokens + buffer[-1 - keep][2] <= overlap_tokens
+                ):
+                    kept_tokens += buffer[-1 - keep][2]
+                    keep += 1
+                if keep and kept_tokens + unit[2] <= max_tokens:
+                    buffer, buffered = buffer[-keep:], kept_tokens
+                else:
+                    buffer, buffered = [], 0
+                fresh = 0
+            buffer.append(unit)
+            buffered += unit[2]
+            fresh += 1
+
+    if buffer and fresh:
+        yield buffer[0][0], " ".join(text for _, text, _ in buffer)
+
+
+def iter_char_chunks(paragraphs: Iterable[str], max_chars: int = 800) -> Iterator[Tuple[int, str]]:
+    """
+    Original chunker: lines packed into chunks of at most max_chars characters
+    (a single longer line becomes its own chunk).
+    """
+    parts: List[str] = []
+    size = 0
+    current_offset = 0
+
+    for offset, line in _iter_lines(paragraphs):
+        if size + len(line) + 1 <= max_chars:
+            if not parts:
+                current_offset = offset
+            size += len(line) + (1 if parts else 0)
+            parts.append(line)
+        else:
+            if parts:
+                yield current_offset, " ".join(parts)
+            parts = [line]
+            size = len(line)
+            current_offset = offset
+
+    if parts:
+        yield current_offset, " ".join(parts)
+
+
+def iter_chunks(paragraphs: Iterable[str], chunker_params: Dict) -> Iterator[Tuple[int, str]]:
+    """Dispatch on chunker parameters: {"max_tokens": ...} or the legacy {"max_chars": ...}."""
+    if "max_tokens" in chunker_params:
+        return iter_token_chunks(paragraphs, **chunker_params)
+    return iter_char_chunks(paragraphs, **chunker_params)
+
+
+def chunk_with_offsets(text: str, max_chars: int = 800) -> List[Tuple[int, str]]:
+    """
+    Split text into chunks of at most max_chars, respecting paragraph (line)
+    boundaries. Returns (offset, chunk) pairs, where offset is the position of
+    the chunk's first paragraph in text.
+    """
+    return list(iter_char_chunks([text], max_chars=max_chars))
+
+
+# ---------------------------------------------------------
+# Statistics
+# ---------------------------------------------------------
+
+def chunk_size_stats(chunks: Sequence[str], tokenizer: str = "estimate") -> Dict[str, float]:
+    """Token-size distribution of chunks (count, total, min, mean, p50, p95, max)."""
+    if not chunks:
+        return {"chunks": 0, "tokens_total": 0}
+    count_tokens = get_token_counter(tokenizer)
+    sizes = np.fromiter((count_tokens(c) for c in chunks), dtype=np.int64, count=len(chunks))
+    return {
+        "chunks": int(sizes.size),
+        "tokens_total": int(sizes.sum()),
+        "tokens_min": int(sizes.min()),
+        "tokens_mean": round(float(sizes.mean()), 1),
+        "tokens_p50": int(np.percentile(sizes, 50)),
+        "tokens_p95": int(np.percentile(sizes, 95)),
+        "tokens_max": int(sizes.max()),
+    }
@@ -0,0 +1,365 @@
+"""
+Embedding pipeline for large corpora.
+
+A single embeddings.create call over every chunk breaks once the corpus
+exceeds the per-request input/token limits and leaves the API's parallelism
+unused. embed_corpus() instead:
+
+1. splits the inputs into batches bounded by an estimated token budget and
+   an item count,
+2. runs the batches through a bounded thread pool, retrying rate limits and
+   transient errors with exponential backoff and jitter,
+3. writes each batch's vectors straight into its rows of a preallocated
+   float32 matrix, so the output order always matches the input order.
+
+embed_texts_async() is the asyncio counterpart for the serving path (an
+AsyncOpenAI-style client, batches awaited concurrently under a semaphore).
+
+FakeEmbeddingClient mimics the OpenAI client's embeddings API with
+deterministic vectors, so the pipeline (and the agent) can run offline;
+AsyncFakeEmbeddingClient wraps one for the async path.
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Per-request limits of the OpenAI embeddings endpoint (with some headroom).
+MAX_BATCH_ITEMS = 2048
+MAX_BATCH_TOKENS = 250_000
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_RETRYABLE_ERRORS = {"RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return max(1, (len(text) + 3) // 4)
+
+
+def iter_token_batches(
+    texts: Sequence[str],
+    max_batch_tokens: int = MAX_BATCH_TOKENS,
+    max_batch_items: int = MAX_BATCH_ITEMS,
+) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) ranges over texts whose estimated tokens and item count fit one request."""
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (tokens + cost > max_batch_tokens or i - start >= max_batch_items):
+            yield start, i
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        yield start, len(texts)
+
+
+# ---------------------------------------------------------
+# Retry
+# ---------------------------------------------------------
+
+def _is_retryable(error: Exception) -> bool:
+    if type(error).__name__ in _RETRYABLE_ERRORS:
+        return True
+    if getattr(error, "status_code", None) in _RETRYABLE_STATUS:
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server-suggested delay from a Retry-After header, if the error carries one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(error: Exception, attempt: int, base_delay: float, max_delay: float) -> float:
+    delay = _retry_after_seconds(error)
+    if delay is None:
+        # Full jitter: spread retries from many workers apart.
+        delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    return delay
+
+
+def _response_matrix(response) -> np.ndarray:
+    items = sorted(response.data, key=lambda item: item.index)
+    return np.asarray([item.embedding for item in items], dtype=np.float32)
+
+
+def _log_retry(error: Exception, size: int, attempt: int, max_retries: int, delay: float) -> None:
+    logger.warning(
+        "[embed_corpus] %s on a batch of %d; retry %d/%d in %.2fs.",
+        type(error).__name__, size, attempt, max_retries, delay,
+    )
+    telemetry.count("rag_embedding_retries_total")
+
+
+def _embed_batch_with_retry(
+    client,
+    model: str,
+    texts: List[str],
+    max_retries: int,
+    base_delay: float,
+    max_delay: float,
+) -> np.ndarray:
+    attempt = 0
+    while True:
+        try:
+            return _response_matrix(client.embeddings.create(model=model, input=texts))
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+            delay = _backoff_delay(e, attempt, base_delay, max_delay)
+            attempt += 1
+            _log_retry(e, len(texts), attempt, max_retries, delay)
+            time.sleep(delay)
+
+
+async def _embed_batch_with_retry_async(
+    client,
+    model: str,
+    texts: List[str],
+    max_retries: int,
+    base_delay: float,
+    max_delay: float,
+) -> np.ndarray:
+    attempt = 0
+    while True:
+        try:
+            return _response_matrix(await client.embeddings.create(model=model, input=texts))
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+            delay = _backoff_delay(e, attempt, base_delay, max_delay)
+            attempt += 1
+            _log_retry(e, len(texts), attempt, max_retries, delay)
+            await asyncio.sleep(delay)
+
+
+# ---------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------
+
+def embed_corpus(
+    texts: Sequence[str],
+    client,
+    model: str,
+    max_workers: int = 4,
+    max_batch_tokens: int = MAX_BATCH_TOKENS,
+    max_batch_items: int = MAX_BATCH_ITEMS,
+    max_retries: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 20.0,
+) -> np.ndarray:
+    """
+    Embed texts in size-bounded batches on a bounded thread pool.
+
+    Returns a float32 (len(texts), d) matrix in input order. At most
+    max_workers requests are in flight at a time; a batch that still fails
+    after max_retries retries fails the whole call.
+    """
+    if not texts:
+        return np.zeros((0, 1), dtype=np.float32)
+
+    batches = list(iter_token_batches(texts, max_batch_tokens, max_batch_items))
+    matrix: Optional[np.ndarray] = None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as pool:
+        pending = {
+            pool.submit(
+                _embed_batch_with_retry,
+                client, model, list(texts[start:end]), max_retries, base_delay, max_delay,
+            ): (start, end)
+            for start, end in batches
+        }
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end = pending.pop(future)
+                    vectors = future.result()
+                    if matrix is None:
+                        # Dimension is only known once the first batch returns.
+                        matrix = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+                    matrix[start:end] = vectors
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+    return matrix
+
+
+async def embed_texts_async(
+    texts: Sequence[str],
+    client,
+    model: str,
+    max_concurrency: int = 4,
+    max_batch_tokens: int = MAX_BATCH_TOKENS,
+    max_batch_items: int = MAX_BATCH_ITEMS,
+    max_retries: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 20.0,
+) -> np.ndarray:
+    """
+    embed_corpus() for async clients (AsyncOpenAI, AsyncFakeEmbeddingClient).
+
+    Batches are awaited on the caller's event loop, at most max_concurrency
+    at a time, so waiting on the API blocks neither the loop nor a thread.
+    """
+    if not texts:
+        return np.zeros((0, 1), dtype=np.float32)
+
+    batches = list(iter_token_batches(texts, max_batch_tokens, max_batch_items))
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(start: int, end: int) -> np.ndarray:
+        async with semaphore:
+            return await _embed_batch_with_retry_async(
+                client, model, list(texts[start:end]), max_retries, base_delay, max_delay
+            )
+
+    # gather() cancels the remaining batches if one fails.
+    blocks = await asyncio.gather(*(run(start, end) for start, end in batches))
+    return blocks[0] if len(blocks) == 1 else np.vstack(blocks)
+
+
+# ---------------------------------------------------------
+# Offline fake client
+# ---------------------------------------------------------
+
+class FakeRateLimitError(Exception):
+    """Injected failure that looks like an HTTP 429 to the retry logic."""
+
+    status_code = 429
+
+
+class _FakeEmbeddingItem:
+    __slots__ = ("index", "embedding")
+
+    def __init__(self, index: int, embedding: List[float]):
+        self.index = index
+        self.embedding = embedding
+
+
+class _FakeEmbeddingResponse:
+    def __init__(self, data: List[_FakeEmbeddingItem]):
+        self.data = data
+
+
+class _FakeEmbeddings:
+    def __init__(self, owner: "FakeEmbeddingClient"):
+        self._owner = owner
+
+    def create(self, model: str, input: List[str]) -> _FakeEmbeddingResponse:
+        return self._owner._create(model, input)
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class FakeEmbeddingClient:
+    """
+    Deterministic, offline stand-in for OpenAI().embeddings.
+
+    Vectors are hashed bag-of-words features (words and word bigrams), so texts
+    that share vocabulary get similar vectors and retrieval quality can be
+    measured without network access. latency_s and per_token_latency_s model
+    server time; failure_rate injects 429s to exercise retries.
+    """
+
+    def __init__(
+        self,
+        dim: int = 256,
+        latency_s: float = 0.0,
+        per_token_latency_s: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.dim = dim
+        self.latency_s = latency_s
+        self.per_token_latency_s = per_token_latency_s
+        self.failure_rate = failure_rate
+        self.embeddings = _FakeEmbeddings(self)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.inputs = 0
+        self.failures = 0
+
+    def embed(self, text: str) -> np.ndarray:
+        """The unit vector this client returns for text."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = _TOKEN_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            return vector
+        return vector / norm
+
+    def _admit(self, texts: List[str]) -> Tuple[float, bool]:
+        """Count a request; returns (simulated server time, whether it fails)."""
+        with self._lock:
+            self.requests += 1
+            fail = self.failure_rate > 0 and self._rng.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+            else:
+                self.inputs += len(texts)
+        tokens = sum(estimate_tokens(t) for t in texts)
+        return self.latency_s + self.per_token_latency_s * tokens, fail
+
+    def _respond(self, texts: List[str], fail: bool) -> _FakeEmbeddingResponse:
+        if fail:
+            raise FakeRateLimitError("Injected rate limit (429).")
+        return _FakeEmbeddingResponse(
+            [_FakeEmbeddingItem(i, self.embed(t).tolist()) for i, t in enumerate(texts)]
+        )
+
+    def _create(self, model: str, texts: List[str]) -> _FakeEmbeddingResponse:
+        delay, fail = self._admit(texts)
+        if delay > 0:
+            time.sleep(delay)
+        return self._respond(texts, fail)
+
+
+class _AsyncFakeEmbeddings:
+    def __init__(self, owner: FakeEmbeddingClient):
+        self._owner = owner
+
+    async def create(self, model: str, input: List[str]) -> _FakeEmbeddingResponse:
+        delay, fail = self._owner._admit(input)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._owner._respond(input, fail)
+
+
+class AsyncFakeEmbeddingClient:
+    """AsyncOpenAI-style view of a FakeEmbeddingClient: same vectors and counters, awaitable latency."""
+
+    def __init__(self, client: FakeEmbeddingClient):
+        self.client = client
+        self.embeddings = _AsyncFakeEmbeddings(client)
@@ -0,0 +1,174 @@
+"""
+Streaming paragraph extraction for HTML pages.
+
+Building a full BeautifulSoup tree of a large Wikipedia page just to read its
+<p> elements dominates the CPU and memory cost of an index build. This module
+uses the standard library's event-based html.parser instead: the response is
+fed in pieces and each paragraph is yielded as soon as its </p> is seen, so
+parsing overlaps the download and no tree is ever built.
+
+The text of a paragraph matches BeautifulSoup's p.get_text(strip=True): every
+text run is stripped and the runs are concatenated, while <script>/<style>
+content and comments are skipped. Keeping the output identical means existing
+persisted indexes stay valid.
+
+With headings=True, section titles (<h1>..<h6>) are also yielded, as Heading
+objects, in document order. They are markers for the section a paragraph
+belongs to and not part of the extracted text.
+"""
+
+import re
+from collections import deque
+from html.parser import HTMLParser
+from typing import Deque, Iterable, Iterator, List, Optional, Union
+
+CONTENT_DIV_ID = "mw-content-text"
+
+_SKIPPED_TAGS = {"script", "style", "template"}
+_HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_EDIT_LINK = re.compile(r"\[edit\]$")
+
+
+class Heading(str):
+    """
+    A section title in a paragraph stream.
+
+    in_text tells whether the title is also a paragraph of the document text
+    (Markdown headings are; HTML headings are not and must be dropped before
+    chunking).
+    """
+
+    in_text = False
+
+
+class StreamingParagraphExtractor(HTMLParser):
+    """
+    Incremental <p> extractor.
+
+    Paragraphs inside <div id=container_id> are made available as soon as they
+    close. If the page has no such div, every paragraph on the page is used
+    instead; those are only released at close(), since the container could
+    still appear later in the stream.
+    """
+
+    def __init__(self, container_id: Optional[str] = CONTENT_DIV_ID, headings: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.container_id = container_id
+        self.headings = headings
+        self.ready: Deque[str] = deque()
+
+        self._container_seen = container_id is None
+        self._container_depth = 0      # open <div>s inside the container (0 = outside)
+        self._in_paragraph = False
+        self._skip_depth = 0           # open <script>/<style> elements
+        self._runs: List[str] = []     # stripped text runs of the current paragraph
+        self._data: List[str] = []     # pieces of the current text run
+        self._outside: List[str] = []  # paragraphs seen before any container
+        self._heading_runs: Optional[List[str]] = None  # runs of the open heading, if any
+
+    # -----------------------------------------------------
+    # Text runs
+    # -----------------------------------------------------
+
+    def _end_run(self) -> None:
+        # A run ends at every tag or comment, as in BeautifulSoup's tree.
+        if self._data:
+            text = "".join(self._data).strip()
+            self._data = []
+            if text:
+                (self._heading_runs if self._heading_runs is not None else self._runs).append(text)
+
+    def _emit(self, item: str) -> None:
+        if self._container_depth > 0 or self.container_id is None:
+            self.ready.append(item)
+        elif not self._container_seen:
+            self._outside.append(item)
+
+    def _end_heading(self) -> None:
+        self._end_run()
+        text = _EDIT_LINK.sub("", " ".join(self._heading_runs)).strip()
+        self._heading_runs = None
+        if text:
+            self._emit(Heading(text))
+
+    def _end_paragraph(self) -> None:
+        self._end_run()
+        self._in_paragraph = False
+        text = "".join(self._runs)
+        self._runs = []
+        if text:
+            self._emit(text)
+
+    # -----------------------------------------------------
+    # Parser events
+    # -----------------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        self._end_run()
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == "div":
+            if self._container_depth > 0:
+                self._container_depth += 1
+            elif (
+                self.container_id is not None
+                and not self._container_seen
+                and dict(attrs).get("id") == self.container_id
+            ):
+                if self._in_paragraph:
+                    self._end_paragraph()
+                self._container_seen = True
+                self._container_depth = 1
+                self._outside = []
+        elif tag == "p":
+            if self._in_paragraph:
+                self._end_paragraph()
+            self._in_paragraph = True
+        elif tag in _HEADING_TAGS and self.headings and not self._in_paragraph:
+            self._heading_runs = []
+
+    def handle_endtag(self, tag):
+        self._end_run()
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _HEADING_TAGS and self._heading_runs is not None:
+            self._end_heading()
+        elif tag == "p":
+            if self._in_paragraph:
+                self._end_paragraph()
+        elif tag == "div" and self._container_depth > 0:
+            if self._container_depth == 1 and self._in_paragraph:
+                self._end_paragraph()
+            self._container_depth -= 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_run()
+
+    def handle_comment(self, data):
+        self._end_run()
+
+    def handle_data(self, data):
+        if (self._in_paragraph or self._heading_runs is not None) and self._skip_depth == 0:
+            self._data.append(data)
+
+    def close(self) -> None:
+        super().close()
+        if self._in_paragraph:
+            self._end_paragraph()
+        if not self._container_seen:
+            self.ready.extend(self._outside)
+            self._outside = []
+
+
+def iter_html_paragraphs(
+    pieces: Iterable[str], container_id: Optional[str] = CONTENT_DIV_ID, headings: bool = False
+) -> Iterator[Union[str, Heading]]:
+    """Yield paragraph texts (and, with headings, Heading markers) from decoded HTML pieces, as they complete."""
+    parser = StreamingParagraphExtractor(container_id, headings)
+    for piece in pieces:
+        parser.feed(piece)
+        while parser.ready:
+            yield parser.ready.popleft()
+    parser.close()
+    while parser.ready:
+        yield parser.ready.popleft()
@@ -0,0 +1,546 @@
+"""
+Persistent on-disk embedding index for the RAG wiki assistant.
+
+Each (source, embedding model, chunker parameters) combination gets its
+own directory under RAG_INDEX_DIR. The source is a single URL or an
+identifier for a multi-document corpus:
+
+    <RAG_INDEX_DIR>/<index_key>/
+        manifest.json                 # format version, keys, shape, file names
+        chunks-<content_hash>.json    # chunk texts, row-aligned with the matrix
+        meta-<content_hash>.json      # per-chunk provenance (source, offset, ...)
+        embeddings-<content_hash>.f32 # raw float32 (rows, dim) matrix, unit-normalized rows
+
+The manifest is written last and atomically, so readers always see a
+consistent chunk/matrix pair. The matrix is opened with np.memmap on first
+access, so loading an index neither reads nor copies the vectors up front.
+
+Several processes can share one index: the matrix pages live in the OS page
+cache once, however many workers map the file. build_lock() serializes
+builders across processes, and every save or refresh bumps the manifest's
+"generation" counter so readers can tell when to re-open the index.
+
+Rows are content-addressed: each chunk is identified by a hash of its
+normalized text, so refresh_index() can diff a new chunk set against the
+stored one and only embed chunks it has never seen.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import unicodedata
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from .vector_index import normalize_rows
+
+# Bump whenever the on-disk layout or the meaning of stored vectors changes.
+# v2: rows are stored unit-normalized.
+# v3: per-chunk provenance file; "source" replaces "source_url".
+INDEX_FORMAT_VERSION = 3
+
+DEFAULT_INDEX_DIR = os.getenv(
+    "RAG_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rag_index"),
+)
+
+MANIFEST_NAME = "manifest.json"
+
+
+# ---------------------------------------------------------
+# Keys
+# ---------------------------------------------------------
+
+def content_hash(text: str) -> str:
+    """Return a stable SHA-256 hex digest of the source content."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def index_key(source: str, embedding_model: str, chunker_params: Dict[str, Any]) -> str:
+    """Directory name for a source/model/chunker combination (content hash is checked separately)."""
+    payload = json.dumps(
+        {
+            "format_version": INDEX_FORMAT_VERSION,
+            "source": source,
+            "embedding_model": embedding_model,
+            "chunker": chunker_params,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def normalize_chunk(text: str) -> str:
+    """Normalization applied before hashing: Unicode NFKC and collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def chunk_id(text: str) -> str:
+    """Content address of a chunk: SHA-1 of its normalized text."""
+    return hashlib.sha1(normalize_chunk(text).encode("utf-8")).hexdigest()
+
+
+def dedupe_chunks(chunks: List[str]) -> List[str]:
+    """Drop chunks whose normalized text was already seen, keeping first occurrences in order."""
+    return dedupe_rows(chunks)[0]
+
+
+def dedupe_rows(
+    chunks: List[str], chunk_meta: Optional[List[Dict[str, Any]]] = None
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Like dedupe_chunks, keeping each surviving chunk's provenance record alongside it."""
+    if chunk_meta is None:
+        chunk_meta = [{} for _ in chunks]
+    seen = set()
+    unique: List[str] = []
+    unique_meta: List[Dict[str, Any]] = []
+    for chunk, meta in zip(chunks, chunk_meta):
+        cid = chunk_id(chunk)
+        if cid not in seen:
+            seen.add(cid)
+            unique.append(chunk)
+            unique_meta.append(meta)
+    return unique, unique_meta
+
+
+# ---------------------------------------------------------
+# Stored index (lazy, zero-copy)
+# ---------------------------------------------------------
+
+class StoredIndex:
+    """A persisted index whose chunks and vectors are only read when first accessed."""
+
+    def __init__(self, directory: str, manifest: Dict[str, Any]):
+        self.directory = directory
+        self.manifest = manifest
+        self._chunks: Optional[List[str]] = None
+        self._chunk_meta: Optional[List[Dict[str, Any]]] = None
+        self._embeddings: Optional[np.ndarray] = None
+
+    @property
+    def content_hash(self) -> str:
+        return self.manifest["content_hash"]
+
+    @property
+    def chunks(self) -> List[str]:
+        if self._chunks is None:
+            path = os.path.join(self.directory, self.manifest["files"]["chunks"])
+            with open(path, "r", encoding="utf-8") as f:
+                self._chunks = json.load(f)
+        return self._chunks
+
+    @property
+    def chunk_meta(self) -> List[Dict[str, Any]]:
+        """Per-row provenance records (e.g. {"source": ..., "offset": ...})."""
+        if self._chunk_meta is None:
+            path = os.path.join(self.directory, self.manifest["files"]["meta"])
+            with open(path, "r", encoding="utf-8") as f:
+                self._chunk_meta = json.load(f)
+        return self._chunk_meta
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Read-only memory map over the stored matrix; pages are faulted in on use."""
+        if self._embeddings is None:
+            path = os.path.join(self.directory, self.manifest["files"]["embeddings"])
+            self._embeddings = np.memmap(
+                path,
+                dtype=np.dtype(self.manifest["dtype"]),
+                mode="r",
+                shape=(self.manifest["rows"], self.manifest["dim"]),
+            )
+        return self._embeddings
+
+    def artifact_path(self, kind: str, params: Dict[str, Any]) -> str:
+        """
+        Path for a file derived from this index version (e.g. quantized codes).
+
+        The name includes the content hash and params, so a stale artifact is
+        never picked up; saves and refreshes remove it with the old files.
+        Callers add their own extension(s).
+        """
+        digest = content_hash(json.dumps(params, sort_keys=True))[:12]
+        return os.path.join(self.directory, f"{kind}-{self.content_hash[:16]}-{digest}")
+
+
+def index_directory(
+    source: str,
+    embedding_model: str,
+    chunker_params: Dict[str, Any],
+    index_dir: Optional[str] = None,
+) -> str:
+    return os.path.join(index_dir or DEFAULT_INDEX_DIR, index_key(source, embedding_model, chunker_params))
+
+
+def _read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _manifest_is_usable(directory: str, manifest: Dict[str, Any]) -> bool:
+    """Check the format version and that the matrix file matches the recorded shape."""
+    if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+        return False
+    if manifest.get("dirty"):
+        # An in-place refresh was interrupted; the matrix may be half-written.
+        return False
+    try:
+        files = manifest["files"]
+        expected_bytes = manifest["rows"] * manifest["dim"] * np.dtype(manifest["dtype"]).itemsize
+        matrix_path = os.path.join(directory, files["embeddings"])
+        chunks_path = os.path.join(directory, files["chunks"])
+        meta_path = os.path.join(directory, files["meta"])
+    except (KeyError, TypeError):
+        return False
+    return (
+        os.path.isfile(chunks_path)
+        and os.path.isfile(meta_path)
+        and os.path.isfile(matrix_path)
+        and os.path.getsize(matrix_path) == expected_bytes
+    )
+
+
+def load_index(
+    source: str,
+    embedding_model: str,
+    chunker_params: Dict[str, Any],
+    expected_content_hash: Optional[str] = None,
+    index_dir: Optional[str] = None,
+) -> Optional[StoredIndex]:
+    """
+    Open the persisted index for these keys, or return None if it is missing or stale.
+
+    When expected_content_hash is None, any valid index for the source is accepted;
+    this is used as a fallback when the source cannot be fetched.
+    """
+    directory = index_directory(source, embedding_model, chunker_params, index_dir)
+    manifest = _read_manifest(directory)
+    if manifest is None or not _manifest_is_usable(directory, manifest):
+        return None
+
+    if (
+        manifest.get("source") != source
+        or manifest.get("embedding_model") != embedding_model
+        or manifest.get("chunker") != chunker_params
+    ):
+        return None
+
+    if expected_content_hash is not None and manifest.get("content_hash") != expected_content_hash:
+        return None
+
+    return StoredIndex(directory, manifest)
+
+
+def read_generation(directory: str) -> Optional[int]:
+    """Generation of the index currently published in directory (None if there is none)."""
+    manifest = _read_manifest(directory)
+    if manifest is None or manifest.get("dirty"):
+        return None
+    return int(manifest.get("generation", 0))
+
+
+# ---------------------------------------------------------
+# Cross-process build lock
+# ---------------------------------------------------------
+
+@contextmanager
+def build_lock(directory: str) -> Iterator[None]:
+    """
+    Exclusive lock held while one process builds or refreshes the index in directory.
+
+    The lock file sits next to the index directory (not inside it, where stale
+    files are pruned) and is released by the OS if the holder dies.
+    """
+    os.makedirs(os.path.dirname(directory) or ".", exist_ok=True)
+    with open(directory + ".lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 s; keep waiting
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# ---------------------------------------------------------
+# Writing
+# ---------------------------------------------------------
+
+def _atomic_write(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _next_generation(directory: str) -> int:
+    manifest = _read_manifest(directory)
+    return int(manifest.get("generation", 0)) + 1 if manifest else 1
+
+
+def _write_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+    _atomic_write(os.path.join(directory, MANIFEST_NAME), json.dumps(manifest, indent=2).encode("utf-8"))
+
+
+def _remove_unreferenced_files(directory: str, files: Dict[str, str]) -> None:
+    # Older versions are unreachable once the manifest points at the new files.
+    # Readers that still map them keep their inode alive until they let go.
+    for name in os.listdir(directory):
+        if name != MANIFEST_NAME and name not in files.values() and not name.startswith(".tmp-"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def save_index(
+    source: str,
+    embedding_model: str,
+    chunker_params: Dict[str, Any],
+    source_content_hash: str,
+    chunks: List[str],
+    embeddings: np.ndarray,
+    chunk_meta: Optional[List[Dict[str, Any]]] = None,
+    manifest_extra: Optional[Dict[str, Any]] = None,
+    index_dir: Optional[str] = None,
+) -> StoredIndex:
+    """
+    Persist chunks and their embedding matrix, replacing any older version for these keys.
+
+    Rows are normalized to unit length before writing, so search backends can use
+    the memory-mapped matrix directly. chunk_meta holds one provenance record per
+    chunk; manifest_extra is merged into the manifest (e.g. per-document info).
+    """
+    if embeddings.ndim != 2 or embeddings.shape[0] != len(chunks):
+        raise ValueError(
+            f"Embeddings shape {embeddings.shape} does not match {len(chunks)} chunks."
+        )
+
+    if chunk_meta is None:
+        chunk_meta = [{} for _ in chunks]
+    if len(chunk_meta) != len(chunks):
+        raise ValueError(f"Got {len(chunk_meta)} provenance records for {len(chunks)} chunks.")
+
+    directory = index_directory(source, embedding_model, chunker_params, index_dir)
+    os.makedirs(directory, exist_ok=True)
+
+    matrix = np.ascontiguousarray(normalize_rows(embeddings))
+    suffix = source_content_hash[:16]
+    files = {
+        "chunks": f"chunks-{suffix}.json",
+        "meta": f"meta-{suffix}.json",
+        "embeddings": f"embeddings-{suffix}.f32",
+    }
+
+    _atomic_write(os.path.join(directory, files["chunks"]), json.dumps(chunks).encode("utf-8"))
+    _atomic_write(os.path.join(directory, files["meta"]), json.dumps(chunk_meta).encode("utf-8"))
+    _atomic_write(os.path.join(directory, files["embeddings"]), matrix.tobytes())
+
+    manifest = dict(manifest_extra or {})
+    manifest.update({
+        "format_version": INDEX_FORMAT_VERSION,
+        "source": source,
+        "embedding_model": embedding_model,
+        "chunker": chunker_params,
+        "content_hash": source_content_hash,
+        "rows": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "dtype": "float32",
+        "files": files,
+        "created_at": time.time(),
+        "generation": _next_generation(directory),
+    })
+    _write_manifest(directory, manifest)
+    _remove_unreferenced_files(directory, files)
+
+    return StoredIndex(directory, manifest)
+
+
+# ---------------------------------------------------------
+# Incremental refresh
+# ---------------------------------------------------------
+
+def _plan_rows(
+    old_ids: List[str], new_ids: List[str]
+) -> Tuple[List[int], List[int], List[Tuple[int, int]], int]:
+    """
+    Decide where each new chunk lives in the refreshed matrix.
+
+    Returns (free_rows_to_fill, added_positions, tail_moves, final_rows):
+    - added_positions: indexes into new_ids that need embedding
+    - free_rows_to_fill: destination rows for those chunks (existing holes first,
+      then appended rows)
+    - tail_moves: (src_row, dst_row) moves that compact leftover holes when the
+      chunk set shrinks
+    """
+    new_set = set(new_ids)
+    old_rows = {cid: row for row, cid in enumerate(old_ids)}
+
+    holes = [row for row, cid in enumerate(old_ids) if cid not in new_set]
+    added_positions = [pos for pos, cid in enumerate(new_ids) if cid not in old_rows]
+
+    n_old = len(old_ids)
+    final_rows = len(new_ids)
+
+    fill = holes[: len(added_positions)]
+    fill += list(range(n_old, n_old + len(added_positions) - len(fill)))
+
+    # More removals than additions: move live rows from the tail into the
+    # remaining holes below final_rows, then truncate.
+    leftover = sorted(row for row in holes[len(added_positions):] if row < final_rows)
+    tail_sources = [
+        row for row in range(final_rows, n_old) if old_ids[row] in new_set
+    ]
+    tail_moves = list(zip(tail_sources, leftover))
+
+    return fill, added_positions, tail_moves, final_rows
+
+
+def refresh_index(
+    stored: StoredIndex,
+    source_content_hash: str,
+    chunks: List[str],
+    embed_fn: Callable[[List[str]], np.ndarray],
+    chunk_meta: Optional[List[Dict[str, Any]]] = None,
+    manifest_extra: Optional[Dict[str, Any]] = None,
+    in_place: bool = False,
+) -> Tuple[StoredIndex, Dict[str, int]]:
+    """
+    Bring a stored index up to date with a new chunk set, embedding only new chunks.
+
+    By default a fresh matrix is written and renamed into place, so processes
+    that map the old file keep reading it unchanged. With in_place=True the
+    existing matrix file is patched instead: rows of removed chunks are
+    overwritten by new ones, and the file is grown or compacted as needed. The
+    manifest is marked dirty for the duration, so a crash leads to a full
+    rebuild rather than a corrupt index. Only use it when this process is known
+    to be the only one mapping the file: shrinking a mapped file raises SIGBUS
+    in its readers. Either way, hold build_lock() while refreshing.
+
+    Provenance in chunk_meta is refreshed for every row, including reused ones
+    (a chunk may move to a new offset without changing its text).
+
+    Returns the refreshed index and counts of added, removed and reused chunks.
+    """
+    chunks, chunk_meta = dedupe_rows(chunks, chunk_meta)
+    old_chunks = stored.chunks
+    old_ids = [chunk_id(c) for c in old_chunks]
+    new_ids = [chunk_id(c) for c in chunks]
+
+    fill, added_positions, tail_moves, final_rows = _plan_rows(old_ids, new_ids)
+    stats = {
+        "added": len(added_positions),
+        "removed": len(set(old_ids) - set(new_ids)),
+        "reused": len(chunks) - len(added_positions),
+    }
+
+    added_vectors = None
+    if added_positions:
+        added_vectors = normalize_rows(embed_fn([chunks[pos] for pos in added_positions]))
+        if added_vectors.shape[1] != stored.manifest["dim"]:
+            raise ValueError(
+                f"Embedding dim {added_vectors.shape[1]} does not match stored dim {stored.manifest['dim']}."
+            )
+
+    # Row-aligned chunk texts for the refreshed matrix.
+    row_texts: List[Optional[str]] = list(old_chunks) + [None] * max(0, final_rows - len(old_chunks))
+    for pos, row in zip(added_positions, fill):
+        row_texts[row] = chunks[pos]
+    for src, dst in tail_moves:
+        row_texts[dst] = row_texts[src]
+    row_texts = row_texts[:final_rows]
+
+    meta_by_id = {chunk_id(c): m for c, m in zip(chunks, chunk_meta)}
+    row_meta = [meta_by_id[chunk_id(text)] for text in row_texts]
+
+    directory = stored.directory
+    dim = stored.manifest["dim"]
+    files = {
+        "chunks": f"chunks-{source_content_hash[:16]}.json",
+        "meta": f"meta-{source_content_hash[:16]}.json",
+        "embeddings": stored.manifest["files"]["embeddings"],
+    }
+
+    if in_place:
+        manifest = dict(stored.manifest, dirty=True)
+        _write_manifest(directory, manifest)
+
+        matrix_path = os.path.join(directory, files["embeddings"])
+        rows_on_disk = max(final_rows, stored.manifest["rows"])
+        if rows_on_disk > stored.manifest["rows"]:
+            with open(matrix_path, "r+b") as f:
+                f.truncate(rows_on_disk * dim * 4)
+
+        if rows_on_disk:
+            matrix = np.memmap(matrix_path, dtype=np.float32, mode="r+", shape=(rows_on_disk, dim))
+            if added_vectors is not None:
+                matrix[fill] = added_vectors
+            for src, dst in tail_moves:
+                matrix[dst] = matrix[src]
+            matrix.flush()
+            del matrix
+
+        if final_rows < rows_on_disk:
+            with open(matrix_path, "r+b") as f:
+                f.truncate(final_rows * dim * 4)
+    else:
+        files["embeddings"] = f"embeddings-{source_content_hash[:16]}.f32"
+        old_matrix = stored.embeddings
+        matrix = np.empty((final_rows, dim), dtype=np.float32)
+        keep = min(final_rows, len(old_chunks))
+        matrix[:keep] = old_matrix[:keep]
+        if added_vectors is not None:
+            matrix[fill] = added_vectors
+        for src, dst in tail_moves:
+            matrix[dst] = old_matrix[src]
+        _atomic_write(os.path.join(directory, files["embeddings"]), matrix.tobytes())
+
+    _atomic_write(os.path.join(directory, files["chunks"]), json.dumps(row_texts).encode("utf-8"))
+    _atomic_write(os.path.join(directory, files["meta"]), json.dumps(row_meta).encode("utf-8"))
+
+    manifest = dict(
+        stored.manifest,
+        **(manifest_extra or {}),
+        content_hash=source_content_hash,
+        rows=final_rows,
+        files=files,
+        created_at=time.time(),
+        generation=max(_next_generation(directory), int(stored.manifest.get("generation", 0)) + 1),
+    )
+    manifest.pop("dirty", None)
+    _write_manifest(directory, manifest)
+    _remove_unreferenced_files(directory, files)
+
+    return StoredIndex(directory, manifest), stats
@@ -0,0 +1,484 @@
+"""
+Corpus ingestion for the RAG agent.
+
+A corpus is a list of sources, each one of:
+- an http(s) URL (fetched through a pooled requests.Session),
+- a file:// URI or local path to an .html/.htm, .md/.markdown or .txt file,
+- a local directory, expanded recursively to the supported files in it.
+
+iter_corpus() fetches sources concurrently and yields each document as soon
+as it is parsed and chunked. Bodies are streamed: HTML is parsed and chunked
+while it downloads (see html_stream), so a raw page is never held in memory
+as a whole. Every chunk carries its provenance: the source it came
+from and its character offset in that document's extracted text.
+
+Given the validators recorded for an earlier version of the corpus,
+re-fetches are conditional: URLs are requested with If-None-Match /
+If-Modified-Since, local files are compared by modification time and size,
+and sources that have not changed are reported instead of downloaded again.
+
+Chunks are also labelled with the section (nearest preceding heading) they
+start in, and documents with their modification time, for metadata filters.
+"""
+
+import bisect
+import codecs
+import contextvars
+import hashlib
+import logging
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+from urllib.request import url2pathname
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import telemetry
+from .chunking import chunk_with_offsets, iter_chunks  # noqa: F401  (chunk_with_offsets re-exported)
+from .html_stream import Heading, iter_html_paragraphs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    )
+}
+
+HTML_EXTENSIONS = {".html", ".htm"}
+MARKDOWN_EXTENSIONS = {".md", ".markdown"}
+TEXT_EXTENSIONS = {".txt"}
+SUPPORTED_EXTENSIONS = HTML_EXTENSIONS | MARKDOWN_EXTENSIONS | TEXT_EXTENSIONS
+
+# Size of the pieces bodies are read and parsed in.
+READ_CHUNK_BYTES = 64 * 1024
+
+
+# ---------------------------------------------------------
+# Documents
+# ---------------------------------------------------------
+
+class FetchedDocument:
+    """
+    An opened source plus the HTTP validators needed for conditional re-fetches.
+
+    The body is a one-shot iterable of decoded text pieces, so it can be parsed
+    while it is still being read; .body joins it for callers that want a string.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        pieces: Iterable[str],
+        kind: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        close: Optional[Callable[[], None]] = None,
+    ):
+        self.source = source
+        self.pieces = pieces
+        self.kind = kind  # "html", "markdown" or "text"
+        self.etag = etag
+        self.last_modified = last_modified
+        self._close = close
+        self._body: Optional[str] = None
+
+    @property
+    def body(self) -> str:
+        if self._body is None:
+            try:
+                self._body = "".join(self.pieces)
+            finally:
+                self.close()
+        return self._body
+
+    def close(self) -> None:
+        """Release the underlying file or connection."""
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+
+class DocumentChunks:
+    """
+    A parsed and chunked document: (offset, text) chunks and a hash of its extracted text.
+
+    sections[i] is the title of the section chunk i starts in (None before the first heading).
+    """
+
+    def __init__(
+        self,
+        source: str,
+        content_hash: str,
+        chunks: List[Tuple[int, str]],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        sections: Optional[List[Optional[str]]] = None,
+    ):
+        self.source = source
+        self.content_hash = content_hash
+        self.chunks = chunks
+        self.etag = etag
+        self.last_modified = last_modified
+        self.sections = sections if sections is not None else [None] * len(chunks)
+
+    @property
+    def modified_at(self) -> Optional[float]:
+        """last_modified as a POSIX timestamp (None if unknown or unparseable)."""
+        if not self.last_modified:
+            return None
+        try:
+            return parsedate_to_datetime(self.last_modified).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+    def describe(self) -> Dict[str, object]:
+        """Per-document record stored in the index manifest."""
+        return {
+            "source": self.source,
+            "content_hash": self.content_hash,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "chunks": len(self.chunks),
+        }
+
+
+# ---------------------------------------------------------
+# Sources
+# ---------------------------------------------------------
+
+def _local_path(source: str) -> Optional[str]:
+    """Filesystem path for file:// URIs and plain paths; None for remote URLs."""
+    parsed = urlparse(source)
+    if parsed.scheme == "file":
+        return url2pathname(unquote(parsed.path))
+    if parsed.scheme in ("http", "https"):
+        return None
+    return os.path.expanduser(source)
+
+
+def _kind_for_path(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in HTML_EXTENSIONS:
+        return "html"
+    if ext in MARKDOWN_EXTENSIONS:
+        return "markdown"
+    return "text"
+
+
+def expand_sources(specs: Iterable[str]) -> List[str]:
+    """Expand directories into the supported files they contain; keep URLs and files as given."""
+    sources: List[str] = []
+    for spec in specs:
+        path = _local_path(spec)
+        if path is not None and os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        sources.append(os.path.join(root, name))
+        else:
+            sources.append(spec)
+    return list(dict.fromkeys(sources))
+
+
+def make_session(pool_size: int = 8) -> requests.Session:
+    """HTTP session with a connection pool sized for concurrent fetches and retries on 429/5xx."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def _iter_file(f) -> Iterator[str]:
+    while True:
+        piece = f.read(READ_CHUNK_BYTES)
+        if not piece:
+            return
+        yield piece
+
+
+def _iter_response_text(response: requests.Response) -> Iterator[str]:
+    # requests falls back to ISO-8859-1 for text/* without a charset; UTF-8 is
+    # the better guess for web pages. Decoding is incremental because
+    # multi-byte characters may straddle network chunks.
+    content_type = response.headers.get("Content-Type", "").lower()
+    encoding = response.encoding if "charset" in content_type and response.encoding else "utf-8"
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for raw in response.iter_content(chunk_size=READ_CHUNK_BYTES):
+        piece = decoder.decode(raw)
+        if piece:
+            yield piece
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _file_validators(path: str) -> Tuple[str, str]:
+    """(ETag-like token from modification time and size, HTTP-date of the modification time)."""
+    stat = os.stat(path)
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', formatdate(stat.st_mtime, usegmt=True)
+
+
+def fetch_document(
+    source: str,
+    session: requests.Session,
+    timeout: float = 15,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> Optional[FetchedDocument]:
+    """
+    Open one source from disk or over HTTP; the body is streamed, not read up front.
+
+    etag / last_modified are the validators of a previously fetched version:
+    if the source is unchanged (HTTP 304, or a local file with the same
+    modification time and size), None is returned and nothing is read.
+    """
+    path = _local_path(source)
+    if path is not None:
+        file_etag, file_modified = _file_validators(path)
+        if etag is not None and etag == file_etag:
+            return None
+        f = open(path, "r", encoding="utf-8", errors="replace")
+        return FetchedDocument(
+            source, _iter_file(f), _kind_for_path(path), etag=file_etag, last_modified=file_modified, close=f.close
+        )
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    response = session.get(source, timeout=timeout, stream=True, headers=headers)
+    if response.status_code == 304:
+        response.close()
+        return None
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    content_type = response.headers.get("Content-Type", "")
+    if "markdown" in content_type:
+        kind = "markdown"
+    elif "html" in content_type or not content_type:
+        kind = "html"
+    else:
+        kind = "text"
+    return FetchedDocument(
+        source,
+        _iter_response_text(response),
+        kind,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+        close=response.close,
+    )
+
+
+# ---------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------
+
+def extract_html_paragraphs(html: str) -> List[str]:
+    """Text of every <p> in the MediaWiki content div (or the whole page if there is none)."""
+    return list(iter_html_paragraphs([html]))
+
+
+_MD_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+")
+_MD_FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+class _MarkdownHeading(Heading):
+    in_text = True  # Markdown headings stay in the extracted text
+
+
+def extract_markdown_paragraphs(text: str) -> List[str]:
+    """Blank-line separated blocks, with heading markers removed and fenced code skipped."""
+    paragraphs: List[str] = []
+    block: List[str] = []
+    in_fence = False
+
+    def flush():
+        if block:
+            paragraphs.append(" ".join(line.strip() for line in block))
+            block.clear()
+
+    for line in text.splitlines():
+        if _MD_FENCE.match(line):
+            flush()
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+        if not line.strip():
+            flush()
+        elif _MD_HEADING.match(line):
+            flush()
+            paragraphs.append(_MarkdownHeading(_MD_HEADING.sub("", line).strip()))
+        else:
+            block.append(line)
+    flush()
+    return [p for p in paragraphs if p]
+
+
+def extract_paragraphs(document: FetchedDocument, headings: bool = False) -> Iterator[str]:
+    """
+    Paragraphs of a document; HTML paragraphs are yielded while the body is still streaming.
+
+    Markdown headings are always paragraphs (as Heading instances); with
+    headings, HTML section titles are yielded too, as Heading markers that are
+    not part of the text.
+    """
+    if document.kind == "html":
+        return iter_html_paragraphs(document.pieces, headings=headings)
+    return iter(extract_markdown_paragraphs(document.body))
+
+
+# ---------------------------------------------------------
+# Chunking
+# ---------------------------------------------------------
+
+def _hashing(paragraphs: Iterable[str], digest) -> Iterator[str]:
+    """Pass paragraphs through, feeding digest the same bytes as "\n".join(paragraphs)."""
+    separator = b""
+    for paragraph in paragraphs:
+        digest.update(separator)
+        digest.update(paragraph.encode("utf-8"))
+        separator = b"\n"
+        yield paragraph
+
+
+def _tracking_sections(paragraphs: Iterable[str], boundaries: List[Tuple[int, str]]) -> Iterator[str]:
+    """
+    Pass the text paragraphs through, appending (offset, title) to boundaries
+    for every heading; offsets refer to "\n".join(text paragraphs).
+    """
+    offset = 0
+    for paragraph in paragraphs:
+        if isinstance(paragraph, Heading):
+            boundaries.append((offset, str(paragraph)))
+            if not paragraph.in_text:
+                continue
+        yield paragraph
+        offset += len(paragraph) + 1
+
+
+def _chunk_sections(chunks: List[Tuple[int, str]], boundaries: List[Tuple[int, str]]) -> List[Optional[str]]:
+    starts = [offset for offset, _ in boundaries]
+    sections: List[Optional[str]] = []
+    for offset, _ in chunks:
+        i = bisect.bisect_right(starts, offset) - 1
+        sections.append(boundaries[i][1] if i >= 0 else None)
+    return sections
+
+
+def parse_document(document: FetchedDocument, chunker_params: Dict[str, int]) -> DocumentChunks:
+    digest = hashlib.sha256()
+    boundaries: List[Tuple[int, str]] = []
+    try:
+        paragraphs = _hashing(_tracking_sections(extract_paragraphs(document, headings=True), boundaries), digest)
+        chunks = list(iter_chunks(paragraphs, chunker_params))
+    finally:
+        document.close()
+    return DocumentChunks(
+        document.source,
+        digest.hexdigest(),
+        chunks,
+        etag=document.etag,
+        last_modified=document.last_modified,
+        sections=_chunk_sections(chunks, boundaries),
+    )
+
+
+# ---------------------------------------------------------
+# Concurrent ingestion
+# ---------------------------------------------------------
+
+def _load(
+    source: str, session: requests.Session, chunker_params: Dict[str, int], validators: Optional[Dict]
+) -> Optional[DocumentChunks]:
+    with telemetry.span("fetch", source=source) as fetch_span:
+        document = fetch_document(source, session, **(validators or {}))
+        if document is None:
+            fetch_span.set(not_modified=True)
+            return None
+    # The body streams in while it is parsed, so "chunk" includes the download.
+    with telemetry.span("chunk", source=source) as chunk_span:
+        parsed = parse_document(document, chunker_params)
+        chunk_span.set(chunks=len(parsed.chunks))
+    return parsed
+
+
+def iter_corpus(
+    sources: Iterable[str],
+    chunker_params: Dict[str, int],
+    max_workers: int = 8,
+    failed: Optional[List[str]] = None,
+    validators: Optional[Dict[str, Dict[str, Optional[str]]]] = None,
+    unchanged: Optional[List[str]] = None,
+) -> Iterator[DocumentChunks]:
+    """
+    Fetch, parse and chunk sources concurrently, yielding documents as they complete.
+
+    At most 2 * max_workers documents are in flight, so raw pages do not pile up
+    when the consumer (e.g. embedding) is slower than fetching. Sources that fail
+    are logged, appended to failed (if given) and skipped.
+
+    validators maps sources to the {"etag", "last_modified"} of their last
+    fetch; sources that turn out unchanged are appended to unchanged (if
+    given) and skipped.
+    """
+    validators = validators or {}
+    pending_sources = iter(expand_sources(sources))
+    session = make_session(max_workers)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = {}
+
+        def fill():
+            while len(in_flight) < 2 * max_workers:
+                source = next(pending_sources, None)
+                if source is None:
+                    return
+                # Copy the caller's context so fetch/chunk spans nest under its trace.
+                context = contextvars.copy_context()
+                in_flight[pool.submit(
+                    context.run, _load, source, session, chunker_params, validators.get(source)
+                )] = source
+
+        fill()
+        try:
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source = in_flight.pop(future)
+                    try:
+                        document = future.result()
+                    except Exception as e:
+                        logger.warning("[iter_corpus] Error ingesting %s: %s", source, e)
+                        telemetry.count("rag_ingest_errors_total")
+                        if failed is not None:
+                            failed.append(source)
+                        continue
+                    if document is None:
+                        logger.debug("[iter_corpus] %s: not modified.", source)
+                        telemetry.count("rag_ingest_not_modified_total")
+                        if unchanged is not None:
+                            unchanged.append(source)
+                        continue
+                    logger.info("[iter_corpus] %s: %d chunks.", source, len(document.chunks))
+                    yield document
+                fill()
+        finally:
+            for future in in_flight:
+                future.cancel()
+            session.close()
@@ -0,0 +1,191 @@
+"""
+Lexical (BM25) retrieval and rank fusion.
+
+Cosine ranking over embeddings is weak on exact-term queries -- names,
+acronyms, years -- and always needs an embedding call. BM25Index is an
+in-process inverted index over the chunks:
+
+- postings are stored as compact CSR arrays: for term t, its documents are
+  doc_ids[offsets[t]:offsets[t + 1]] (ascending) with the matching BM25
+  contributions in weights[...], precomputed at build time,
+- a query adds the weight slices of its terms into one score vector and
+  takes the top-k with argpartition.
+
+reciprocal_rank_fusion() merges lexical and vector rankings, and
+BM25Index.is_confident() decides when a lexical result is clear enough to
+answer without embedding the query at all.
+"""
+
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .vector_index import _top_k
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Very common English words carry no ranking signal and would make every
+# query "match" every chunk.
+STOPWORDS = frozenset(
+    """
+    a an and are as at be been but by can could did do does for from had has have
+    how i if in into is it its me my no not of on or our so than that the their them
+    then there these they this those to was we were what when where which who whom
+    why will with would you your about also may might must shall should
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Case-folded word tokens without stopwords; numbers (e.g. years) are kept."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return [t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+# ---------------------------------------------------------
+# BM25 inverted index
+# ---------------------------------------------------------
+
+class BM25Index:
+    """Okapi BM25 over a list of chunks, with postings in flat NumPy arrays."""
+
+    name = "bm25"
+
+    def __init__(self, chunks: Sequence[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: Dict[str, int] = {}
+
+        # One pass over the chunks; postings are collected in typed arrays
+        # (4 bytes per entry) rather than lists of Python ints.
+        term_ids = array("i")
+        doc_ids = array("i")
+        tfs = array("i")
+        doc_len = np.zeros(len(chunks), dtype=np.float32)
+        for doc, text in enumerate(chunks):
+            counts = Counter(tokenize(text))
+            doc_len[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(doc)
+                tfs.append(tf)
+
+        n_terms = len(self.vocabulary)
+        term_ids_np = np.frombuffer(term_ids, dtype=np.int32)
+        # Stable sort by term keeps each posting list in ascending doc order.
+        order = np.argsort(term_ids_np, kind="stable")
+        posting_terms = term_ids_np[order]
+        self.doc_ids = np.frombuffer(doc_ids, dtype=np.int32)[order]
+        tf = np.frombuffer(tfs, dtype=np.int32)[order].astype(np.float32)
+
+        df = np.bincount(term_ids_np, minlength=n_terms)
+        self.offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=self.offsets[1:])
+
+        n_docs = max(len(chunks), 1)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if len(chunks) and doc_len.mean() > 0 else 1.0
+        norm = k1 * (1.0 - b + b * doc_len[self.doc_ids] / avgdl)
+        self.weights = (self.idf[posting_terms] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        self._n_docs = len(chunks)
+
+    def __len__(self) -> int:
+        return self._n_docs
+
+    @property
+    def nbytes(self) -> int:
+        return self.doc_ids.nbytes + self.weights.nbytes + self.offsets.nbytes + self.idf.nbytes
+
+    def query_terms(self, query: str) -> Tuple[List[int], int]:
+        """(distinct term ids of query found in the vocabulary, number of query terms not found)."""
+        known: List[int] = []
+        unknown = 0
+        for term in dict.fromkeys(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                unknown += 1
+            else:
+                known.append(term_id)
+        return known, unknown
+
+    def _postings(self, term_id: int) -> slice:
+        return slice(self.offsets[term_id], self.offsets[term_id + 1])
+
+    def search(self, query: str, top_k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (chunk indexes, BM25 scores) of the top_k matching chunks, best first.
+
+        With a boolean mask over the chunks, only chunks where it is True are returned.
+        """
+        terms, _ = self.query_terms(query)
+        if not terms or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        scores = np.zeros(self._n_docs, dtype=np.float32)
+        for term_id in terms:
+            postings = self._postings(term_id)
+            # Doc ids are unique within a posting list, so fancy-index += is exact.
+            scores[self.doc_ids[postings]] += self.weights[postings]
+
+        matched = np.flatnonzero(scores)
+        if mask is not None:
+            matched = matched[mask[matched]]
+        top = matched[_top_k(scores[matched], top_k)]
+        return top, scores[top]
+
+    def search_batch(
+        self, queries: Sequence[str], top_k: int, mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return [self.search(q, top_k, mask) for q in queries]
+
+    def contains(self, doc: int, term_id: int) -> bool:
+        docs = self.doc_ids[self._postings(term_id)]
+        i = np.searchsorted(docs, doc)
+        return bool(i < len(docs) and docs[i] == doc)
+
+    def is_confident(self, query: str, ids: np.ndarray, scores: np.ndarray, min_ratio: float) -> bool:
+        """
+        Whether a lexical result can stand alone: every query term is known to
+        the index and present in the best chunk, and that chunk's score is at
+        least min_ratio times the runner-up's.
+        """
+        if min_ratio <= 0 or len(ids) == 0:
+            return False
+        terms, unknown = self.query_terms(query)
+        if unknown or not terms:
+            return False
+        if not all(self.contains(int(ids[0]), t) for t in terms):
+            return False
+        return len(scores) == 1 or float(scores[0]) >= min_ratio * float(scores[1])
+
+
+# ---------------------------------------------------------
+# Fusion
+# ---------------------------------------------------------
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[np.ndarray],
+    top_k: int,
+    k: int = 60,
+    weights: Optional[Sequence[float]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse ranked id lists: score(d) = sum_i w_i / (k + rank_i(d)), ranks from 1.
+
+    RRF only uses ranks, so BM25 and cosine scores need no calibration
+    against each other. Returns (ids, fused scores), best first.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            doc = int(doc)
+            fused[doc] = fused.get(doc, 0.0) + weight / (k + rank)
+    best = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+    ids = np.fromiter((doc for doc, _ in best), dtype=np.int64, count=len(best))
+    scores = np.fromiter((score for _, score in best), dtype=np.float32, count=len(best))
+    return ids, scores
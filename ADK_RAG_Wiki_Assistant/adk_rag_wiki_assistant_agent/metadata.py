@@ -0,0 +1,129 @@
+"""
+Per-chunk metadata columns for filtered retrieval.
+
+Restricting a query to some documents, a section or a date range should not
+mean walking a list of dicts per query. ChunkColumns stores the provenance
+records of an index version as flat NumPy columns:
+
+- string fields (source, section) are dictionary-encoded: a list of distinct
+  values plus one int32 code per chunk (-1 = missing), so a predicate is
+  evaluated once per distinct value and expanded to the rows with a single
+  lookup-table gather,
+- numeric fields (offset, modified) are float64 arrays with NaN for missing.
+
+mask() turns a filter into a boolean row mask that the search backends apply
+before scoring; masks are cached per filter, since the same few filters tend
+to repeat.
+"""
+
+import fnmatch
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+STRING_FIELDS = ("source", "section")
+NUMERIC_FIELDS = ("offset", "modified")
+
+
+class _StringColumn:
+    __slots__ = ("values", "codes", "_folded")
+
+    def __init__(self, raw: Sequence[Optional[str]]):
+        lookup: Dict[str, int] = {}
+        codes = np.full(len(raw), -1, dtype=np.int32)
+        for row, value in enumerate(raw):
+            if value is not None:
+                codes[row] = lookup.setdefault(str(value), len(lookup))
+        self.values: List[str] = list(lookup)
+        self.codes = codes
+        self._folded = [v.casefold() for v in self.values]
+
+    def select(self, patterns: Sequence[str]) -> np.ndarray:
+        """Rows whose value matches any pattern (case-insensitive; * and ? wildcards)."""
+        allowed = np.zeros(len(self.values) + 1, dtype=bool)  # last slot: missing (-1)
+        for pattern in patterns:
+            folded = str(pattern).casefold()
+            if any(ch in folded for ch in "*?["):
+                for code, value in enumerate(self._folded):
+                    if fnmatch.fnmatchcase(value, folded):
+                        allowed[code] = True
+            else:
+                for code, value in enumerate(self._folded):
+                    if value == folded:
+                        allowed[code] = True
+        return allowed[self.codes]
+
+
+class ChunkColumns:
+    """Columnar view of one index version's chunk_meta records."""
+
+    def __init__(self, chunk_meta: Sequence[Mapping[str, Any]], max_cached_masks: int = 256):
+        self.rows = len(chunk_meta)
+        self.strings = {f: _StringColumn([m.get(f) for m in chunk_meta]) for f in STRING_FIELDS}
+        self.numbers = {
+            f: np.array([np.nan if m.get(f) is None else float(m[f]) for m in chunk_meta], dtype=np.float64)
+            for f in NUMERIC_FIELDS
+        }
+        self._masks: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._max_cached_masks = max_cached_masks
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.codes.nbytes for c in self.strings.values()) + sum(a.nbytes for a in self.numbers.values())
+
+    def distinct(self, field: str) -> List[str]:
+        """Distinct values of a string field, e.g. the indexed sources."""
+        return list(self.strings[field].values)
+
+    def mask(self, filters: Optional[Mapping[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Boolean row mask for filters, or None when filters is empty (no restriction).
+
+        Keys are field names. A string field takes a value or a list of values,
+        matched case-insensitively, with * / ? wildcards. A numeric field takes
+        a number or an inclusive (low, high) range where either end may be None.
+        All keys must match. The returned array is shared; do not modify it.
+        """
+        if not filters:
+            return None
+        key = json.dumps(filters, sort_keys=True, default=str)
+        with self._lock:
+            cached = self._masks.get(key)
+            if cached is not None:
+                self._masks.move_to_end(key)
+                return cached
+
+        mask = np.ones(self.rows, dtype=bool)
+        for field, condition in filters.items():
+            if field in self.strings:
+                patterns = [condition] if isinstance(condition, str) else list(condition)
+                mask &= self.strings[field].select(patterns)
+            elif field in self.numbers:
+                mask &= self._numeric(self.numbers[field], condition)
+            else:
+                raise ValueError(f"Unknown metadata field {field!r}; known: {', '.join(STRING_FIELDS + NUMERIC_FIELDS)}.")
+        mask.setflags(write=False)
+
+        with self._lock:
+            self._masks[key] = mask
+            if len(self._masks) > self._max_cached_masks:
+                self._masks.popitem(last=False)
+        return mask
+
+    @staticmethod
+    def _numeric(column: np.ndarray, condition) -> np.ndarray:
+        if isinstance(condition, (list, tuple)):
+            if len(condition) != 2:
+                raise ValueError(f"A numeric range is (low, high); got {condition!r}.")
+            low, high = condition
+            selected = ~np.isnan(column)
+            if low is not None:
+                selected &= column >= float(low)
+            if high is not None:
+                selected &= column <= float(high)
+            return selected
+        return column == float(condition)
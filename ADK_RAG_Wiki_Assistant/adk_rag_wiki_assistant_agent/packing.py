@@ -0,0 +1,155 @@
+"""
+Token-budgeted packing of retrieved chunks into the tool's context string.
+
+Joining a fixed top_k wastes prompt tokens: chunks differ in size, hybrid
+retrieval often returns overlapping or near-identical passages, and the
+k-th chunk may add little the first ones did not already say. pack_context()
+chooses from a deeper candidate list instead:
+
+- near-duplicates are suppressed with MinHash: each chunk's word 5-shingles
+  are hashed under num_perm random permutations, and the fraction of equal
+  signature slots estimates the Jaccard similarity of two chunks,
+- the remaining candidates are scored with maximal marginal relevance,
+  lambda * relevance - (1 - lambda) * (max cosine similarity to a chunk
+  already selected), so a passage that repeats a selected one loses value,
+- the budget is filled greedily by marginal value per token, after the most
+  relevant chunk that fits has been taken first (pure density greedy would
+  prefer any short chunk to a long, clearly better one).
+
+When no candidate fits at all, the most relevant one is still chosen and
+reported as truncated, so the caller cuts it to the budget instead of
+returning an empty context.
+"""
+
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .lexical_index import tokenize
+
+# Universal hashing (a * x + b) mod p with p = 2^61 - 1; a and b span the full
+# field, so the product wraps around 2^64 first, which still mixes well.
+_MERSENNE_61 = np.uint64((1 << 61) - 1)
+_EMPTY_HASH = np.uint32(0xFFFFFFFF)
+
+
+# ---------------------------------------------------------
+# MinHash near-duplicate detection
+# ---------------------------------------------------------
+
+def shingle_hashes(text: str, size: int = 5) -> np.ndarray:
+    """CRC32 hashes of the distinct word size-shingles of text (a single shingle for short texts)."""
+    words = tokenize(text)
+    if len(words) <= size:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash_signatures(
+    texts: Sequence[str], num_perm: int = 64, shingle_size: int = 5, seed: int = 0
+) -> np.ndarray:
+    """(len(texts), num_perm) uint32 MinHash signatures; equal slots estimate Jaccard similarity."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_61, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_61, size=num_perm, dtype=np.uint64)
+    signatures = np.full((len(texts), num_perm), _EMPTY_HASH, dtype=np.uint32)
+    for row, text in enumerate(texts):
+        hashes = shingle_hashes(text, shingle_size)
+        if hashes.size:
+            permuted = (hashes[:, None] * a + b) % _MERSENNE_61
+            signatures[row] = (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+    return signatures
+
+
+def estimate_jaccard(signatures: np.ndarray, row: int, others: Sequence[int]) -> np.ndarray:
+    """Estimated Jaccard similarity of signatures[row] with each of signatures[others]."""
+    if len(others) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return (signatures[list(others)] == signatures[row]).mean(axis=1).astype(np.float32)
+
+
+# ---------------------------------------------------------
+# Packing
+# ---------------------------------------------------------
+
+def _normalize(scores: np.ndarray) -> np.ndarray:
+    """
+    Scale to at most 1 relative to the best score. Min-max scaling would give
+    the last candidate zero relevance whatever its score, so it is used only
+    when scores are not all positive (e.g. negative cosines).
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    if scores.size == 0:
+        return scores
+    low, high = float(scores.min()), float(scores.max())
+    if low > 0:
+        return scores / high
+    if high - low <= 1e-12:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def pack_context(
+    relevance: np.ndarray,
+    token_costs: Sequence[int],
+    budget: int,
+    similarity: Optional[np.ndarray] = None,
+    signatures: Optional[np.ndarray] = None,
+    mmr_lambda: float = 0.7,
+    dedup_threshold: float = 0.6,
+) -> Tuple[List[int], Dict[str, int]]:
+    """
+    Choose candidates to fit in budget tokens.
+
+    relevance holds the retrieval scores of n candidates (any scale, higher is
+    better), token_costs their size in the context string. similarity is an
+    optional (n, n) cosine matrix for the MMR penalty and signatures optional
+    MinHash rows for duplicate suppression. Returns (positions of the chosen
+    candidates in selection order, stats); stats["truncated"] is 1 when the
+    single chosen candidate exceeds the budget and must be cut to it.
+    """
+    n = len(relevance)
+    costs = np.asarray(token_costs, dtype=np.float32)
+    rel = _normalize(relevance)
+    remaining = np.ones(n, dtype=bool)
+    max_sim = np.zeros(n, dtype=np.float32)
+    selected: List[int] = []
+    used = 0
+    duplicates = 0
+
+    while True:
+        fits = remaining & (costs <= budget - used)
+        if not fits.any():
+            break
+        gain = mmr_lambda * rel - (1.0 - mmr_lambda) * max_sim
+        if selected:
+            value = np.where(fits & (gain > 0), gain / np.maximum(costs, 1.0), -np.inf)
+        else:
+            value = np.where(fits, rel, -np.inf)  # anchor: the most relevant chunk that fits
+        pick = int(np.argmax(value))
+        if not np.isfinite(value[pick]):
+            break
+        remaining[pick] = False
+
+        if signatures is not None and selected and dedup_threshold < 1.0:
+            if float(estimate_jaccard(signatures, pick, selected).max()) >= dedup_threshold:
+                duplicates += 1
+                continue
+
+        selected.append(pick)
+        used += int(costs[pick])
+        if similarity is not None:
+            np.maximum(max_sim, similarity[pick], out=max_sim)
+
+    truncated = 0
+    if not selected and n and budget > 0:
+        # Every candidate is larger than the budget: the best one, cut short, beats no context.
+        selected.append(int(np.argmax(rel)))
+        used = budget
+        truncated = 1
+
+    stats = {"candidates": n, "selected": len(selected), "tokens": used, "duplicates": duplicates, "truncated": truncated}
+    return selected, stats
@@ -0,0 +1,192 @@
+"""
+Vector quantizers for compressed embedding storage.
+
+float32 text-embedding-3-small vectors cost 6 KiB per chunk. Two codecs
+trade a little accuracy for much smaller in-memory codes:
+
+- ScalarQuantizer: one int8 per dimension with a per-dimension scale
+  (4x smaller). Scores are code . (query * scale).
+- ProductQuantizer: the vector is cut into m sub-vectors, each replaced by
+  the id of its nearest centroid in a 256-entry sub-codebook (one uint8 per
+  sub-vector, e.g. 96 bytes for 1536 dims with m=96: 64x smaller). Scores use
+  asymmetric distance computation: the query stays float32 and a per-query
+  (m, 256) lookup table of sub-vector dot products is summed over the codes.
+
+Both score inner products, which equal cosine similarity for the unit rows
+the indexes store. Scoring runs over fixed-size row blocks, so the float32
+temporaries never grow with the corpus.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+# Rows decoded/scored per step; bounds temporary float32 buffers.
+SCORE_BLOCK_ROWS = 4096
+
+
+# ---------------------------------------------------------
+# Scalar (int8) quantization
+# ---------------------------------------------------------
+
+class ScalarQuantizer:
+    """Symmetric per-dimension int8 quantization: x ~= codes * scale."""
+
+    name = "int8"
+
+    def __init__(self, scale: np.ndarray):
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray) -> "ScalarQuantizer":
+        peak = np.abs(vectors).max(axis=0) if len(vectors) else np.ones(vectors.shape[1], dtype=np.float32)
+        return cls(np.where(peak > 0, peak / 127.0, 1.0))
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, vectors.shape[0], SCORE_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            codes[start:start + block.shape[0]] = np.clip(np.rint(block / self.scale), -127, 127)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"scale": self.scale}
+
+    @classmethod
+    def from_arrays(cls, scale: np.ndarray) -> "ScalarQuantizer":
+        return cls(scale)
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Approximate inner products of every code row with each (m, d) query: (m, n)."""
+        scaled = np.atleast_2d(queries) * self.scale  # (m, d)
+        scores = np.empty((scaled.shape[0], codes.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + block.shape[0]] = scaled @ block.T
+        return scores
+
+    @property
+    def nbytes(self) -> int:
+        return self.scale.nbytes
+
+
+# ---------------------------------------------------------
+# Product quantization
+# ---------------------------------------------------------
+
+def _kmeans(vectors: np.ndarray, k: int, n_iter: int, rng: np.random.Generator) -> np.ndarray:
+    """Euclidean k-means; returns (k, d) centroids."""
+    n = vectors.shape[0]
+    centroids = vectors[rng.choice(n, size=k, replace=False)].copy()
+    for _ in range(n_iter):
+        # argmin ||x - c||^2 == argmin (||c||^2 - 2 x.c)
+        distances = (centroids ** 2).sum(axis=1) - 2.0 * (vectors @ centroids.T)
+        labels = np.argmin(distances, axis=1)
+        counts = np.bincount(labels, minlength=k)
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        sums = np.zeros_like(centroids)
+        nonempty = counts > 0
+        sums[nonempty] = np.add.reduceat(vectors[order], starts[nonempty], axis=0)
+        new_centroids = centroids.copy()
+        new_centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        empty = ~nonempty
+        if empty.any():
+            new_centroids[empty] = vectors[rng.choice(n, size=int(empty.sum()), replace=False)]
+        if np.allclose(new_centroids, centroids, atol=1e-6):
+            return new_centroids
+        centroids = new_centroids
+    return centroids
+
+
+class ProductQuantizer:
+    """
+    m sub-quantizers of up to 256 centroids each; a vector is stored as m uint8 ids.
+
+    Dimensions are zero-padded to a multiple of m, which does not change inner products.
+    """
+
+    name = "pq"
+
+    def __init__(self, codebooks: np.ndarray, dim: int):
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)  # (m, ks, ds)
+        self.dim = dim
+        self.m, self.ks, self.ds = self.codebooks.shape
+
+    @classmethod
+    def train(
+        cls,
+        vectors: np.ndarray,
+        m: int,
+        n_iter: int = 15,
+        train_size: Optional[int] = 20_000,
+        seed: int = 0,
+    ) -> "ProductQuantizer":
+        n, dim = vectors.shape
+        m = max(1, min(m, dim))
+        rng = np.random.default_rng(seed)
+        if train_size is not None and n > train_size:
+            vectors = vectors[np.sort(rng.choice(n, size=train_size, replace=False))]
+        sample = cls._pad(np.asarray(vectors, dtype=np.float32), m)
+        ds = sample.shape[1] // m
+        ks = max(1, min(256, sample.shape[0]))
+
+        codebooks = np.empty((m, ks, ds), dtype=np.float32)
+        for j in range(m):
+            sub = np.ascontiguousarray(sample[:, j * ds:(j + 1) * ds])
+            codebooks[j] = _kmeans(sub, ks, n_iter, rng)
+        return cls(codebooks, dim)
+
+    @staticmethod
+    def _pad(vectors: np.ndarray, m: int) -> np.ndarray:
+        extra = (-vectors.shape[1]) % m
+        if extra:
+            vectors = np.pad(vectors, ((0, 0), (0, extra)))
+        return vectors
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((vectors.shape[0], self.m), dtype=np.uint8)
+        norms = (self.codebooks ** 2).sum(axis=2)  # (m, ks)
+        for start in range(0, vectors.shape[0], SCORE_BLOCK_ROWS):
+            block = self._pad(np.asarray(vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32), self.m)
+            for j in range(self.m):
+                sub = block[:, j * self.ds:(j + 1) * self.ds]
+                codes[start:start + block.shape[0], j] = np.argmin(norms[j] - 2.0 * (sub @ self.codebooks[j].T), axis=1)
+        return codes
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks, "dim": np.asarray(self.dim)}
+
+    @classmethod
+    def from_arrays(cls, codebooks: np.ndarray, dim: np.ndarray) -> "ProductQuantizer":
+        return cls(codebooks, int(dim))
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.codebooks[j][codes[:, j]] for j in range(self.m)]
+        return np.hstack(parts)[:, :self.dim]
+
+    def lookup_table(self, query: np.ndarray) -> np.ndarray:
+        """(m, ks) dot products of each sub-query with its sub-codebook."""
+        q = self._pad(np.asarray(query, dtype=np.float32)[None, :], self.m)[0].reshape(self.m, self.ds)
+        return np.einsum("mkd,md->mk", self.codebooks, q)
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Asymmetric inner products of every code row with each (m, d) query: (m, n)."""
+        queries = np.atleast_2d(queries)
+        scores = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+        # Flat index into the raveled (m, ks) table: code + j * ks.
+        shift = (np.arange(self.m) * self.ks).astype(np.int32)
+        tables = [self.lookup_table(query).ravel() for query in queries]
+        for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+            flat = codes[start:start + SCORE_BLOCK_ROWS].astype(np.int32) + shift
+            for i, table in enumerate(tables):
+                scores[i, start:start + flat.shape[0]] = table[flat].sum(axis=1)
+        return scores
+
+    @property
+    def nbytes(self) -> int:
+        return self.codebooks.nbytes
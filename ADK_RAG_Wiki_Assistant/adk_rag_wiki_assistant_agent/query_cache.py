@@ -0,0 +1,186 @@
+"""
+Query-embedding cache for the RAG agent.
+
+Users ask the same few questions over and over ("what is AI", "What is AI?"),
+and each one used to cost an embeddings round trip. QueryEmbeddingCache keeps
+query vectors in a bounded in-memory LRU with a TTL, optionally backed by a
+SQLite file so the cache survives restarts and is shared by workers on a host.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_TRAILING_PUNCTUATION = "?!.,;: "
+
+
+def normalize_query(text: str) -> str:
+    """Cache key normalization: NFKC, case-folded, collapsed whitespace, no trailing punctuation."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(text.split()).strip(_TRAILING_PUNCTUATION)
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU + TTL cache of query embeddings, keyed by (model, normalized query).
+
+    - max_entries: in-memory capacity; least recently used entries are evicted.
+    - ttl_seconds: entries older than this are treated as misses (memory and disk).
+    - sqlite_path: optional on-disk second tier, consulted on memory misses.
+
+    Thread-safe; batch retrieval runs in worker threads.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        sqlite_path: Optional[str] = None,
+    ):
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "expired": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "DELETE FROM query_embeddings WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self._db is not None
+
+    def _key(self, query: str) -> str:
+        payload = f"{self.model}\0{normalize_query(query)}"
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    # -----------------------------------------------------
+    # Lookup
+    # -----------------------------------------------------
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for query, or None on a miss."""
+        key = self._key(query)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, vector = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return vector
+                del self._entries[key]
+                self._counters["expired"] += 1
+
+            vector = self._get_from_disk(key, now)
+            if vector is not None:
+                self._counters["hits"] += 1
+                self._counters["disk_hits"] += 1
+                return vector
+
+            self._counters["misses"] += 1
+            return None
+
+    def _get_from_disk(self, key: str, now: float) -> Optional[np.ndarray]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT dim, vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        dim, blob, created_at = row
+        if now - created_at > self.ttl_seconds:
+            self._counters["expired"] += 1
+            return None
+        vector = np.frombuffer(blob, dtype=np.float32, count=dim)
+        self._remember(key, created_at, vector)
+        return vector
+
+    # -----------------------------------------------------
+    # Insert
+    # -----------------------------------------------------
+
+    def put(self, query: str, vector: np.ndarray) -> None:
+        """Cache the embedding for query in memory and, if configured, on disk."""
+        key = self._key(query)
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, now, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, dim, vector, created_at) VALUES (?, ?, ?, ?)",
+                    (key, int(vector.shape[0]), vector.tobytes(), now),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, created_at: float, vector: np.ndarray) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    # -----------------------------------------------------
+    # Introspection
+    # -----------------------------------------------------
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters, current size and hit rate."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM query_embeddings")
+                self._db.commit()
+
+
+def split_cached(cache: QueryEmbeddingCache, queries: List[str]) -> Tuple[List[Optional[np.ndarray]], List[str]]:
+    """
+    Look up every query; return per-query cached vectors (None for misses) and
+    the distinct normalized misses that still need embedding.
+    """
+    vectors: List[Optional[np.ndarray]] = []
+    missing: Dict[str, str] = {}
+    for query in queries:
+        vector = cache.get(query) if cache.enabled else None
+        vectors.append(vector)
+        if vector is None:
+            missing.setdefault(normalize_query(query), query)
+    return vectors, list(missing.values())
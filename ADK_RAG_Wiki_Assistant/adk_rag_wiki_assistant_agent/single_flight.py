@@ -0,0 +1,71 @@
+"""
+Single-flight execution of expensive, idempotent work.
+
+When several callers need the same result at once -- typically the first
+concurrent tool calls of a cold worker, all finding the index missing -- only
+one of them (the leader) runs the work; the others wait on the same future
+and receive its result or its exception. Threads block on the future;
+coroutines await it without blocking their event loop.
+
+Nothing is cached once the work finishes: callers keep their own "already
+built?" check and only come here on a miss. A failed run is not remembered,
+so the next caller retries.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+R = TypeVar("R")
+
+
+class SingleFlight(Generic[R]):
+    """Deduplicate concurrent calls per key across threads and event loops."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """(future for key, whether the caller is the leader and must run the work)."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _run(self, key: Hashable, future: Future, fn: Callable[[], R]) -> None:
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._in_flight
+
+    def do(self, key: Hashable, fn: Callable[[], R]) -> R:
+        """Run fn() unless a call for key is already running; either way return its result."""
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, fn)
+        return future.result()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], R]) -> R:
+        """
+        Async form of do(): a leading call runs the blocking fn in the default
+        executor. The work is not cancelled with the awaiting task, so other
+        waiters still get the result.
+        """
+        future, leader = self._join(key)
+        if leader:
+            asyncio.get_running_loop().run_in_executor(None, self._run, key, future, fn)
+        return await asyncio.shield(asyncio.wrap_future(future))
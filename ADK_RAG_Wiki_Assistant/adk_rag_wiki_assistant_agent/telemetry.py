@@ -0,0 +1,366 @@
+"""
+Low-overhead instrumentation for the RAG pipeline.
+
+- span(name, **attrs) times a block (fetch, chunk, embed, score, pack, ...).
+  Every duration goes into an in-memory histogram, rag_span_seconds{span=...}:
+  a perf_counter pair and a bucket increment, no I/O.
+- A sampled fraction of root spans (configure(sample_rate=...), 0 by
+  default) is also logged as one structured JSON record holding the span
+  tree with durations and attributes.
+- count() and set_gauge() maintain counters (cache hits, fast-path answers,
+  retries, ...) and gauges (index size, generation).
+- render_prometheus() returns everything in the Prometheus text exposition
+  format; serve_metrics(port) exposes it at /metrics from a daemon thread.
+- configure(exporter="otel") additionally reports spans and metrics through
+  the OpenTelemetry API (pip install opentelemetry-api); the application
+  configures the SDK and exporter as usual.
+
+configure(enabled=False) turns span() into a shared no-op context manager
+and the metric calls into immediate returns.
+"""
+
+import bisect
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import metrics as otel_metrics
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional: OpenTelemetry export
+    otel_metrics = otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond scoring up to cold index builds.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> _Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+# ---------------------------------------------------------
+# Metric registry
+# ---------------------------------------------------------
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * (n_buckets + 1)  # last slot: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """Counters, gauges and fixed-bucket histograms, keyed by (name, labels)."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, _Labels], float] = {}
+        self._gauges: Dict[Tuple[str, _Labels], float] = {}
+        self._histograms: Dict[Tuple[str, _Labels], _Histogram] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float, labels: _Labels) -> None:
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, labels: _Labels) -> float:
+        """Set a gauge; returns its previous value (0 if unset)."""
+        with self._lock:
+            previous = self._gauges.get((name, labels), 0.0)
+            self._gauges[(name, labels)] = value
+            return previous
+
+    def observe(self, name: str, value: float, labels: _Labels) -> None:
+        slot = bisect.bisect_left(self.buckets, value)
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            histogram.counts[slot] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Plain-dict copy: {"counters": {...}, "gauges": {...}, "histograms": {...}} keyed by 'name{labels}'."""
+        with self._lock:
+            return {
+                "counters": {_series(n, l): v for (n, l), v in self._counters.items()},
+                "gauges": {_series(n, l): v for (n, l), v in self._gauges.items()},
+                "histograms": {
+                    _series(n, l): {"count": h.count, "sum": h.sum, "buckets": dict(zip(self.buckets, h.counts))}
+                    for (n, l), h in self._histograms.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((k, (list(h.counts), h.sum, h.count)) for k, h in self._histograms.items())
+
+        lines: List[str] = []
+        typed = set()
+
+        def header(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{_series(name, labels)} {_number(value)}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{_series(name, labels)} {_number(value)}")
+        for (name, labels), (counts, total, count) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(list(self.buckets) + [float("inf")], counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{_series(name + '_bucket', labels + (('le', le),))} {cumulative}")
+            lines.append(f"{_series(name + '_sum', labels)} {_number(total)}")
+            lines.append(f"{_series(name + '_count', labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _series(name: str, labels: _Labels) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("rag_span_seconds", "Duration of instrumented RAG pipeline stages.")
+
+
+# ---------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------
+
+_CONFIG = {"enabled": True, "sample_rate": 0.0, "otel": False}
+_OTEL: Dict[str, object] = {}
+
+
+def configure(enabled: bool = True, sample_rate: float = 0.0, exporter: Optional[str] = None) -> None:
+    """
+    enabled: collect spans and metrics at all. sample_rate: fraction of root
+    spans logged as a structured trace. exporter: None, "prometheus" (the
+    registry alone) or "otel" (also report through OpenTelemetry).
+    """
+    otel = exporter == "otel"
+    if otel and otel_trace is None:
+        logger.warning("RAG telemetry exporter 'otel' needs opentelemetry-api; using the Prometheus registry only.")
+        otel = False
+    if otel:
+        _OTEL["tracer"] = otel_trace.get_tracer("adk_rag_wiki_assistant")
+        _OTEL["meter"] = otel_metrics.get_meter("adk_rag_wiki_assistant")
+        _OTEL["instruments"] = {}
+    _CONFIG.update(enabled=enabled, sample_rate=max(0.0, min(1.0, sample_rate)), otel=otel)
+
+
+def enabled() -> bool:
+    return _CONFIG["enabled"]
+
+
+def _otel_instrument(kind: str, name: str):
+    instruments = _OTEL["instruments"]
+    instrument = instruments.get((kind, name))
+    if instrument is None:
+        meter = _OTEL["meter"]
+        if kind == "histogram":
+            instrument = meter.create_histogram(name, unit="s")
+        elif kind == "counter":
+            instrument = meter.create_counter(name)
+        else:
+            instrument = meter.create_up_down_counter(name)
+        instruments[(kind, name)] = instrument
+    return instrument
+
+
+# ---------------------------------------------------------
+# Metrics API
+# ---------------------------------------------------------
+
+def count(name: str, value: float = 1, **labels) -> None:
+    """Add value to the counter name{labels}."""
+    if not _CONFIG["enabled"]:
+        return
+    REGISTRY.inc(name, value, _labels(labels))
+    if _CONFIG["otel"]:
+        _otel_instrument("counter", name).add(value, {k: str(v) for k, v in labels.items()})
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Set the gauge name{labels}. (Exported to OpenTelemetry as an up-down counter delta.)"""
+    if not _CONFIG["enabled"]:
+        return
+    previous = REGISTRY.set(name, value, _labels(labels))
+    if _CONFIG["otel"]:
+        _otel_instrument("gauge", name).add(value - previous, {k: str(v) for k, v in labels.items()})
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record value in the histogram name{labels}."""
+    if not _CONFIG["enabled"]:
+        return
+    REGISTRY.observe(name, value, _labels(labels))
+    if _CONFIG["otel"]:
+        _otel_instrument("histogram", name).record(value, {k: str(v) for k, v in labels.items()})
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+
+# ---------------------------------------------------------
+# Spans
+# ---------------------------------------------------------
+
+# The sampled trace the current span belongs to (None when not sampled).
+_TRACE: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed block; use span() rather than constructing one."""
+
+    __slots__ = ("name", "attrs", "start", "duration", "children", "_token", "_root", "_otel")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+        self.children: List["Span"] = []
+        self.duration = 0.0
+        self._token = None
+        self._root = False
+        self._otel = None
+
+    def set(self, **attrs) -> None:
+        """Attach attributes (e.g. result sizes) shown in sampled traces."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _TRACE.get()
+        if parent is not None:
+            parent.children.append(self)
+            self._token = _TRACE.set(self)
+        elif _CONFIG["sample_rate"] and random.random() < _CONFIG["sample_rate"]:
+            self._root = True
+            self._token = _TRACE.set(self)
+        if _CONFIG["otel"]:
+            self._otel = _OTEL["tracer"].start_as_current_span(self.name)
+            self._otel.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        REGISTRY.observe("rag_span_seconds", self.duration, (("span", self.name),))
+        if self._otel is not None:
+            otel_span = otel_trace.get_current_span()
+            for key, value in self.attrs.items():
+                otel_span.set_attribute(key, value if isinstance(value, (bool, int, float, str)) else str(value))
+            self._otel.__exit__(exc_type, exc, tb)
+            _otel_instrument("histogram", "rag_span_seconds").record(self.duration, {"span": self.name})
+        if self._token is not None:
+            _TRACE.reset(self._token)
+        if self._root:
+            if exc_type is not None:
+                self.attrs["error"] = exc_type.__name__
+            logger.info("rag_trace %s", json.dumps(self.to_dict(), default=str))
+        return False
+
+    def to_dict(self) -> Dict:
+        record = {"span": self.name, "ms": round(self.duration * 1000.0, 3), **self.attrs}
+        if self.children:
+            record["children"] = [child.to_dict() for child in self.children]
+        return record
+
+
+def span(name: str, **attrs):
+    """Context manager timing a pipeline stage; a no-op when telemetry is disabled."""
+    if not _CONFIG["enabled"]:
+        return _NOOP_SPAN
+    return Span(name, attrs)
+
+
+# ---------------------------------------------------------
+# /metrics endpoint
+# ---------------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A002 - BaseHTTPRequestHandler signature
+        pass
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve render_prometheus() at http://host:port/metrics from a daemon thread.
+
+    Loopback only by default: the metrics reveal corpus sizes and traffic.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="rag-metrics", daemon=True).start()
+    logger.info("Serving RAG metrics on http://%s:%d/metrics", host, server.server_address[1])
+    return server
@@ -0,0 +1,660 @@
+"""
+Vector index backends for embedding_rag_search().
+
+Every backend implements the same small interface (VectorIndex.search), so the
+agent can switch between them with RAG_INDEX_BACKEND:
+
+- "exact": brute-force cosine similarity over every row. This is the reference
+  implementation; other backends are measured against it.
+- "ivf":   inverted-file index with a spherical k-means coarse quantizer.
+  Only the n_probe lists whose centroids are closest to the query are scored,
+  trading a little recall for much lower per-query cost on large corpora.
+- "int8" / "pq": scalar- or product-quantized codes held in memory (4x /
+  up to 64x smaller than float32); the best candidates found on the codes are
+  rescored exactly against the float32 rows.
+
+All backends work on unit-normalized float32 rows, so cosine similarity is a
+plain dot product. Every search also takes an optional boolean row mask
+(metadata filters, see metadata.py): excluded rows are dropped before
+scoring, not filtered out of the results. ShardedIndex splits the rows
+across several indexes searched in parallel.
+"""
+
+import heapq
+import math
+import os
+import threading
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+from .quantization import ProductQuantizer, ScalarQuantizer
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Compute cosine similarity between each row of a and a single vector b.
+
+    This re-normalizes every row of a on each call; the index backends store
+    unit vectors instead and only keep this for reference and benchmarks.
+    """
+    # a: (n, d), b: (d,)
+    a_norm = a / (np.linalg.norm(a, axis=1, keepdims=True) + 1e-10)
+    b_norm = b / (np.linalg.norm(b) + 1e-10)
+    return np.dot(a_norm, b_norm)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of matrix with unit-length rows."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / (norms + 1e-10)
+
+
+def normalize_vector(vector: np.ndarray) -> np.ndarray:
+    """Return a float32 unit-length copy of a single vector."""
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) + 1e-10)
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indexes of the top_k largest scores, best first, in O(n + k log k)."""
+    n = scores.shape[0]
+    top_k = min(top_k, n)
+    if top_k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if top_k == n:
+        part = np.arange(n)
+    else:
+        part = np.argpartition(scores, n - top_k)[n - top_k:]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def _empty() -> Tuple[np.ndarray, np.ndarray]:
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+
+# Below this fraction of selected rows, scoring only the selected rows (a
+# gather) is cheaper than scoring every row and discarding the rest.
+GATHER_SELECTIVITY = 0.5
+
+
+def _masked_rows(mask: Optional[np.ndarray], n: int) -> Optional[np.ndarray]:
+    """Row ids selected by mask, or None for no restriction."""
+    if mask is None:
+        return None
+    if mask.shape[0] != n:
+        raise ValueError(f"Mask covers {mask.shape[0]} rows; the index has {n}.")
+    return np.flatnonzero(mask)
+
+
+def _top_k_rows(scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise _top_k over an (m, n) score matrix: ((m, k) column indexes, (m, k) scores)."""
+    n = scores.shape[1]
+    top_k = min(top_k, n)
+    if top_k == n:
+        part = np.broadcast_to(np.arange(n), scores.shape)
+    else:
+        part = np.argpartition(scores, n - top_k, axis=1)[:, n - top_k:]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+# ---------------------------------------------------------
+# Interface
+# ---------------------------------------------------------
+
+class VectorIndex:
+    """Nearest-neighbour search over the rows of an (n, d) embedding matrix."""
+
+    name = "base"
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of index data held in process memory (memory-mapped rows excluded)."""
+        raise NotImplementedError
+
+    def search(
+        self, query: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (row indexes, cosine scores) of the top_k most similar rows, best first.
+
+        With a boolean mask of len(self) rows, only rows where it is True are candidates.
+        """
+        raise NotImplementedError
+
+    def search_batch(
+        self, queries: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Search an (m, d) block of queries; one (indexes, scores) pair per query."""
+        return [self.search(q, top_k, mask) for q in queries]
+
+
+# ---------------------------------------------------------
+# Exact (reference) backend
+# ---------------------------------------------------------
+
+class ExactIndex(VectorIndex):
+    """
+    Brute-force cosine similarity over every row; the recall reference for other backends.
+
+    Rows are normalized once at construction (or trusted to be unit length when
+    normalized=True, e.g. a memory-mapped matrix from the index store), so a query
+    is a single matrix-vector product into a per-thread reusable score buffer
+    followed by an O(n) argpartition. A batch is scored into the same buffer,
+    max_batch_rows queries at a time, so the serving path (search_batch) does
+    not allocate an (m, n) score matrix per call either.
+    """
+
+    name = "exact"
+
+    def __init__(self, embeddings: np.ndarray, normalized: bool = False, max_batch_rows: int = 32):
+        if normalized and embeddings.dtype == np.float32 and embeddings.flags.c_contiguous:
+            self.embeddings = embeddings
+        else:
+            self.embeddings = normalize_rows(embeddings)
+        if max_batch_rows < 1:
+            raise ValueError("max_batch_rows must be at least 1.")
+        self.max_batch_rows = max_batch_rows  # bounds the buffer: max_batch_rows * n float32 per thread
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if isinstance(self.embeddings, np.memmap) else self.embeddings.nbytes
+
+    def _score_buffer(self, rows: int = 1) -> np.ndarray:
+        """This thread's (>= rows, n) score buffer, grown on demand (rows <= max_batch_rows)."""
+        buf = getattr(self._local, "scores", None)
+        if buf is None or buf.shape[0] < rows:
+            buf = np.empty((rows, self.embeddings.shape[0]), dtype=np.float32)
+            self._local.scores = buf
+        return buf
+
+    def _subset_buffer(self) -> np.ndarray:
+        """This thread's (n,) buffer for the masked scores of one query."""
+        buf = getattr(self._local, "subset", None)
+        if buf is None:
+            buf = np.empty(self.embeddings.shape[0], dtype=np.float32)
+            self._local.subset = buf
+        return buf
+
+    def search(
+        self, query: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if mask is not None:
+            return self.search_batch(query[None, :], top_k, mask)[0]
+        if len(self) == 0:
+            return _empty()
+        scores = self._score_buffer()[0]
+        np.dot(self.embeddings, normalize_vector(query), out=scores)
+        ranked = _top_k(scores, top_k)
+        return ranked, scores[ranked]
+
+    def search_batch(
+        self, queries: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Score up to max_batch_rows queries at a time with one (m, d) x (d, n)
+        product into the thread's score buffer, then select top_k per row.
+        """
+        queries = np.atleast_2d(queries)
+        rows = _masked_rows(mask, len(self))
+        if top_k <= 0 or len(self) == 0 or (rows is not None and rows.size == 0):
+            return [_empty() for _ in range(queries.shape[0])]
+
+        queries = normalize_rows(queries)
+        # Selective filter: score just the selected rows (a gather); otherwise score
+        # every row and take the selected ones from the buffer.
+        gather = rows is not None and rows.size < GATHER_SELECTIVITY * len(self)
+        candidates = np.asarray(self.embeddings[rows]) if gather else self.embeddings
+        width = candidates.shape[0]
+        results = []
+        for start in range(0, queries.shape[0], self.max_batch_rows):
+            block = queries[start:start + self.max_batch_rows]
+            buf = self._score_buffer(block.shape[0])
+            # A contiguous (m, width) view of the buffer, as matmul's out.
+            scores = buf.reshape(-1)[:block.shape[0] * width].reshape(block.shape[0], width)
+            np.matmul(block, candidates.T, out=scores)
+            for row_scores in scores:
+                if rows is not None and not gather:
+                    row_scores = np.take(row_scores, rows, out=self._subset_buffer()[:rows.size], mode="clip")
+                ranked = _top_k(row_scores, top_k)
+                results.append((rows[ranked] if rows is not None else ranked, row_scores[ranked]))
+        return results
+
+
+# ---------------------------------------------------------
+# IVF backend (spherical k-means coarse quantizer)
+# ---------------------------------------------------------
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block_rows: int = 65536) -> np.ndarray:
+    """Nearest centroid (by dot product) for every row, computed in bounded-memory blocks."""
+    labels = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], block_rows):
+        block = vectors[start:start + block_rows]
+        labels[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 20,
+    seed: int = 0,
+) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity. Returns unit-norm (n_clusters, d) centroids."""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    centroids = vectors[rng.choice(n, size=n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = _assign(vectors, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        sums = np.zeros_like(centroids)
+        nonempty = counts > 0
+        sums[nonempty] = np.add.reduceat(vectors[order], starts[nonempty], axis=0)
+
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters with random points so every list stays useful.
+            sums[empty] = vectors[rng.choice(n, size=int(empty.sum()), replace=False)]
+
+        new_centroids = normalize_rows(sums)
+        if np.allclose(new_centroids, centroids, atol=1e-6):
+            centroids = new_centroids
+            break
+        centroids = new_centroids
+
+    return centroids
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file ANN index.
+
+    Knobs:
+    - n_lists: number of k-means cells (default ~sqrt(n)). More lists means
+      smaller cells and cheaper probes, but needs a larger n_probe for the
+      same recall.
+    - n_probe: number of cells scored per query. Can be changed at any time;
+      n_probe == n_lists is equivalent to exact search.
+    - train_size: rows sampled to train the quantizer (all rows are assigned).
+    """
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        n_iter: int = 20,
+        train_size: Optional[int] = None,
+        seed: int = 0,
+        normalized: bool = False,
+    ):
+        vectors = np.asarray(embeddings, dtype=np.float32) if normalized else normalize_rows(embeddings)
+        n = vectors.shape[0]
+
+        if n_lists is None:
+            n_lists = int(round(math.sqrt(n)))
+        self.n_lists = max(1, min(n_lists, n)) if n else 0
+        self.n_probe = n_probe
+
+        if n == 0:
+            self.centroids = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            self._rows = np.zeros(0, dtype=np.int64)
+            self._offsets = np.zeros(1, dtype=np.int64)
+            self._vectors = vectors
+            return
+
+        rng = np.random.default_rng(seed)
+        if train_size is None:
+            train_size = min(n, 256 * self.n_lists)
+        train_size = max(self.n_lists, min(train_size, n))
+        sample = vectors if train_size == n else vectors[rng.choice(n, size=train_size, replace=False)]
+        self.centroids = spherical_kmeans(sample, self.n_lists, n_iter=n_iter, seed=seed)
+
+        labels = _assign(vectors, self.centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=self.n_lists)
+
+        # Vectors are stored grouped by list, so each probe scores one contiguous slice.
+        self._rows = order
+        self._offsets = np.concatenate(([0], np.cumsum(counts)))
+        self._vectors = vectors[order]
+
+    def __len__(self) -> int:
+        return self._rows.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self._vectors.nbytes + self.centroids.nbytes + self._rows.nbytes + self._offsets.nbytes
+
+    def search(
+        self, query: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_batch(np.asarray(query)[None, :], top_k, mask)[0]
+
+    def search_batch(
+        self, queries: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        queries = np.atleast_2d(queries)
+        rows = _masked_rows(mask, len(self))
+        if len(self) == 0 or top_k <= 0 or (rows is not None and rows.size == 0):
+            return [_empty() for _ in range(queries.shape[0])]
+
+        # The mask in list order (once per batch), so a probe reads one contiguous slice of it.
+        selected = None if mask is None else mask[self._rows]
+        n_probe = max(1, min(self.n_probe, self.n_lists))
+        if rows is not None and rows.size <= n_probe * len(self) / self.n_lists:
+            # A filter keeping fewer rows than the probes would scan is cheaper to
+            # score exactly, and exact search cannot miss rows in unprobed cells.
+            positions = np.flatnonzero(selected)
+            ranked, scores = _top_k_rows(normalize_rows(queries) @ self._vectors[positions].T, top_k)
+            return list(zip(self._rows[positions[ranked]], scores))
+        return [self._probe(normalize_vector(q), top_k, n_probe, selected) for q in queries]
+
+    def _probe(
+        self, q: np.ndarray, top_k: int, n_probe: int, selected: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        probes = _top_k(self.centroids @ q, n_probe)
+
+        scores = []
+        positions = []
+        for cell in probes:
+            start, end = self._offsets[cell], self._offsets[cell + 1]
+            if start == end:
+                continue
+            if selected is None:
+                scores.append(self._vectors[start:end] @ q)
+                positions.append(np.arange(start, end))
+            else:
+                keep = start + np.flatnonzero(selected[start:end])
+                scores.append(self._vectors[keep] @ q)
+                positions.append(keep)
+
+        cand_positions = np.concatenate(positions) if positions else np.zeros(0, dtype=np.int64)
+        if selected is not None and cand_positions.size < top_k:
+            # The probed cells hold too few selected rows: fall back to all of them.
+            return self._score_positions(q, np.flatnonzero(selected), top_k)
+        if cand_positions.size == 0:
+            return _empty()
+
+        cand_scores = np.concatenate(scores)
+        best = _top_k(cand_scores, top_k)
+        return self._rows[cand_positions[best]], cand_scores[best]
+
+    def _score_positions(self, q: np.ndarray, positions: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self._vectors[positions] @ q
+        best = _top_k(scores, top_k)
+        return self._rows[positions[best]], scores[best]
+
+
+# ---------------------------------------------------------
+# Quantized backends (compressed codes + exact rescoring)
+# ---------------------------------------------------------
+
+class QuantizedIndex(VectorIndex):
+    """
+    Scan compressed codes, then rescore the best candidates exactly.
+
+    Only the codes and the quantizer's small tables live in process memory.
+    The float32 rows are read just for the top_k * rescore_factor candidates
+    of each query; with the index store's memory map that touches only
+    those pages. rescore_factor=0 returns the approximate scores as-is.
+    """
+
+    name = "quantized"
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        rescore_factor: int = 10,
+        normalized: bool = False,
+        quantizer=None,
+        codes: Optional[np.ndarray] = None,
+        **train_params,
+    ):
+        self.embeddings = embeddings if normalized else normalize_rows(embeddings)
+        self.rescore_factor = rescore_factor
+        if quantizer is None:
+            quantizer = self._train(self.embeddings, **train_params)
+        self.quantizer = quantizer
+        self.codes = codes if codes is not None else quantizer.encode(self.embeddings)
+
+    def _train(self, vectors: np.ndarray, **params):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        codes = 0 if isinstance(self.codes, np.memmap) else self.codes.nbytes
+        return codes + self.quantizer.nbytes
+
+    def search(
+        self, query: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_batch(normalize_vector(query)[None, :], top_k, mask)[0]
+
+    def search_batch(
+        self, queries: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        queries = normalize_rows(np.atleast_2d(queries))
+        selected = _masked_rows(mask, len(self))
+        if len(self) == 0 or top_k <= 0 or (selected is not None and selected.size == 0):
+            return [_empty() for _ in range(queries.shape[0])]
+
+        if selected is None:
+            approx = self.quantizer.score(self.codes, queries)  # (m, n)
+        elif selected.size < GATHER_SELECTIVITY * len(self):
+            approx = self.quantizer.score(np.asarray(self.codes[selected]), queries)  # (m, |selected|)
+        else:
+            approx = self.quantizer.score(self.codes, queries)[:, selected]
+        results = []
+        for row_scores, q in zip(approx, queries):
+            best = _top_k(row_scores, top_k * max(1, self.rescore_factor))
+            candidates = best if selected is None else selected[best]
+            if self.rescore_factor <= 0:
+                results.append((candidates, row_scores[best]))
+                continue
+            # Sorted row order keeps reads from the memory map sequential.
+            rows = np.sort(candidates)
+            exact = np.asarray(self.embeddings[rows], dtype=np.float32) @ q
+            best = _top_k(exact, top_k)
+            results.append((rows[best], exact[best]))
+        return results
+
+    # Codes are deterministic for a given matrix and parameters, so they can be
+    # saved next to the persisted index instead of retrained on every start.
+    # They are a plain .npy file so that workers can memory-map (and share) them.
+
+    def save(self, path: str) -> None:
+        """Write <path>.codes.npy and <path>.npz (quantizer tables, written last)."""
+        tmp = f"{path}.tmp-{os.getpid()}"
+        np.save(tmp + ".npy", np.ascontiguousarray(self.codes))
+        os.replace(tmp + ".npy", path + ".codes.npy")
+        np.savez(tmp + ".npz", **self.quantizer.to_arrays())
+        os.replace(tmp + ".npz", path + ".npz")
+
+    @classmethod
+    def load(cls, path: str, embeddings: np.ndarray, rescore_factor: int = 10) -> "QuantizedIndex":
+        """Open codes saved by save(); the codes are memory-mapped read-only, not copied."""
+        with np.load(path + ".npz") as data:
+            arrays = {name: data[name] for name in data.files}
+        codes = np.load(path + ".codes.npy", mmap_mode="r")
+        if codes.shape[0] != embeddings.shape[0]:
+            raise ValueError(f"{path} holds {codes.shape[0]} codes for {embeddings.shape[0]} rows.")
+        quantizer = cls.quantizer_cls.from_arrays(**arrays)
+        return cls(embeddings, rescore_factor=rescore_factor, normalized=True, quantizer=quantizer, codes=codes)
+
+
+class Int8Index(QuantizedIndex):
+    """Per-dimension int8 codes: 1 byte per dimension, near-lossless ranking."""
+
+    name = "int8"
+    quantizer_cls = ScalarQuantizer
+
+    def _train(self, vectors: np.ndarray, **params):
+        return ScalarQuantizer.train(vectors)
+
+
+class PQIndex(QuantizedIndex):
+    """
+    Product-quantized codes: m bytes per row.
+
+    Knobs: m (sub-vectors; default dim // 16, e.g. 96 for 1536 dims), n_iter
+    and train_size for the per-subspace k-means, rescore_factor.
+    """
+
+    name = "pq"
+    quantizer_cls = ProductQuantizer
+
+    def _train(
+        self,
+        vectors: np.ndarray,
+        m: Optional[int] = None,
+        n_iter: int = 15,
+        train_size: Optional[int] = 20_000,
+        seed: int = 0,
+    ):
+        if m is None:
+            m = max(1, vectors.shape[1] // 16)
+        return ProductQuantizer.train(vectors, m, n_iter=n_iter, train_size=train_size, seed=seed)
+
+
+# ---------------------------------------------------------
+# Sharding (parallel per-shard search + top-k heap merge)
+# ---------------------------------------------------------
+
+def shard_bounds(n: int, n_shards: int) -> List[Tuple[int, int]]:
+    """(start, end) ranges splitting n rows into at most n_shards contiguous, near-equal shards."""
+    n_shards = max(1, min(n_shards, n))
+    return [(n * i // n_shards, n * (i + 1) // n_shards) for i in range(n_shards)]
+
+
+class ShardedIndex(VectorIndex):
+    """
+    Rows split into contiguous shards, each searched by its own index.
+
+    Shards are searched in parallel on executor (NumPy releases the GIL while
+    scoring; without an executor they run one after another), each returns
+    its own top_k, and the sorted per-shard lists are merged with a k-way heap
+    merge. Shards a mask leaves empty are not searched at all. Every shard is
+    tuned to its own size (e.g. IVF lists) and can be built or persisted
+    independently of the others.
+    """
+
+    def __init__(self, shards: Sequence[VectorIndex], executor: Optional[Executor] = None):
+        if not shards:
+            raise ValueError("ShardedIndex needs at least one shard.")
+        self.shards = list(shards)
+        self.offsets = np.concatenate(([0], np.cumsum([len(shard) for shard in self.shards]))).astype(np.int64)
+        self.executor = executor
+        self.name = f"{self.shards[0].name}x{len(self.shards)}"
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(shard.nbytes for shard in self.shards)
+
+    def search(
+        self, query: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_batch(np.asarray(query)[None, :], top_k, mask)[0]
+
+    def search_batch(
+        self, queries: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        queries = np.atleast_2d(queries)
+        if mask is not None and mask.shape[0] != len(self):
+            raise ValueError(f"Mask covers {mask.shape[0]} rows; the index has {len(self)}.")
+
+        jobs = []
+        for shard, start, end in zip(self.shards, self.offsets[:-1], self.offsets[1:]):
+            shard_mask = None if mask is None else mask[start:end]
+            if shard_mask is None or shard_mask.any():
+                jobs.append((int(start), shard, shard_mask))
+
+        if self.executor is None or len(jobs) <= 1:
+            per_shard = [shard.search_batch(queries, top_k, shard_mask) for _, shard, shard_mask in jobs]
+        else:
+            futures = [self.executor.submit(shard.search_batch, queries, top_k, shard_mask) for _, shard, shard_mask in jobs]
+            per_shard = [future.result() for future in futures]
+
+        starts = [start for start, _, _ in jobs]
+        return [
+            self._merge(starts, [results[i] for results in per_shard], top_k)
+            for i in range(queries.shape[0])
+        ]
+
+    @staticmethod
+    def _merge(starts: List[int], results: List[Tuple[np.ndarray, np.ndarray]], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """k-way merge of per-shard lists (each best first) into the global top_k."""
+        streams = [
+            zip((-scores).tolist(), (ids + start).tolist())
+            for start, (ids, scores) in zip(starts, results)
+        ]
+        best = []
+        for item in heapq.merge(*streams):
+            best.append(item)
+            if len(best) == top_k:
+                break
+        if not best:
+            return _empty()
+        neg_scores, ids = zip(*best)
+        return np.asarray(ids, dtype=np.int64), -np.asarray(neg_scores, dtype=np.float32)
+
+
+# ---------------------------------------------------------
+# Backend registry
+# ---------------------------------------------------------
+
+VECTOR_INDEX_BACKENDS: Dict[str, Type[VectorIndex]] = {
+    ExactIndex.name: ExactIndex,
+    IVFIndex.name: IVFIndex,
+    Int8Index.name: Int8Index,
+    PQIndex.name: PQIndex,
+}
+
+
+def build_vector_index(embeddings: np.ndarray, backend: str = "exact", **params) -> VectorIndex:
+    """Build a vector index of the given backend over the embedding matrix."""
+    try:
+        index_cls = VECTOR_INDEX_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown vector index backend '{backend}'. "
+            f"Available: {', '.join(sorted(VECTOR_INDEX_BACKENDS))}."
+        )
+    return index_cls(embeddings, **params)
+
+
+def build_sharded_index(
+    embeddings: np.ndarray,
+    backend: str = "exact",
+    n_shards: int = 2,
+    executor: Optional[Executor] = None,
+    **params,
+) -> VectorIndex:
+    """A ShardedIndex of n_shards backend indexes over contiguous row ranges (a plain index for one shard)."""
+    bounds = shard_bounds(embeddings.shape[0], n_shards)
+    if len(bounds) == 1:
+        return build_vector_index(embeddings, backend, **params)
+    return ShardedIndex([build_vector_index(embeddings[a:b], backend, **params) for a, b in bounds], executor)
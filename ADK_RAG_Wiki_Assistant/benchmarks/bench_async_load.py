@@ -0,0 +1,272 @@
+"""
+Concurrent-session load test for the retrieve_ai_context tool.
+
+Starts a local OpenAI-compatible embeddings server (deterministic
+FakeEmbeddingClient vectors, --server-latency-ms of simulated API time per
+request) in a subprocess, points the agent's openai backend at it with
+RAG_EMBEDDING_BASE_URL and runs N concurrent sessions on one event loop, each
+issuing --requests tool calls back to back, the way a Runner serving N
+conversations would. Three ways of running the tool are compared:
+
+- blocking: the synchronous embedding_rag_search called on the loop, as a
+  plain sync tool would; every session waits behind every HTTP round trip,
+- thread: the micro-batcher over asyncio.to_thread(embedding_rag_search_batch),
+- async: retrieve_ai_context (micro-batcher, pooled async embeddings client,
+  scoring on the RAG_SCORING_WORKERS pool).
+
+A probe coroutine sleeps 5 ms at a time and records how late it wakes up: the
+event-loop lag every other session on the loop would see.
+
+    python benchmarks/bench_async_load.py
+    python benchmarks/bench_async_load.py --sessions 1 16 64 --server-latency-ms 80 --json load.json
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(PROJECT_DIR, "benchmarks", "data")
+sys.path.insert(0, PROJECT_DIR)
+
+MODES = ("blocking", "thread", "async")
+PROBE_INTERVAL_S = 0.005
+
+
+# ---------------------------------------------------------
+# Fake OpenAI-compatible embeddings server
+# ---------------------------------------------------------
+
+def serve_embeddings(port: int, dim: int, latency_ms: float) -> None:
+    """POST /v1/embeddings with OpenAI's request/response shape (float or base64 encoding)."""
+    from adk_rag_wiki_assistant_agent.embedding_pipeline import FakeEmbeddingClient, estimate_tokens  # noqa: E402
+
+    fake = FakeEmbeddingClient(dim=dim)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so client connection pools are exercised
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            time.sleep(latency_ms / 1000.0)
+            data = []
+            for i, text in enumerate(texts):
+                vector = fake.embed(text)
+                if body.get("encoding_format") == "base64":
+                    embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+                else:
+                    embedding = vector.tolist()
+                data.append({"object": "embedding", "index": i, "embedding": embedding})
+            tokens = sum(estimate_tokens(t) for t in texts)
+            payload = json.dumps({
+                "object": "list",
+                "data": data,
+                "model": body.get("model"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 512
+
+    Server(("127.0.0.1", port), Handler).serve_forever()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout_s: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return
+        time.sleep(0.05)
+    raise RuntimeError(f"Embeddings server did not start on port {port}.")
+
+
+# ---------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------
+
+def latency_summary(samples_s):
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    if ms.size == 0:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def make_tool(agent, mode: str):
+    """The tool coroutine for mode; created inside the loop that will run it."""
+    if mode == "blocking":
+        async def tool(query):
+            return agent.embedding_rag_search(query)
+        return tool
+    if mode == "thread":
+        from adk_rag_wiki_assistant_agent.batching import AsyncMicroBatcher  # noqa: E402
+
+        batcher = AsyncMicroBatcher(
+            lambda queries: asyncio.to_thread(agent.embedding_rag_search_batch, queries),
+            max_batch_size=agent.RAG_BATCH_MAX_SIZE,
+            max_wait_ms=agent.RAG_BATCH_WINDOW_MS,
+        )
+        return batcher.submit
+    return agent.retrieve_ai_context
+
+
+async def probe_loop_lag(stop: asyncio.Event, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL_S)
+        lags.append(max(0.0, time.perf_counter() - start - PROBE_INTERVAL_S))
+
+
+async def run_load(agent, mode: str, sessions: int, requests: int, queries):
+    tool = make_tool(agent, mode)
+    latencies, lags = [], []
+    stop = asyncio.Event()
+
+    async def session(sid: int):
+        for i in range(requests):
+            # Distinct query text per call, so neither the cache nor batching dedup hides the embedding.
+            query = f"{queries[(sid * requests + i) % len(queries)]} (session {sid}, turn {i})"
+            start = time.perf_counter()
+            await tool(query)
+            latencies.append(time.perf_counter() - start)
+
+    probe = asyncio.create_task(probe_loop_lag(stop, lags))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(session(sid) for sid in range(sessions)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "calls": len(latencies),
+        "qps": len(latencies) / elapsed,
+        "latency": latency_summary(latencies),
+        "loop_lag": latency_summary(lags),
+    }
+
+
+# ---------------------------------------------------------
+# Driver
+# ---------------------------------------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(DATA_DIR, "ai_corpus"), help="Corpus snapshot directory.")
+    parser.add_argument("--queries", default=os.path.join(DATA_DIR, "ai_queries.jsonl"), help="Query texts.")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=10, help="Tool calls per session.")
+    parser.add_argument("--retrieval-mode", default="vector", help="RAG_RETRIEVAL_MODE (vector embeds every query).")
+    parser.add_argument("--server-latency-ms", type=float, default=50.0, help="Simulated embeddings API time.")
+    parser.add_argument("--dim", type=int, default=256, help="Embedding dimension served.")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_embeddings(args.serve, args.dim, args.server_latency_ms)
+        return
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(port),
+         "--dim", str(args.dim), "--server-latency-ms", str(args.server_latency_ms)],
+        # The package imports agent.py; the server itself needs no API key.
+        env=dict(os.environ, RAG_EMBEDDING_BACKEND="fake", RAG_WARMUP="off"),
+    )
+    try:
+        wait_for_port(port)
+        with tempfile.TemporaryDirectory() as index_dir:
+            os.environ.update(
+                RAG_EMBEDDING_BACKEND="openai",
+                OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY") or "bench-not-a-key",
+                RAG_EMBEDDING_BASE_URL=f"http://127.0.0.1:{port}/v1",
+                RAG_SOURCES=os.path.abspath(args.corpus),
+                RAG_INDEX_DIR=index_dir,
+                RAG_RETRIEVAL_MODE=args.retrieval_mode,
+                RAG_QUERY_CACHE_SIZE="0",
+                RAG_QUERY_CACHE_DB="",
+                RAG_SHARED_INDEX="0",
+                RAG_WARMUP="blocking",
+            )
+            with contextlib.redirect_stdout(open(os.devnull, "w")):
+                from adk_rag_wiki_assistant_agent import agent  # noqa: E402
+
+            with open(args.queries, "r", encoding="utf-8") as f:
+                queries = [json.loads(line)["query"] for line in f if line.strip()]
+
+            print(
+                f"{'mode':<10}{'sessions':>9}{'calls':>7}{'qps':>9}{'p50 ms':>9}{'p95 ms':>9}"
+                f"{'p99 ms':>9}{'lag p99':>9}{'lag max':>9}"
+            )
+            results = []
+            for sessions in args.sessions:
+                for mode in args.modes:
+                    r = asyncio.run(run_load(agent, mode, sessions, args.requests, queries))
+                    results.append(r)
+                    lat, lag = r["latency"], r["loop_lag"]
+                    print(
+                        f"{mode:<10}{sessions:>9}{r['calls']:>7}{r['qps']:>9.1f}{lat['p50_ms']:>9.1f}"
+                        f"{lat['p95_ms']:>9.1f}{lat['p99_ms']:>9.1f}{lag['p99_ms']:>9.1f}{lag['max_ms']:>9.1f}"
+                    )
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json_path:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "server_latency_ms": args.server_latency_ms,
+                "requests_per_session": args.requests,
+                "retrieval_mode": args.retrieval_mode,
+                "scoring_workers": agent.RAG_SCORING_WORKERS,
+                "http_connections": agent.RAG_EMBED_HTTP_CONNECTIONS,
+            },
+            "results": results,
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
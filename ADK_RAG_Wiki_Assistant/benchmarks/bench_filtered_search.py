@@ -0,0 +1,181 @@
+"""
+Metadata-filtered and sharded vector search on a synthetic corpus.
+
+Every chunk gets a source (one of --docs documents), a section (one of a
+dozen titles) and a modification time. Two reports:
+
+1. Filters of decreasing selectivity, applied as a boolean mask before
+   scoring (ChunkColumns.mask + search(mask=...)), against the naive
+   alternative of over-fetching unfiltered results and dropping the ones that
+   do not match. Recall is measured against brute force over the matching rows.
+2. The exact and IVF backends split into 1..N shards, searched on a thread
+   pool and merged by score, for single queries and for batches.
+
+    python benchmarks/bench_filtered_search.py
+    python benchmarks/bench_filtered_search.py --rows 1000000 --shards 1 2 4 8 --json filtered.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+# Importing the package loads agent.py; use the offline embedding client.
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "fake")
+
+from bench_vector_index import make_corpus, recall_at_k  # noqa: E402
+
+from adk_rag_wiki_assistant_agent.metadata import ChunkColumns  # noqa: E402
+from adk_rag_wiki_assistant_agent.vector_index import ExactIndex, IVFIndex, build_sharded_index  # noqa: E402
+
+SECTIONS = [
+    "History", "Goals", "Techniques", "Applications", "Ethics", "Regulation",
+    "Philosophy", "Future", "Hardware", "Evaluation", "Criticism", "See also",
+]
+OVERFETCH = 10  # post-filter baseline: fetch top_k * OVERFETCH, then drop non-matching rows
+
+
+def make_meta(rows: int, docs: int, seed: int):
+    rng = np.random.default_rng(seed + 1)
+    sources = rng.integers(0, docs, size=rows)
+    sections = rng.integers(0, len(SECTIONS), size=rows)
+    modified = 1.6e9 + rng.random(rows) * 1.5e8  # ~5 years
+    return [
+        {"source": f"https://example.org/doc/{s}", "offset": i, "section": SECTIONS[c], "modified": float(m)}
+        for i, (s, c, m) in enumerate(zip(sources, sections, modified))
+    ]
+
+
+def filtered_truth(data: np.ndarray, queries: np.ndarray, mask: np.ndarray, top_k: int):
+    rows = np.flatnonzero(mask)
+    scores = queries @ data[rows].T
+    return [rows[np.argsort(-s, kind="stable")[:top_k]] for s in scores]
+
+
+def timed(fn, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1000.0
+
+
+def bench_filters(data, queries, columns, top_k, backends):
+    median_modified = float(np.nanmedian(columns.numbers["modified"]))
+    filters = [
+        ("none", None),
+        ("modified>=median", {"modified": (median_modified, None)}),
+        ("section", {"section": "History"}),
+        ("section+date", {"section": ["History", "Ethics"], "modified": (median_modified, None)}),
+        ("one source", {"source": columns.distinct("source")[0]}),
+    ]
+    print(f"\n{'filter':<18}{'selected':>10}{'mask ms':>9}{'cached':>8}{'backend':>9}"
+          f"{'ms/query':>10}{'recall':>8}{'post-filter recall':>20}")
+    results = []
+    for label, condition in filters:
+        columns._masks.clear()
+        mask, mask_ms = timed(lambda: columns.mask(condition))
+        _, cached_ms = timed(lambda: columns.mask(condition), repeat=100)
+        selected = 1.0 if mask is None else float(mask.mean())
+        truth = filtered_truth(data, queries, mask if mask is not None else np.ones(len(data), bool), top_k)
+        for name, index in backends:
+            found, ms = timed(lambda: [ids for ids, _ in index.search_batch(queries, top_k, mask)])
+            recall = recall_at_k(truth, found)
+            # Baseline: unfiltered over-fetch, filtered afterwards.
+            post = [ids[mask[ids]][:top_k] if mask is not None else ids[:top_k]
+                    for ids, _ in index.search_batch(queries, top_k * OVERFETCH)]
+            post_recall = recall_at_k(truth, post)
+            print(f"{label:<18}{selected:>10.2%}{mask_ms:>9.2f}{cached_ms:>8.3f}{name:>9}"
+                  f"{ms / len(queries):>10.3f}{recall:>8.3f}{post_recall:>20.3f}")
+            results.append({
+                "filter": label, "selectivity": selected, "mask_ms": mask_ms, "mask_cached_ms": cached_ms,
+                "backend": name, "ms_per_query": ms / len(queries), "recall": recall,
+                "post_filter_recall": post_recall,
+            })
+    return results
+
+
+def bench_shards(data, queries, top_k, shard_counts, workers, batch_size, n_probe):
+    print(f"\n{'backend':<10}{'shards':>7}{'build s':>9}{'ms/query':>10}{'batch QPS':>11}{'recall':>8}")
+    results = []
+    truth = [ids for ids, _ in ExactIndex(data, normalized=True).search_batch(queries, top_k)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for backend, params in (("exact", {}), ("ivf", {"n_probe": n_probe})):
+            for n_shards in shard_counts:
+                index, build_ms = timed(lambda: build_sharded_index(
+                    data, backend, n_shards, pool, normalized=True, **params
+                ))
+                found, single_ms = timed(lambda: [index.search(q, top_k)[0] for q in queries])
+                _, batch_ms = timed(lambda: [
+                    index.search_batch(queries[i:i + batch_size], top_k) for i in range(0, len(queries), batch_size)
+                ])
+                qps = len(queries) / (batch_ms / 1000.0)
+                recall = recall_at_k(truth, found)
+                print(f"{backend:<10}{n_shards:>7}{build_ms / 1000:>9.2f}{single_ms / len(queries):>10.3f}"
+                      f"{qps:>11.0f}{recall:>8.3f}")
+                results.append({
+                    "backend": backend, "shards": n_shards, "build_s": build_ms / 1000.0,
+                    "ms_per_query": single_ms / len(queries), "batch_qps": qps, "recall": recall,
+                })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200, help="Clusters in the synthetic corpus.")
+    parser.add_argument("--docs", type=int, default=500, help="Distinct sources.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--n-probe", type=int, default=16, help="IVF cells probed (per shard).")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="Shard search threads.")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows} x {args.dim} corpus, {args.queries} queries, {args.docs} sources...")
+    data, queries = make_corpus(args.rows, args.dim, args.clusters, args.queries, args.seed)
+    meta = make_meta(args.rows, args.docs, args.seed)
+    columns, columns_ms = timed(lambda: ChunkColumns(meta))
+    print(f"Metadata columns: {columns.nbytes / args.rows:.0f} bytes/chunk, built in {columns_ms:.0f} ms.")
+
+    backends = [
+        ("exact", ExactIndex(data, normalized=True)),
+        ("ivf", IVFIndex(data, normalized=True, n_probe=args.n_probe, seed=args.seed)),
+    ]
+    filter_results = bench_filters(data, queries, columns, args.top_k, backends)
+    shard_results = bench_shards(
+        data, queries, args.top_k, args.shards, args.workers, args.batch_size, args.n_probe
+    )
+
+    if args.json_path:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "rows": args.rows,
+                "dim": args.dim,
+                "workers": args.workers,
+                "metadata_bytes_per_chunk": columns.nbytes / args.rows,
+            },
+            "filters": filter_results,
+            "shards": shard_results,
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
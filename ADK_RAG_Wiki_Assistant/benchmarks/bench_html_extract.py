@@ -0,0 +1,153 @@
+"""
+Paragraph-extraction benchmark: BeautifulSoup tree vs the streaming parser.
+
+"before": the original path -- the whole page is parsed into a BeautifulSoup
+          tree, then p.get_text(strip=True) for every <p> in the content div.
+"after":  html_stream.iter_html_paragraphs -- event-based parsing of the page
+          in 64 KiB pieces, paragraphs yielded as they close, no tree.
+
+Both paths must produce identical paragraphs. Run it on a saved page, e.g.
+
+    curl -sL -o ai.html https://en.wikipedia.org/wiki/Artificial_intelligence
+    python benchmarks/bench_html_extract.py --page ai.html
+
+Without --page a large synthetic MediaWiki-style page is generated. The
+"before" path needs beautifulsoup4 (pip install beautifulsoup4).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from bs4 import BeautifulSoup
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+# Importing the package loads agent.py; use the offline embedding client.
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "fake")
+
+from adk_rag_wiki_assistant_agent.html_stream import iter_html_paragraphs  # noqa: E402
+from adk_rag_wiki_assistant_agent.ingestion import READ_CHUNK_BYTES  # noqa: E402
+
+
+def legacy_extract(html: str):
+    soup = BeautifulSoup(html, "html.parser")
+    content_div = soup.find("div", {"id": "mw-content-text"}) or soup.body or soup
+    return [t for t in (p.get_text(strip=True) for p in content_div.find_all("p")) if t]
+
+
+def streaming_extract(html: str):
+    pieces = (html[i:i + READ_CHUNK_BYTES] for i in range(0, len(html), READ_CHUNK_BYTES))
+    return list(iter_html_paragraphs(pieces))
+
+
+def synthetic_page(paragraphs: int, seed: int) -> str:
+    """A MediaWiki-like page: navigation chrome, infobox, references, inline markup."""
+    rng = np.random.default_rng(seed)
+    vocab = [f"word{i}" for i in range(3000)]
+
+    def sentence() -> str:
+        words = list(rng.choice(vocab, size=int(rng.integers(8, 25))))
+        i = int(rng.integers(0, len(words)))
+        words[i] = f'<a href="/wiki/{words[i]}" title="{words[i]}">{words[i]}</a>'
+        if rng.random() < 0.3:
+            words.append(f'<b>{rng.choice(vocab)}</b> &amp; <i>{rng.choice(vocab)}</i>')
+        return " ".join(words) + "."
+
+    body = []
+    for n in range(paragraphs):
+        if n % 12 == 0:
+            body.append(f'<h2><span class="mw-headline" id="s{n}">Section {n}</span></h2>')
+        if n % 25 == 0:
+            body.append(
+                '<table class="infobox"><tr><th>Key</th><td>value</td></tr></table>'
+                '<style>.mw-parser-output .x{color:red}</style>'
+            )
+        refs = "".join(
+            f'<sup class="reference"><a href="#cite_note-{n}-{r}">[{r}]</a></sup>'
+            for r in range(int(rng.integers(0, 3)))
+        )
+        body.append("<p>" + " ".join(sentence() for _ in range(int(rng.integers(2, 7)))) + refs + "\n</p>")
+        if n % 40 == 0:
+            body.append("<p><br></p><!-- empty paragraph -->")
+
+    nav = "".join(f'<li><a href="/wiki/Nav{i}">Nav {i}</a></li>' for i in range(500))
+    return (
+        "<!DOCTYPE html><html><head><title>Synthetic</title>"
+        "<script>var wgPageName = 'Synthetic'; if (a < b) {}</script></head><body>"
+        f'<div id="mw-navigation"><p>Navigation chrome</p><ul>{nav}</ul></div>'
+        '<div id="content"><div id="bodyContent"><div id="mw-content-text" class="mw-body-content">'
+        '<div class="mw-parser-output">' + "\n".join(body) + "</div></div></div></div>"
+        "<div id=\"footer\"><p>Footer text</p></div></body></html>"
+    )
+
+
+def measure(extract, html: str, repeat: int):
+    """Return (median ms, peak bytes allocated)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extract(html)
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    tracemalloc.start()
+    extract(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def fmt_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.1f} {unit}"
+        n /= 1024.0
+    return f"{n:.1f} GiB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", help="Saved HTML page to benchmark on.")
+    parser.add_argument("--paragraphs", type=int, default=3000, help="Size of the synthetic page.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, "r", encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        label = args.page
+    else:
+        html = synthetic_page(args.paragraphs, args.seed)
+        label = f"synthetic ({args.paragraphs} paragraphs)"
+
+    before_paragraphs = legacy_extract(html)
+    after_paragraphs = streaming_extract(html)
+    assert after_paragraphs == before_paragraphs, "streaming extraction differs from BeautifulSoup"
+    print(f"{label}: {fmt_bytes(len(html.encode('utf-8')))}, {len(after_paragraphs)} paragraphs (identical)")
+
+    before = measure(legacy_extract, html, args.repeat)
+    after = measure(streaming_extract, html, args.repeat)
+
+    print(f"\n{'path':<8}{'median ms':>11}{'peak alloc':>14}")
+    results = []
+    for name, (median_ms, peak) in (("before", before), ("after", after)):
+        print(f"{name:<8}{median_ms:>11.1f}{fmt_bytes(peak):>14}")
+        results.append({"page": label, "path": name, "median_ms": median_ms, "peak_alloc_bytes": peak})
+    print(f"speedup {before[0] / after[0]:.1f}x, peak memory {before[1] / max(after[1], 1):.0f}x smaller")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Memory-per-chunk and recall@k report for the quantized index backends.
+
+Compares int8 and PQ codes against float32 exact search on a synthetic,
+clustered corpus, with and without exact rescoring of the top candidates:
+
+    python benchmarks/bench_quantization.py                    # 20k x 1536 (text-embedding-3-small)
+    python benchmarks/bench_quantization.py --rows 100000 --pq-m 48 96 192 --rescore 0 5 10
+
+"memory/chunk" counts what each worker holds in RAM: the codes plus its share
+of the quantizer tables. The float32 rows used for rescoring stay in the
+memory-mapped index file and only the candidates' pages are read.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+# Importing the package loads agent.py; use the offline embedding client.
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "fake")
+
+from bench_vector_index import make_corpus, recall_at_k  # noqa: E402
+
+from adk_rag_wiki_assistant_agent.vector_index import ExactIndex, Int8Index, PQIndex  # noqa: E402
+
+
+def run_queries(index, queries, top_k: int):
+    start = time.perf_counter()
+    found = [ids for ids, _ in index.search_batch(queries, top_k)]
+    return found, (time.perf_counter() - start) / len(queries) * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200, help="Clusters in the synthetic corpus.")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[96, 192], help="PQ sub-vectors (bytes per chunk).")
+    parser.add_argument("--rescore", type=int, nargs="+", default=[0, 10], help="Rescore factors to compare.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows} x {args.dim} corpus, {args.queries} queries...")
+    data, queries = make_corpus(args.rows, args.dim, args.clusters, args.queries, args.seed)
+
+    exact = ExactIndex(data, normalized=True)
+    truth, exact_ms = run_queries(exact, queries, args.top_k)
+    float_bytes = exact.nbytes / args.rows
+
+    results = []
+    header = f"{'backend':<14}{'rescore':>8}{'bytes/chunk':>13}{'vs f32':>8}{'recall@' + str(args.top_k):>11}{'ms/query':>10}"
+    print(f"\n{header}")
+    print(f"{'float32':<14}{'-':>8}{float_bytes:>13.0f}{1.0:>7.0f}x{1.0:>11.4f}{exact_ms:>10.2f}")
+    results.append({"backend": "float32", "bytes_per_chunk": float_bytes, "recall": 1.0, "ms_per_query": exact_ms})
+
+    candidates = [("int8", lambda: Int8Index(data, normalized=True))]
+    candidates += [(f"pq/m={m}", lambda m=m: PQIndex(data, normalized=True, m=m, seed=args.seed)) for m in args.pq_m]
+
+    for label, build in candidates:
+        start = time.perf_counter()
+        index = build()
+        build_s = time.perf_counter() - start
+        per_chunk = index.nbytes / args.rows
+        for factor in args.rescore:
+            index.rescore_factor = factor
+            found, ms = run_queries(index, queries, args.top_k)
+            recall = recall_at_k(truth, found)
+            ratio = float_bytes / per_chunk
+            print(f"{label:<14}{factor:>8}{per_chunk:>13.0f}{ratio:>7.0f}x{recall:>11.4f}{ms:>10.2f}")
+            results.append(
+                {"backend": label, "rescore_factor": factor, "bytes_per_chunk": per_chunk,
+                 "compression": ratio, "recall": recall, "ms_per_query": ms, "build_s": build_s}
+            )
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Retrieval quality and latency benchmark for embedding_rag_search.
+
+Runs offline on FakeEmbeddingClient, the corpus snapshot in
+benchmarks/data/ai_corpus and the labeled queries in
+benchmarks/data/ai_queries.jsonl. Each query lists evidence phrases; a chunk
+is relevant if it contains one, so the labels hold for any chunker setting.
+--distractors pads the corpus with synthetic documents (drawn from the
+snapshot's vocabulary) to measure larger indexes.
+
+Every configuration (retrieval mode x index backend x chunker setting) runs
+in a fresh subprocess, since agent.py reads its settings at import:
+
+    python benchmarks/bench_retrieval.py
+    python benchmarks/bench_retrieval.py --backends exact ivf int8 pq --chunk-tokens 120 200 \\
+        --overlap 0 40 --distractors 2000 --json results.json
+
+Reported per configuration:
+- recall@1/3/5/10 (share of evidence phrases found) and MRR@10 of the ranking,
+- evidence recall and size in tokens of the packed context the tool returns,
+- index build time, p50/p95/p99 per-query latency of query embedding, vector
+  scoring, BM25, packing and end to end, and queries/s (one at a time and
+  batched).
+
+Rankings come from the same stage functions the tool runs (_lexical_stage,
+then _rank_stage), and contexts, end-to-end latency and queries/s from
+embedding_rag_search_batch_async(), the tool's path minus the micro-batching
+window. Query embeddings for rankings are fetched with the sync client.
+
+The --json output carries the git commit, library versions and a corpus hash
+so that runs can be compared over time.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(PROJECT_DIR, "benchmarks", "data")
+sys.path.insert(0, PROJECT_DIR)
+
+RECALL_KS = (1, 3, 5, 10)
+
+
+# ---------------------------------------------------------
+# Corpus, queries, metrics
+# ---------------------------------------------------------
+
+def load_queries(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def corpus_files(directory: str):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.endswith((".md", ".txt", ".html"))
+    )
+
+
+def corpus_hash(directory: str) -> str:
+    digest = hashlib.sha256()
+    for path in corpus_files(directory):
+        digest.update(os.path.relpath(path, directory).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def write_distractors(directory: str, corpus_dir: str, count: int, seed: int) -> None:
+    """count synthetic documents whose words are sampled from the corpus vocabulary."""
+    text = " ".join(open(p, encoding="utf-8").read() for p in corpus_files(corpus_dir))
+    vocab = sorted({w for w in text.lower().split() if w.isalpha()})
+    rng = np.random.default_rng(seed)
+    for n in range(count):
+        paragraphs = [
+            " ".join(rng.choice(vocab, size=int(rng.integers(40, 120)))).capitalize() + "."
+            for _ in range(int(rng.integers(2, 6)))
+        ]
+        with open(os.path.join(directory, f"distractor_{n:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(paragraphs))
+
+
+def ranking_metrics(found, relevant):
+    """
+    recall@k and MRR@10 over queries. found: ranked chunk ids per query;
+    relevant: per query, one set of chunk ids per evidence phrase.
+    """
+    recall = {}
+    for k in RECALL_KS:
+        per_query = [
+            sum(bool(chunks & set(ids[:k])) for chunks in evidence) / len(evidence)
+            for ids, evidence in zip(found, relevant)
+        ]
+        recall[f"recall@{k}"] = float(np.mean(per_query))
+
+    reciprocal = []
+    for ids, evidence in zip(found, relevant):
+        hits = set().union(*evidence)
+        rank = next((r for r, i in enumerate(ids[:10], start=1) if i in hits), None)
+        reciprocal.append(1.0 / rank if rank else 0.0)
+    recall["mrr@10"] = float(np.mean(reciprocal))
+    return recall
+
+
+def latency_summary(samples_s):
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+# ---------------------------------------------------------
+# Worker: one configuration, settings from the environment
+# ---------------------------------------------------------
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def rank(agent, state, queries, keep):
+    """{query: (chunk ids, scores)} from the tool's lexical and vector stages, before packing."""
+    groups, keys = agent._group_queries(queries, None)
+    plans, to_embed, vectors, missing = agent._lexical_stage(state, groups, keep)
+    embedded = agent.embed_texts(missing) if missing else None
+    ranked = agent._rank_stage(state, plans, to_embed, vectors, missing, embedded, keep)
+    return {query: ranked[(key, query)] for key, query in zip(keys, queries)}
+
+
+def run_worker(queries_path: str, repeat: int, out_path: str) -> None:
+    quiet = contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        from adk_rag_wiki_assistant_agent import agent
+        from adk_rag_wiki_assistant_agent.chunking import get_token_counter
+
+        # Cold build: fetch + chunk + embed + persist, then the vector index.
+        _, corpus_s = timed(agent.build_or_get_embedding_index)
+        _, vector_s = timed(agent.get_vector_index)
+        # Warm start: a new process would load the persisted index instead.
+        for key in agent._EMBEDDING_CACHE:
+            agent._EMBEDDING_CACHE[key] = None
+        _, load_s = timed(agent.get_vector_index)
+
+        state = agent._index_snapshot()
+        chunks, index, bm25 = state["chunks"], state["index"], state["lexical"]
+        labeled = load_queries(queries_path)
+        queries = [item["query"] for item in labeled]
+        relevant = [
+            [{i for i, chunk in enumerate(chunks) if phrase in chunk} for phrase in item["evidence"]]
+            for item in labeled
+        ]
+
+        ranked = rank(agent, state, queries, 10)
+        found = [ranked[q][0].tolist() for q in queries]
+        metrics = ranking_metrics(found, relevant)
+
+        loop = asyncio.new_event_loop()  # one loop, so its pooled embeddings client is reused
+
+        def search(batch):
+            return loop.run_until_complete(agent.embedding_rag_search_batch_async(batch))
+
+        count_tokens = get_token_counter(agent.CHUNKER_PARAMS["tokenizer"])
+        contexts = search(queries)
+        context_recall = [
+            sum(phrase in context for phrase in item["evidence"]) / len(item["evidence"])
+            for item, context in zip(labeled, contexts)
+        ]
+        metrics["context_recall"] = float(np.mean(context_recall))
+        metrics["context_tokens_mean"] = float(np.mean([count_tokens(c) for c in contexts]))
+
+        keep = max(3, agent.RAG_PACK_CANDIDATES)
+        stages = {name: [] for name in ("embed_query", "vector_search", "bm25", "pack", "end_to_end")}
+        for _ in range(repeat):
+            for query in queries:
+                vector, t = timed(agent.embed_queries, [query])
+                stages["embed_query"].append(t)
+                _, t = timed(index.search_batch, vector, max(keep, agent.RAG_HYBRID_DEPTH))
+                stages["vector_search"].append(t)
+                _, t = timed(bm25.search, query, max(keep, agent.RAG_HYBRID_DEPTH))
+                stages["bm25"].append(t)
+                ids, scores = rank(agent, state, [query], keep)[query]
+                _, t = timed(agent._pack_candidates, state, ids, scores)
+                stages["pack"].append(t)
+                _, t = timed(search, [query])
+                stages["end_to_end"].append(t)
+        _, batch_s = timed(search, queries)
+        loop.close()
+
+    result = {
+        "chunks": len(chunks),
+        "index_bytes_per_chunk": index.nbytes / max(len(index), 1),
+        **metrics,
+        "build_corpus_s": corpus_s,
+        "build_vector_index_s": vector_s,
+        "load_persisted_s": load_s,
+        "latency": {name: latency_summary(samples) for name, samples in stages.items()},
+        "qps_sequential": len(stages["end_to_end"]) / sum(stages["end_to_end"]),
+        "qps_batched": len(queries) / batch_s,
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+# ---------------------------------------------------------
+# Driver
+# ---------------------------------------------------------
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_config(config, sources: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as index_dir:
+        out_path = os.path.join(index_dir, "result.json")
+        env = dict(
+            os.environ,
+            RAG_EMBEDDING_BACKEND="fake",
+            RAG_FAKE_EMBEDDING_DIM=str(args.dim),
+            RAG_FAKE_EMBEDDING_LATENCY_MS=str(args.embed_latency_ms),
+            RAG_SOURCES=sources,
+            RAG_INDEX_DIR=os.path.join(index_dir, "index"),
+            RAG_RETRIEVAL_MODE=config["mode"],
+            RAG_INDEX_BACKEND=config["backend"],
+            RAG_CHUNK_TOKENS=str(config["chunk_tokens"]),
+            RAG_CHUNK_OVERLAP_TOKENS=str(config["overlap_tokens"]),
+            RAG_CONTEXT_TOKENS=str(args.context_tokens),
+            RAG_QUERY_CACHE_SIZE="0",  # measure embedding, not cache hits
+            RAG_QUERY_CACHE_DB="",
+            RAG_SHARED_INDEX="0",
+            RAG_WARMUP="off",
+        )
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", out_path,
+             "--queries", args.queries, "--repeat", str(args.repeat)],
+            env=env, check=True,
+        )
+        with open(out_path, "r", encoding="utf-8") as f:
+            return {**config, **json.load(f)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(DATA_DIR, "ai_corpus"), help="Corpus snapshot directory.")
+    parser.add_argument("--queries", default=os.path.join(DATA_DIR, "ai_queries.jsonl"), help="Labeled queries.")
+    parser.add_argument("--modes", nargs="+", default=["hybrid"], help="RAG_RETRIEVAL_MODE values.")
+    parser.add_argument("--backends", nargs="+", default=["exact", "int8"], help="RAG_INDEX_BACKEND values.")
+    parser.add_argument("--chunk-tokens", type=int, nargs="+", default=[200])
+    parser.add_argument("--overlap", type=int, nargs="+", default=[0], help="Chunk overlap tokens.")
+    parser.add_argument("--context-tokens", type=int, default=600, help="RAG_CONTEXT_TOKENS (0 = fixed top_k).")
+    parser.add_argument("--distractors", type=int, default=0, help="Synthetic documents added to the corpus.")
+    parser.add_argument("--dim", type=int, default=256, help="Fake embedding dimension.")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated embeddings API latency.")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the query set for latency.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.queries, args.repeat, args.worker)
+        return
+
+    configs = [
+        {"mode": mode, "backend": backend, "chunk_tokens": tokens, "overlap_tokens": overlap}
+        for mode, backend, tokens, overlap in itertools.product(args.modes, args.backends, args.chunk_tokens, args.overlap)
+        if overlap < tokens
+    ]
+
+    with tempfile.TemporaryDirectory() as distractor_dir:
+        sources = os.path.abspath(args.corpus)
+        if args.distractors:
+            write_distractors(distractor_dir, args.corpus, args.distractors, args.seed)
+            sources += "," + distractor_dir
+
+        header = (
+            f"{'mode':<8}{'backend':<8}{'chunk':>10}{'chunks':>8}"
+            + "".join(f"{'R@' + str(k):>7}" for k in RECALL_KS)
+            + f"{'MRR':>7}{'ctxR':>7}{'ctxTok':>8}{'build s':>9}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'qps':>8}"
+        )
+        print(header)
+        results = []
+        for config in configs:
+            r = run_config(config, sources, args)
+            results.append(r)
+            e2e = r["latency"]["end_to_end"]
+            print(
+                f"{r['mode']:<8}{r['backend']:<8}{str(r['chunk_tokens']) + '/' + str(r['overlap_tokens']):>10}"
+                f"{r['chunks']:>8}"
+                + "".join(f"{r[f'recall@{k}']:>7.3f}" for k in RECALL_KS)
+                + f"{r['mrr@10']:>7.3f}{r['context_recall']:>7.3f}{r['context_tokens_mean']:>8.0f}"
+                f"{r['build_corpus_s'] + r['build_vector_index_s']:>9.2f}"
+                f"{e2e['p50_ms']:>8.2f}{e2e['p95_ms']:>8.2f}{e2e['p99_ms']:>8.2f}{r['qps_sequential']:>8.0f}"
+            )
+
+    if args.json_path:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "git_commit": git_commit(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "corpus": os.path.relpath(os.path.abspath(args.corpus), PROJECT_DIR),
+                "corpus_hash": corpus_hash(args.corpus),
+                "queries": len(load_queries(args.queries)),
+                "distractors": args.distractors,
+                "dim": args.dim,
+                "embed_latency_ms": args.embed_latency_ms,
+                "context_tokens": args.context_tokens,
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Per-call latency and allocation micro-benchmark for the exact retrieval hot path.
+
+Single queries (ExactIndex.search):
+"before": the original path -- cosine_similarity() re-normalizes the whole
+          (n, d) matrix on every query, then np.argsort sorts every score.
+"after":  ExactIndex -- rows normalized once at build time, one matrix-vector
+          product into a reusable buffer, O(n) argpartition top-k.
+
+Batches of --batch queries (ExactIndex.search_batch, the call the RAG tool
+makes through the micro-batcher):
+"before": a fresh (m, n) score matrix per call and a row-wise argpartition
+          over all of it (another (m, n) int64 array).
+"after":  one matrix-matrix product into the reusable per-thread buffer, then
+          an argpartition per row.
+
+Allocations are measured with tracemalloc (NumPy reports its buffers to it):
+
+    python benchmarks/bench_topk.py                       # 10k / 100k / 1M rows
+    python benchmarks/bench_topk.py --rows 10000 100000 --dim 1536 --batch 32
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+# Importing the package loads agent.py; use the offline embedding client.
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "fake")
+
+from adk_rag_wiki_assistant_agent.vector_index import (  # noqa: E402
+    ExactIndex,
+    _top_k_rows,
+    cosine_similarity,
+    normalize_rows,
+)
+
+
+def legacy_search(embeddings: np.ndarray, query: np.ndarray, top_k: int):
+    sims = cosine_similarity(embeddings, query)
+    ranked = np.argsort(-sims)[:top_k]
+    return ranked, sims[ranked]
+
+
+def legacy_search_batch(embeddings: np.ndarray, queries: np.ndarray, top_k: int):
+    ranked, scores = _top_k_rows(normalize_rows(queries) @ embeddings.T, top_k)
+    return list(zip(ranked, scores))
+
+
+def measure(search, queries, top_k: int):
+    """Return (median ms, p95 ms, peak bytes allocated per call); queries holds one input per call."""
+    search(queries[0], top_k)  # warm-up (e.g. first-use buffers)
+
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        search(q, top_k)
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    peaks = []
+    for q in queries[: min(5, len(queries))]:
+        tracemalloc.start()
+        search(q, top_k)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+    return statistics.median(timings), p95, max(peaks)
+
+
+def fmt_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.1f} {unit}"
+        n /= 1024.0
+    return f"{n:.1f} GiB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256, help="Embedding dim (text-embedding-3-small is 1536).")
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=8, help="Queries per search_batch call.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+
+    print(f"{'rows':>10} {'path':<14}{'median ms':>11}{'p95 ms':>10}{'alloc/call':>14}")
+    for rows in args.rows:
+        embeddings = rng.standard_normal((rows, args.dim), dtype=np.float32)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        before = measure(lambda q, k: legacy_search(embeddings, q, k), queries, args.top_k)
+
+        index = ExactIndex(embeddings)
+        after = measure(index.search, queries, args.top_k)
+
+        batches = [queries[i:i + args.batch] for i in range(0, len(queries), args.batch)]
+        batch_before = measure(lambda b, k: legacy_search_batch(index.embeddings, b, k), batches, args.top_k)
+        batch_after = measure(index.search_batch, batches, args.top_k)
+
+        # Both paths must agree on the result set.
+        for q in queries[:5]:
+            assert set(legacy_search(embeddings, q, args.top_k)[0]) == set(index.search(q, args.top_k)[0])
+        for old, new in zip(legacy_search_batch(index.embeddings, batches[0], args.top_k),
+                            index.search_batch(batches[0], args.top_k)):
+            assert set(old[0]) == set(new[0])
+
+        for kind, pair in (("", (before, after)), ("batch ", (batch_before, batch_after))):
+            for label, (median_ms, p95_ms, peak) in zip(("before", "after"), pair):
+                print(f"{rows:>10} {kind + label:<14}{median_ms:>11.3f}{p95_ms:>10.3f}{fmt_bytes(peak):>14}")
+                results.append(
+                    {"rows": rows, "dim": args.dim, "path": kind + label, "batch": args.batch if kind else 1,
+                     "median_ms": median_ms, "p95_ms": p95_ms, "peak_alloc_bytes": peak}
+                )
+            print(f"{'':>10} {kind}speedup {pair[0][0] / pair[1][0]:.1f}x, "
+                  f"allocations {pair[0][2] / max(pair[1][2], 1):.0f}x smaller")
+
+        del embeddings, index
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
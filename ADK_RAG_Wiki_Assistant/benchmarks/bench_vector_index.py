@@ -0,0 +1,107 @@
+"""
+Recall@k / latency benchmark for the vector index backends.
+
+Compares the IVF backend against the exact reference on a synthetic,
+clustered corpus of unit vectors (so no API key or network is needed):
+
+    python benchmarks/bench_vector_index.py --rows 100000 --dim 256 --top-k 10
+    python benchmarks/bench_vector_index.py --n-probe 1 2 4 8 16 32 --json results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+# Importing the package loads agent.py; use the offline embedding client.
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "fake")
+
+from adk_rag_wiki_assistant_agent.vector_index import ExactIndex, IVFIndex  # noqa: E402
+
+
+def make_corpus(rows: int, dim: int, clusters: int, queries: int, seed: int):
+    """Clustered unit vectors plus queries drawn near random corpus points."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    data = centers[labels] + 1.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+
+    picks = rng.integers(0, rows, size=queries)
+    q = data[picks] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32) / np.sqrt(dim)
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    return data, q
+
+
+def time_queries(index, queries: np.ndarray, top_k: int):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        ids, _ = index.search(q, top_k)
+        results.append(ids)
+    elapsed = time.perf_counter() - start
+    return results, elapsed / len(queries) * 1000.0
+
+
+def recall_at_k(truth, found) -> float:
+    hits = sum(len(set(t.tolist()) & set(f.tolist())) for t, f in zip(truth, found))
+    return hits / sum(len(t) for t in truth)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200, help="Clusters in the synthetic corpus.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=None, help="IVF lists (default ~sqrt(rows)).")
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows} x {args.dim} corpus, {args.queries} queries...")
+    data, queries = make_corpus(args.rows, args.dim, args.clusters, args.queries, args.seed)
+
+    exact = ExactIndex(data)
+    truth, exact_ms = time_queries(exact, queries, args.top_k)
+
+    start = time.perf_counter()
+    ivf = IVFIndex(data, n_lists=args.n_lists, seed=args.seed)
+    build_s = time.perf_counter() - start
+    print(f"IVF build: {ivf.n_lists} lists in {build_s:.2f}s")
+
+    results = {
+        "rows": args.rows,
+        "dim": args.dim,
+        "top_k": args.top_k,
+        "exact_ms_per_query": exact_ms,
+        "ivf_build_s": build_s,
+        "ivf_n_lists": ivf.n_lists,
+        "ivf": [],
+    }
+
+    print(f"\n{'backend':<16}{'recall@' + str(args.top_k):>12}{'ms/query':>12}{'speedup':>10}")
+    print(f"{'exact':<16}{1.0:>12.4f}{exact_ms:>12.3f}{1.0:>10.1f}")
+    for n_probe in args.n_probe:
+        ivf.n_probe = n_probe
+        found, ms = time_queries(ivf, queries, args.top_k)
+        recall = recall_at_k(truth, found)
+        print(f"{'ivf/probe=' + str(n_probe):<16}{recall:>12.4f}{ms:>12.3f}{exact_ms / ms:>10.1f}")
+        results["ivf"].append({"n_probe": n_probe, "recall": recall, "ms_per_query": ms})
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()